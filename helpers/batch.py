@@ -0,0 +1,296 @@
+"""
+This module builds curve histories -- many curves over many dates -- on top
+of the LiborCurve and OISCurve objects in curve.py. Rather than having each
+curve run its own queries against the market data database, all of the
+conventions, instruments, and rates data for the requested curves and date
+range are loaded up front in a handful of queries, and each curve is then
+bootstrapped from that preloaded data.
+
+The results are returned as CurveHistory objects, which hold the node dates
+and discount factors for every date in compact (dates x pillars) numpy arrays,
+instead of keeping thousands of Curve objects alive.
+"""
+import contextlib
+
+import numpy as np
+import QuantLib as ql
+
+import helpers.curve as curve
+import helpers.curve_cache as curve_cache
+import helpers.node_curve as node_curve
+import helpers.repository as repository
+
+
+class MarketDataSet:
+    """
+    The MarketDataSet holds the conventions, instruments, and rates data for a
+    set of curves over a date range, loaded with one conventions query, and
+    one instruments and one instrument rates query per curve. It can be
+    passed to the Curve objects in place of running the per-curve queries.
+    As with the MarketDataRepository, a date missing the rate of any of a
+    curve's instruments raises a ValueError naming them.
+
+    Curves that require an OIS curve for discounting will also have the
+    associated 'CCY_OIS' curve data loaded.
+
+    Attributes:
+        names (list):           list of the curve names that were loaded,
+                                including any OIS curves needed for discounting
+        start_date (str):       ISO date of the first date loaded
+        end_date (str):         ISO date of the last date loaded
+    """
+    def __init__(self, conn, names, start_date, end_date):
+        self.start_date = start_date
+        self.end_date = end_date
+
+        data = repository.MarketDataRepository(conn)
+
+        self._conventions = data.conventions_for(names)
+
+        # add any OIS curves that are needed for dual-curve bootstrapping
+        self.names = list(names)
+        for conventions in list(self._conventions.values()):
+            if conventions['general_RequiresOIS'].lower() == 'true':
+                ois_name = conventions['general_Currency'] + '_OIS'
+                if ois_name not in self.names:
+                    self.names.append(ois_name)
+        missing = [name for name in self.names if name not in self._conventions]
+        if missing:
+            self._conventions.update(data.conventions_for(missing))
+
+        self._instrument_rates = data.instrument_rates_between(
+            self.names, start_date, end_date)
+
+        # dates that are missing any of a curve's instruments can't be built
+        instruments = data.curve_instruments(self.names)
+        self._missing = {}
+        for (name, iso_date), instrument_rates in self._instrument_rates.items():
+            missing = repository.missing_instruments(instrument_rates,
+                                                     instruments[name])
+            if missing:
+                self._missing[(name, iso_date)] = missing
+
+    def conventions(self, name):
+        try:
+            return self._conventions[name]
+        except KeyError:
+            raise ValueError('No conventions exist for {name}'.format(**locals()))
+
+    def instrument_rates(self, name, iso_date):
+        try:
+            instrument_rates = self._instrument_rates[(name, iso_date)]
+        except KeyError:
+            raise ValueError('No data available for {name} on {iso_date}'.format(**locals()))
+        if (name, iso_date) in self._missing:
+            raise repository.missing_rates_error(name, iso_date,
+                                                 self._missing[(name, iso_date)])
+        return instrument_rates
+
+
+class CurveHistory:
+    """
+    The CurveHistory holds the bootstrapped nodes of a single curve over many
+    dates. Row i of each of the arrays holds the curve built as of dates[i].
+    Curves with fewer nodes than the widest curve in the history are padded
+    with NaT node dates and NaN discount factors.
+
+    Attributes:
+        name (str):                     curve name
+        dates (np.ndarray):             datetime64[D] array of curve dates
+        node_dates (np.ndarray):        datetime64[D] array (dates x pillars)
+                                        of the node dates of each curve
+        discount_factors (np.ndarray):  float array (dates x pillars) of the
+                                        discount factors at each node
+        failures (dict):                ISO date -> error message for each
+                                        date that could not be built
+    """
+    def __init__(self, name, dates, node_serials, discount_factors, failures):
+        self.name = name
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.failures = failures
+
+        width = max([len(serials) for serials in node_serials], default=0)
+        self.node_dates = np.full((len(node_serials), width), np.datetime64('NaT'),
+                                  dtype='datetime64[D]')
+        self.discount_factors = np.full((len(node_serials), width), np.nan)
+        for i, (serials, dfs) in enumerate(zip(node_serials, discount_factors)):
+            self.node_dates[i, :len(serials)] = node_curve.to_datetime64(serials)
+            self.discount_factors[i, :len(dfs)] = dfs
+
+    def __len__(self):
+        return len(self.dates)
+
+    def nodes(self, date):
+        """
+        Returns the node dates and discount factors of the curve built as of
+        a single date, with any padding removed.
+
+        Args:
+            date (str):                 ISO date of the curve
+
+        Returns:
+            nodes (tuple):              tuple of (node_dates, discount_factors)
+                                        numpy arrays
+        """
+        i = np.flatnonzero(self.dates == np.datetime64(date, 'D'))
+        if not len(i):
+            raise KeyError('{self.name} was not built on {date}'.format(**locals()))
+        mask = ~np.isnat(self.node_dates[i[0]])
+        return self.node_dates[i[0]][mask], self.discount_factors[i[0]][mask]
+
+    @classmethod
+    def concatenate(cls, histories):
+        """
+        Joins several histories of the same curve, in order, into a single
+        CurveHistory. Used to merge the results of sharded builds.
+
+        Args:
+            histories (list):           list of CurveHistory objects
+
+        Returns:
+            history (CurveHistory):     history covering all of the dates
+        """
+        history = cls(histories[0].name, [], [], [], {})
+        width = max(h.node_dates.shape[1] for h in histories)
+
+        def pad(array, fill):
+            return np.pad(array, ((0, 0), (0, width - array.shape[1])),
+                          constant_values=fill)
+
+        history.dates = np.concatenate([h.dates for h in histories])
+        history.node_dates = np.concatenate(
+            [pad(h.node_dates, np.datetime64('NaT')) for h in histories])
+        history.discount_factors = np.concatenate(
+            [pad(h.discount_factors, np.nan) for h in histories])
+        for h in histories:
+            history.failures.update(h.failures)
+        return history
+
+
+def curve_class(name):
+    """
+    Returns the Curve implementation used to build a curve. OIS curves follow
+    the 'CCY_OIS' naming used for dual-curve bootstrapping; everything else is
+    built as a LiborCurve.
+    """
+    if name.upper().endswith('_OIS'):
+        return curve.OISCurve
+    return curve.LiborCurve
+
+
+def failure_message(error):
+    """
+    Returns the message recorded in a CurveHistory's failures for an error.
+    Missing data (ValueError) and failed bootstraps (RuntimeError) are
+    expected, and recorded by their message; anything else is prefixed by
+    its type, eg. 'TypeError: ...'.
+    """
+    if isinstance(error, (ValueError, RuntimeError)):
+        return str(error)
+    return '{}: {}'.format(type(error).__name__, error)
+
+
+def failed_histories(names, dates, error):
+    """
+    Returns the histories of curves that failed on every date with the same
+    error, eg. when their data couldn't be loaded.
+    """
+    iso_dates = [date.ISO() for date in dates]
+    message = failure_message(error)
+    return {name: CurveHistory(name, iso_dates, [[] for date in dates],
+                               [[] for date in dates],
+                               {iso_date: message for iso_date in iso_dates})
+            for name in names}
+
+
+def build_curves(names, dates, conn, store=None, incremental=False):
+    """
+    Builds every curve in names as of every date in dates. All of the data is
+    loaded once, in a MarketDataSet, before any curves are bootstrapped. Dates
+    that have no data, that fail to bootstrap, or that fail in any other way
+    are recorded in the failures dict of the CurveHistory (see
+    failure_message) rather than stopping the run.
+
+    The curves built on each date share a CurveCache, so an OIS curve that is
+    requested directly, or needed to discount several LiborCurves, is only
+    bootstrapped once per date.
+
+    The QuantLib evaluation date is moved to each curve date while building,
+    and restored afterwards.
+
+    With a CurveStore, curves whose inputs haven't changed since they were
+    stored are rehydrated rather than bootstrapped (see curve_store.py), and
+    the newly built curves are committed to it once, at the end.
+
+    With incremental, each curve is built once and then rolled from date to
+    date (see Curve.roll), reusing its rate helpers and seeding each
+    bootstrap with the previous date's solution. The dates should be in
+    order for this to help.
+
+    Args:
+        names (list):               list of curve names, eg. ['USD_3M']
+        dates (list):               list of ql.Date curve dates
+        conn (sqlite3.Connection):  market data database connection
+        store (CurveStore, optional):   persistent store of built curves
+        incremental (bool, optional):   roll the curves from date to date
+                                        rather than building each date
+                                        default: False
+
+    Returns:
+        histories (dict):           curve name -> CurveHistory, in the same
+                                    order as names
+    """
+    dates = list(dates)
+    if not dates:
+        return {name: CurveHistory(name, [], [], [], {}) for name in names}
+
+    iso_dates = [date.ISO() for date in dates]
+    market_data = MarketDataSet(conn, names, min(iso_dates), max(iso_dates))
+    cache = curve_cache.CurveCache(maxsize=len(market_data.names))
+
+    results = {name: ([], [], {}) for name in names}
+    # incremental curves, by name, once built
+    live = {}
+    settings = ql.Settings.instance()
+    evaluation_date = settings.evaluationDate
+    try:
+        # a store commits the curves saved on every date at the end
+        with store.batch() if store is not None else contextlib.nullcontext():
+            for date, iso_date in zip(dates, iso_dates):
+                # every move of the evaluation date makes the live rate helpers
+                # recompute their dates, so incremental builds only move it once
+                # a curve has data for the date (roll() moves it itself)
+                if not incremental:
+                    settings.evaluationDate = date
+                for name in names:
+                    node_serials, discount_factors, failures = results[name]
+                    try:
+                        built = live.get(name)
+                        if built is not None:
+                            built.roll(date)
+                        else:
+                            if settings.evaluationDate != date:
+                                settings.evaluationDate = date
+                            built = cache.get_or_build(
+                                curve_class(name), name, date, conn,
+                                market_data=market_data, store=store,
+                                incremental=incremental)
+                            if incremental:
+                                live[name] = built
+                        node_dates = np.array(built.dates, dtype='datetime64[D]')
+                    except Exception as error:
+                        failures[iso_date] = failure_message(error)
+                        if not isinstance(error, ValueError):
+                            # the roll may have stopped part way; the curve is
+                            # built afresh on the next date
+                            live.pop(name, None)
+                        node_serials.append([])
+                        discount_factors.append([])
+                        continue
+                    node_serials.append(node_curve.to_serials(node_dates))
+                    discount_factors.append(built.discount_factors)
+    finally:
+        settings.evaluationDate = evaluation_date
+
+    return {name: CurveHistory(name, iso_dates, *results[name])
+            for name in names}
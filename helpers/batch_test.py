@@ -0,0 +1,72 @@
+import numpy as np
+import QuantLib as ql
+
+import helpers.batch as batch
+import helpers.curve as curve
+
+
+class DroppedInstrument:
+    # market data without one instrument of one curve from a date on, so the
+    # curve's rate helpers change on that date
+    def __init__(self, market_data, name, instrument, iso_date):
+        self.market_data = market_data
+        self.name = name
+        self.instrument = instrument
+        self.iso_date = iso_date
+
+    def conventions(self, name):
+        return self.market_data.conventions(name)
+
+    def instrument_rates(self, name, iso_date):
+        instrument_rates = self.market_data.instrument_rates(name, iso_date)
+        if name != self.name or iso_date < self.iso_date:
+            return instrument_rates
+        return {inst_type: [(inst, maturity, rate) for inst, maturity, rate in insts
+                            if inst != self.instrument]
+                for inst_type, insts in instrument_rates.items()}
+
+
+def test_incremental_matches_cold_build(conn, history_dates):
+    names = ['USD_3M', 'USD_OIS']
+    cold = batch.build_curves(names, history_dates, conn)
+    rolled = batch.build_curves(names, history_dates, conn, incremental=True)
+    for name in names:
+        assert not cold[name].failures and not rolled[name].failures
+        np.testing.assert_array_equal(rolled[name].dates, cold[name].dates)
+        np.testing.assert_array_equal(rolled[name].node_dates, cold[name].node_dates)
+        # the rolled bootstrap starts from the previous date's solution, so
+        # the two agree to the bootstrap accuracy
+        np.testing.assert_allclose(rolled[name].discount_factors,
+                                   cold[name].discount_factors, rtol=0, atol=1e-10)
+
+
+def test_roll_relinks_rebuilt_ois_curve(conn, history_dates):
+    # USD_OIS loses an instrument on the second date, so rolling USD_3M
+    # rebuilds its OIS curve while keeping its own rate helpers
+    first, second = history_dates[:2]
+    market_data = DroppedInstrument(
+        batch.MarketDataSet(conn, ['USD_3M'], first.ISO(), second.ISO()),
+        'USD_OIS', 'swaps_40YR', second.ISO())
+    libor = curve.LiborCurve('USD_3M', first, conn, market_data=market_data,
+                             incremental=True)
+    libor.node_curve
+    ois_qlcurve = libor.ois_curve.qlcurve
+
+    assert libor.roll(second)
+    assert libor.ois_curve.qlcurve is not ois_qlcurve
+    cold = curve.LiborCurve('USD_3M', second, conn, market_data=market_data)
+    np.testing.assert_allclose(libor.discount_factors, cold.discount_factors,
+                               rtol=0, atol=1e-10)
+
+
+def test_failures_are_recorded(conn, history_dates):
+    # a weekend has no rates, and the other dates are still built
+    saturday = ql.Date(3, 1, 2015)
+    dates = [history_dates[0], saturday, history_dates[2]]
+    for incremental in (False, True):
+        histories = batch.build_curves(['USD_3M'], dates, conn, incremental=incremental)
+        history = histories['USD_3M']
+        assert list(history.failures) == [saturday.ISO()]
+        assert 'No data available' in history.failures[saturday.ISO()]
+        assert np.isnat(history.node_dates[1]).all()
+        assert not np.isnat(history.node_dates[[0, 2], 0]).any()
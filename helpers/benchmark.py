@@ -0,0 +1,178 @@
+"""
+This module times the curve building choices that trade speed for
+smoothness, so they can be picked per curve in conventions.csv. Run it
+against a market data database, eg.
+
+    python -m helpers.benchmark market_data.db USD_3M 2014-12-31
+
+which prints, for each general_Interpolation choice, the time to build the
+curve (rate helpers and bootstrap, including its OIS curve if it has one)
+and the time per date of discount factor queries, both on the QuantLib curve
+and vectorized on its NodeCurve. It then prints the cost of resolving the
+QuantLib convention objects of a curve build through the shared registry
+(see registry.py), against constructing them for every curve.
+"""
+import sqlite3
+import sys
+import timeit
+
+import numpy as np
+import QuantLib as ql
+
+import helpers.batch as batch
+import helpers.repository as repository
+import helpers.curve as curve
+import helpers.db_handler as db_handler
+import helpers.registry as registry
+
+
+class InterpolationOverride:
+    """
+    Market data (see batch.MarketDataSet) with the general_Interpolation
+    convention of every curve replaced, for building the same curves with
+    each interpolation.
+    """
+    def __init__(self, market_data, interpolation):
+        self.market_data = market_data
+        self.interpolation = interpolation
+
+    def conventions(self, name):
+        conventions = dict(self.market_data.conventions(name))
+        conventions['general_Interpolation'] = self.interpolation
+        return conventions
+
+    def instrument_rates(self, name, iso_date):
+        return self.market_data.instrument_rates(name, iso_date)
+
+
+def interpolation_benchmark(conn, name, curve_date, repeat=5, query_count=10000):
+    """
+    Times building and querying a curve with each of the interpolations in
+    curve.piecewise_curves.
+
+    Args:
+        conn (sqlite3.Connection):  market data database connection
+        name (str):                 curve name, eg. 'USD_3M'
+        curve_date (ql.Date):       curve date
+        repeat (int, optional):     builds timed per interpolation, the
+                                    fastest is reported
+                                    default: 5
+        query_count (int, optional):    number of dates queried
+                                        default: 10000
+
+    Returns:
+        results (dict):             interpolation -> dict of build_ms,
+                                    ql_query_us and node_query_us (per date),
+                                    or of the error if the bootstrap failed
+    """
+    ql.Settings.instance().evaluationDate = curve_date
+    iso_date = curve_date.ISO()
+    market_data = batch.MarketDataSet(conn, [name], iso_date, iso_date)
+    curve_class = batch.curve_class(name)
+
+    results = {}
+    for interpolation in curve.piecewise_curves:
+        override = InterpolationOverride(market_data, interpolation)
+
+        def build():
+            built = curve_class(name, curve_date, conn, market_data=override)
+            built.extract_nodes()
+            return built
+
+        try:
+            build_time = min(timeit.repeat(build, number=1, repeat=repeat))
+        except RuntimeError as error:
+            # not every interpolation bootstraps every curve
+            results[interpolation] = {'error': str(error)}
+            continue
+        built = build()
+        qlcurve = built.qlcurve
+        first = built.settlement_date.serialNumber()
+        last = qlcurve.maxDate().serialNumber()
+        serials = np.linspace(first, last, query_count).astype(np.int64)
+        dates = [ql.Date(int(serial)) for serial in serials]
+        nodes = built.node_curve
+
+        ql_time = min(timeit.repeat(lambda: [qlcurve.discount(date) for date in dates],
+                                    number=1, repeat=repeat))
+        node_time = min(timeit.repeat(lambda: nodes.discount(serials),
+                                      number=1, repeat=repeat))
+        results[interpolation] = {'build_ms': build_time * 1e3,
+                                  'ql_query_us': ql_time / query_count * 1e6,
+                                  'node_query_us': node_time / query_count * 1e6}
+    return results
+
+
+def _per_curve_conventions(conventions, swap_count):
+    # the QuantLib objects every Curve and InstrumentCollector used to build
+    # for itself: day counters per curve, adjustment and frequency tables
+    # per collector, an Ibor index per swap and the overnight indices
+    day_counts = {name: factory() for name, factory in registry.day_counts.items()}
+    adjustments = [dict(registry.business_day_conventions) for collector in range(6)]
+    frequencies = dict(registry.frequencies)
+    overnight = {currency: index() for currency, index
+                 in registry.overnight_indices.items()}
+    tenor = ql.Period(3, ql.Months)
+    indices = [registry.ibor_indices[conventions['general_Currency']](tenor)
+               for swap in range(swap_count)]
+    return (day_counts[conventions['deposits_DCF']],
+            adjustments[0][conventions['deposits_Adjustment']],
+            frequencies[conventions['swaps_FixedFreq']],
+            overnight[conventions['general_Currency']], indices)
+
+
+def _registry_conventions(conventions, swap_count):
+    tenor = ql.Period(3, ql.Months)
+    indices = [registry.ibor_index(conventions['general_Currency'], tenor)
+               for swap in range(swap_count)]
+    return (registry.day_count(conventions['deposits_DCF']),
+            registry.business_day_convention(conventions['deposits_Adjustment']),
+            registry.frequency(conventions['swaps_FixedFreq']),
+            registry.overnight_index(conventions['general_Currency']), indices)
+
+
+def registry_benchmark(conn, name, swap_count=17, number=1000, repeat=5):
+    """
+    Times resolving the QuantLib convention objects of one dual-curve build
+    (a LiborCurve with swap_count swaps and its OIS curve), constructing
+    them per curve as the curves used to, and through the shared registry.
+
+    Returns:
+        results (dict):             'per_curve' and 'registry' -> dict of
+                                    the microseconds and QuantLib objects
+                                    constructed per curve build
+    """
+    conventions = dict(repository.MarketDataRepository(conn).conventions(name))
+    results = {}
+    for label, resolve, constructed in (
+            ('per_curve', _per_curve_conventions,
+             len(registry.day_counts) + len(registry.overnight_indices) + swap_count),
+            ('registry', _registry_conventions, 0)):
+        resolve(conventions, swap_count)
+        seconds = min(timeit.repeat(lambda: resolve(conventions, swap_count),
+                                    number=number, repeat=repeat))
+        results[label] = {'us': seconds / number * 1e6, 'objects': constructed}
+    return results
+
+
+def print_results(results):
+    print('{:<22}{:>12}{:>16}{:>18}'.format('interpolation', 'build ms',
+                                            'ql query us', 'node query us'))
+    for interpolation, timings in results.items():
+        if 'error' in timings:
+            print('{:<22}failed: {}'.format(interpolation, timings['error']))
+            continue
+        print('{:<22}{build_ms:>12.2f}{ql_query_us:>16.3f}'
+              '{node_query_us:>18.4f}'.format(interpolation, **timings))
+
+
+if __name__ == '__main__':
+    db_name, name, iso_date = sys.argv[1:4]
+    conn = sqlite3.connect(db_name)
+    conn.row_factory = db_handler.dict_factory
+    year, month, day = (int(part) for part in iso_date.split('-'))
+    print_results(interpolation_benchmark(conn, name, ql.Date(day, month, year)))
+    print()
+    for label, timings in registry_benchmark(conn, name).items():
+        print('{:<22}{us:>10.2f} us per curve, {objects} QuantLib objects '
+              'constructed'.format(label, **timings))
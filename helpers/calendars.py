@@ -0,0 +1,237 @@
+"""
+This module holds the holiday calendars shared by the curves and the swap
+schedules. Each HolidayCalendar precomputes a business day table over a
+date range, so adjusting or advancing a date is an array lookup rather than
+a QuantLib call or a walk over the days.
+
+Calendars are looked up by the names used in the general_HolidayCalendar
+convention (eg. 'NYSE'). The business days of a named calendar are taken from
+QuantLib once per process, and both the HolidayCalendar and the QuantLib
+calendar are shared by every curve and schedule that uses the name, eg.
+
+    nyse = calendars.get_calendar('NYSE')
+    nyse.adjust(dates, 'modified following')
+    nyse.advance(dates, -2)
+
+Calendars can also be made from an explicit list of holidays, without
+QuantLib.
+"""
+import numpy as np
+import QuantLib as ql
+
+import helpers.node_curve as node_curve
+
+# range covered by the business day tables; dates outside it fall back to
+# np.busday_offset
+TABLE_START = np.datetime64('1970-01-01')
+TABLE_END = np.datetime64('2100-01-01')
+# margin so that rolls from the first and last days of the range stay in
+# the table
+_MARGIN = 31
+
+# general_HolidayCalendar name -> QuantLib calendar factory
+quantlib_calendars = {
+    'NYSE': lambda: ql.UnitedStates(ql.UnitedStates.NYSE),
+    'USGovernmentBond': lambda: ql.UnitedStates(ql.UnitedStates.GovernmentBond),
+    'USSettlement': lambda: ql.UnitedStates(ql.UnitedStates.Settlement),
+    'TARGET': lambda: ql.TARGET(),
+    'London': lambda: ql.UnitedKingdom(ql.UnitedKingdom.Exchange),
+    'UKSettlement': lambda: ql.UnitedKingdom(ql.UnitedKingdom.Settlement),
+    'Tokyo': lambda: ql.Japan(),
+    'Zurich': lambda: ql.Switzerland(),
+    'Toronto': lambda: ql.Canada(),
+    'Sydney': lambda: ql.Australia(),
+    'WeekendsOnly': lambda: ql.WeekendsOnly()
+}
+
+# date adjustment name -> np.busday_offset roll
+ADJUSTMENT_ROLLS = {
+    'unadjusted': None,
+    'following': 'forward',
+    'preceding': 'backward',
+    'modified following': 'modifiedfollowing',
+    'modified preceding': 'modifiedpreceding'
+}
+
+_calendars = {}
+_quantlib_instances = {}
+
+
+class HolidayCalendar:
+    """
+    Business day calendar backed by precomputed lookup tables: a business
+    day flag per date, the index of the adjusted date for each roll, and the
+    running count of business days used to advance dates.
+
+    Args:
+        name (str):                 calendar name
+        holidays (np.ndarray):      datetime64[D] holidays, in addition to
+                                    weekends
+        start (np.datetime64, optional):    first date of the tables
+        end (np.datetime64, optional):      end date (exclusive) of the tables
+
+    Attributes:
+        is_business_day (np.ndarray):   bool array, one flag per day from
+                                        start - 31 days
+        busdaycalendar (np.busdaycalendar): used for dates outside the tables
+    """
+    def __init__(self, name, holidays, start=TABLE_START, end=TABLE_END):
+        self.name = name
+        self.holidays = np.unique(np.asarray(holidays, dtype='datetime64[D]'))
+        self.start = np.datetime64(start, 'D')
+        self.end = np.datetime64(end, 'D')
+        self.busdaycalendar = np.busdaycalendar(holidays=self.holidays)
+
+        self._first = self.start - _MARGIN
+        days = self._first + np.arange((self.end - self.start).astype(int) + 2 * _MARGIN)
+        self.is_business_day = np.is_busday(days, busdaycal=self.busdaycalendar)
+        self._build_tables(days)
+
+    def _build_tables(self, days):
+        index = np.arange(len(days))
+        last = len(days) - 1
+        following = np.minimum.accumulate(
+            np.where(self.is_business_day, index, last)[::-1])[::-1]
+        preceding = np.maximum.accumulate(np.where(self.is_business_day, index, 0))
+        months = days.astype('datetime64[M]')
+        modified_following = np.where(months[following] == months, following, preceding)
+        modified_preceding = np.where(months[preceding] == months, preceding, following)
+        self._rolls = {
+            'forward': following,
+            'backward': preceding,
+            'modifiedfollowing': modified_following,
+            'modifiedpreceding': modified_preceding
+        }
+        self._business_days = index[self.is_business_day]
+        # number of business days strictly before each day
+        self._business_count = np.cumsum(self.is_business_day) - self.is_business_day
+
+    @classmethod
+    def from_quantlib(cls, name, calendar, start=TABLE_START, end=TABLE_END):
+        """
+        Takes the holidays of a QuantLib calendar over the range, one call
+        per weekday.
+        """
+        first, last = node_curve.to_serials(np.array([start, end], dtype='datetime64[D]'))
+        serials = np.arange(first - _MARGIN, last + _MARGIN)
+        weekdays = serials[np.is_busday(node_curve.to_datetime64(serials))]
+        holidays = [serial for serial in weekdays.tolist()
+                    if not calendar.isBusinessDay(ql.Date(serial))]
+        return cls(name, node_curve.to_datetime64(holidays), start, end)
+
+    def _in_range(self, dates):
+        return dates.size == 0 or (dates.min() >= self.start and dates.max() < self.end)
+
+    def _index(self, dates):
+        return (dates - self._first).astype(np.int64)
+
+    def is_business(self, dates):
+        """
+        Returns a bool array flagging the business days in dates.
+        """
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        if not self._in_range(dates):
+            return np.is_busday(dates, busdaycal=self.busdaycalendar)
+        return self.is_business_day[self._index(dates)]
+
+    def adjust(self, dates, adjustment):
+        """
+        Applies a business day adjustment to an array of dates.
+
+        Args:
+            dates (np.ndarray):     datetime64[D] dates
+            adjustment (str):       unadjusted, following, preceding,
+                                    modified following, or modified preceding
+
+        Returns:
+            dates (np.ndarray):     adjusted datetime64[D] dates
+        """
+        try:
+            roll = ADJUSTMENT_ROLLS[adjustment.lower()]
+        except KeyError:
+            raise ValueError('Adjustment {adjustment} not recognized'.format(**locals()))
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        if roll is None:
+            return dates
+        if not self._in_range(dates):
+            return np.busday_offset(dates, 0, roll=roll, busdaycal=self.busdaycalendar)
+        return self._first + self._rolls[roll][self._index(dates)]
+
+    def advance(self, dates, business_days, roll='following'):
+        """
+        Moves dates by a number of business days, as ql.Calendar.advance
+        does: a move of n > 0 (n < 0) gives the n-th business day after
+        (before) each date, and a move of 0 adjusts the date with roll.
+
+        Args:
+            dates (np.ndarray):             datetime64[D] dates
+            business_days (np.ndarray):     business days to move, may be
+                                            negative
+            roll (str, optional):           adjustment for moves of 0
+                                            default: following
+
+        Returns:
+            dates (np.ndarray):             datetime64[D] dates
+        """
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        business_days = np.asarray(business_days, dtype=np.int64)
+        if self._in_range(dates):
+            index = self._index(dates)
+            count = self._business_count[index]
+            target = np.where(business_days > 0,
+                              count + self.is_business_day[index] + business_days - 1,
+                              count + business_days)
+            if target.size == 0 or (target.min() >= 0 and
+                                    target.max() < len(self._business_days)):
+                moved = self._first + self._business_days[target]
+                if not (business_days == 0).any():
+                    return moved
+                return np.where(business_days == 0, self.adjust(dates, roll), moved)
+        # outside the tables: rolling a non-business day the other way first
+        # gives the same counting as above
+        after = np.busday_offset(dates, business_days, roll='backward',
+                                 busdaycal=self.busdaycalendar)
+        before = np.busday_offset(dates, business_days, roll='forward',
+                                  busdaycal=self.busdaycalendar)
+        return np.where(business_days > 0, after,
+                        np.where(business_days < 0, before, self.adjust(dates, roll)))
+
+
+def get_calendar(name):
+    """
+    Returns the shared HolidayCalendar for a calendar name, building its
+    tables on first use. Calendars can also be passed through as is, and
+    None gives a weekends-only calendar.
+    """
+    if isinstance(name, HolidayCalendar):
+        return name
+    if name is None:
+        name = 'WeekendsOnly'
+    if name not in _calendars:
+        if name == 'WeekendsOnly':
+            _calendars[name] = HolidayCalendar(name, [])
+        else:
+            _calendars[name] = HolidayCalendar.from_quantlib(name, quantlib_calendar(name))
+    return _calendars[name]
+
+
+def quantlib_calendar(name):
+    """
+    Returns the shared QuantLib calendar for a calendar name.
+    """
+    if name not in _quantlib_instances:
+        try:
+            factory = quantlib_calendars[name]
+        except KeyError:
+            raise ValueError('Holiday calendar {name} not recognized'.format(**locals()))
+        _quantlib_instances[name] = factory()
+    return _quantlib_instances[name]
+
+
+def register_calendar(calendar):
+    """
+    Adds a HolidayCalendar, eg. one made from a list of holidays, to the
+    shared calendars under its name.
+    """
+    _calendars[calendar.name] = calendar
+    return calendar
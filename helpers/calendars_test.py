@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import QuantLib as ql
+
+import helpers.calendars as calendars
+import helpers.node_curve as node_curve
+
+NAMES = ['NYSE', 'TARGET', 'London']
+conventions = {
+    'unadjusted': ql.Unadjusted,
+    'following': ql.Following,
+    'modified following': ql.ModifiedFollowing,
+    'preceding': ql.Preceding,
+    'modified preceding': ql.ModifiedPreceding
+}
+# every day over a few years, including the year end holidays and month ends
+DAYS = np.arange(np.datetime64('2014-11-01'), np.datetime64('2017-03-01'))
+
+
+def ql_dates(dates):
+    return [ql.Date(int(serial)) for serial in node_curve.to_serials(dates)]
+
+
+@pytest.mark.parametrize('name', NAMES)
+def test_business_days_match_quantlib(name):
+    calendar = calendars.quantlib_calendar(name)
+    np.testing.assert_array_equal(
+        calendars.get_calendar(name).is_business(DAYS),
+        [calendar.isBusinessDay(date) for date in ql_dates(DAYS)])
+
+
+@pytest.mark.parametrize('adjustment', sorted(conventions))
+@pytest.mark.parametrize('name', NAMES)
+def test_adjust_matches_quantlib(name, adjustment):
+    calendar = calendars.quantlib_calendar(name)
+    assert ql_dates(calendars.get_calendar(name).adjust(DAYS, adjustment)) == [
+        calendar.adjust(date, conventions[adjustment]) for date in ql_dates(DAYS)]
+
+
+@pytest.mark.parametrize('roll', ['following', 'preceding', 'modified following'])
+@pytest.mark.parametrize('business_days', [-5, -2, -1, 0, 1, 2, 10])
+@pytest.mark.parametrize('name', NAMES)
+def test_advance_matches_quantlib(name, business_days, roll):
+    calendar = calendars.quantlib_calendar(name)
+    assert ql_dates(calendars.get_calendar(name).advance(DAYS, business_days, roll)) == [
+        calendar.advance(date, business_days, ql.Days, conventions[roll])
+        for date in ql_dates(DAYS)]
+
+
+def test_outside_the_tables():
+    # dates outside the tables fall back to np.busday_offset, which gives the
+    # same dates as the tables
+    holidays = np.array(['2015-01-01', '2015-01-19', '2015-12-25', '2015-12-28'],
+                        dtype='datetime64[D]')
+    tables = calendars.HolidayCalendar('tables', holidays)
+    fallback = calendars.HolidayCalendar('fallback', holidays,
+                                         start=np.datetime64('2000-01-01'),
+                                         end=np.datetime64('2000-02-01'))
+    days = np.arange(np.datetime64('2014-12-01'), np.datetime64('2016-02-01'))
+    for adjustment in conventions:
+        np.testing.assert_array_equal(fallback.adjust(days, adjustment),
+                                      tables.adjust(days, adjustment))
+    for business_days in (-3, -1, 0, 1, 3):
+        np.testing.assert_array_equal(fallback.advance(days, business_days),
+                                      tables.advance(days, business_days))
+    np.testing.assert_array_equal(fallback.is_business(days), tables.is_business(days))
+
+
+def test_unknown_adjustment():
+    with pytest.raises(ValueError, match='Adjustment sideways not recognized'):
+        calendars.get_calendar('NYSE').adjust(DAYS, 'sideways')
+
+
+def test_unknown_calendar():
+    with pytest.raises(ValueError, match='Holiday calendar Atlantis not recognized'):
+        calendars.get_calendar('Atlantis')
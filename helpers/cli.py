@@ -0,0 +1,256 @@
+"""
+This module is the command line entry point for building curve histories
+without any prompts, eg. from a nightly scheduler:
+
+    qlpy-build --db market_data.db --curves USD_3M USD_OIS \\
+        --start 2015-01-01 --end 2015-12-31 --workers 8 --format csv
+
+Each curve is built on every business day of its general_HolidayCalendar
+(see calendars.py) in the date range, across a pool of worker processes (see
+parallel.py). Each chunk of dates is written to the output directory as soon
+as it is built, and progress and throughput are printed as chunks finish.
+Dates that can't be built (eg. missing rates, or a curve that fails to
+bootstrap) are listed in failures.csv rather than stopping the run, and the
+command then exits with status 1. With --profile, the time spent
+in each stage of the curve builds is written to a file as well, as JSON or,
+for a .prom file, Prometheus text (see profiling.py).
+
+The output formats are:
+    csv     one <curve>.csv per curve, with a date,node_date,discount_factor
+            row per node; rows are appended a chunk at a time, in the order
+            the chunks finish
+    npz     one <curve>_<first date>_<last date>.npz per curve and chunk,
+            holding the dates, node_dates and discount_factors arrays of the
+            CurveHistory
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import QuantLib as ql
+
+import helpers.calendars as calendars
+import helpers.node_curve as node_curve
+import helpers.parallel as parallel
+import helpers.profiling as profiling
+import helpers.repository as repository
+
+FORMATS = ('csv', 'npz')
+
+
+def parse_date(iso_date):
+    """
+    Returns the ql.Date of an ISO date string, eg. '2015-01-31'.
+    """
+    try:
+        year, month, day = (int(part) for part in iso_date.split('-'))
+        return ql.Date(day, month, year)
+    except (ValueError, RuntimeError):
+        raise argparse.ArgumentTypeError('{iso_date} is not an ISO date'.format(**locals()))
+
+
+def business_days(start_date, end_date, calendar=None):
+    """
+    Returns the ql.Dates of every business day of a holiday calendar from
+    start_date to end_date, inclusive.
+
+    Args:
+        start_date (ql.Date):       first date
+        end_date (ql.Date):         last date
+        calendar (str, optional):   holiday calendar name, see calendars.py
+                                    default: weekends only
+
+    Returns:
+        dates (list):               ql.Dates of the business days
+    """
+    serials = np.arange(start_date.serialNumber(), end_date.serialNumber() + 1)
+    business = calendars.get_calendar(calendar).is_business(
+        node_curve.to_datetime64(serials))
+    return [ql.Date(int(serial)) for serial in serials[business]]
+
+
+def curve_calendars(db_name, names):
+    """
+    Returns a dict of holiday calendar name -> list of the curve names with
+    that general_HolidayCalendar, in the order of names. Curves without
+    conventions are listed under None (weekends only), and fail as they are
+    built.
+    """
+    conn = sqlite3.connect(db_name)
+    try:
+        conventions = repository.MarketDataRepository(conn).conventions_for(names)
+    finally:
+        conn.close()
+    groups = {}
+    for name in names:
+        calendar = conventions.get(name, {}).get('general_HolidayCalendar')
+        groups.setdefault(calendar, []).append(name)
+    return groups
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='qlpy-build',
+        description='Build curve histories and write them to disk.')
+    parser.add_argument('--db', default='market_data.db',
+                        help='market data database (default: market_data.db)')
+    parser.add_argument('--curves', nargs='+', required=True,
+                        help='curve names, eg. USD_3M USD_OIS')
+    parser.add_argument('--start', type=parse_date, required=True,
+                        help='first curve date, eg. 2015-01-01')
+    parser.add_argument('--end', type=parse_date,
+                        help='last curve date (default: the start date)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--chunk-size', type=int,
+                        help='dates built per task (default: four chunks per worker)')
+    parser.add_argument('--format', choices=FORMATS, default='csv',
+                        help='output format (default: csv)')
+    parser.add_argument('--output', default='outputs',
+                        help='output directory (default: outputs)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='roll each curve from date to date within a chunk')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='write the build stage timings to FILE, as '
+                             'Prometheus text if it ends in .prom, else JSON')
+    args = parser.parse_args(argv)
+    if args.end is None:
+        args.end = args.start
+    if args.end < args.start:
+        parser.error('--end is before --start')
+    if not os.path.isfile(args.db):
+        parser.error('{} does not exist'.format(args.db))
+    return args
+
+
+class HistoryWriter:
+    """
+    The HistoryWriter writes the CurveHistory chunks of a run to the output
+    directory as they arrive, and records the dates that failed.
+
+    Args:
+        output (str):               output directory, created if needed
+        output_format (str):        'csv' or 'npz'
+        names (list):               curve names being built
+    """
+    def __init__(self, output, output_format, names):
+        self.output = output
+        self.output_format = output_format
+        os.makedirs(output, exist_ok=True)
+        self._files = {}
+        self._writers = {}
+        if output_format == 'csv':
+            for name in names:
+                self._files[name] = open(os.path.join(output, name + '.csv'),
+                                         'w', newline='')
+                self._writers[name] = csv.writer(self._files[name])
+                self._writers[name].writerow(['date', 'node_date', 'discount_factor'])
+        self._failures_file = open(os.path.join(output, 'failures.csv'), 'w',
+                                   newline='')
+        self._failures = csv.writer(self._failures_file)
+        self._failures.writerow(['curve_name', 'date', 'error'])
+
+    def write(self, histories):
+        """
+        Writes one chunk's dict of curve name -> CurveHistory.
+        """
+        for name, history in histories.items():
+            for iso_date, error in sorted(history.failures.items()):
+                self._failures.writerow([name, iso_date, error])
+            if self.output_format == 'csv':
+                self._write_csv(name, history)
+            elif len(history):
+                file_name = '{}_{}_{}.npz'.format(name, history.dates[0], history.dates[-1])
+                np.savez(os.path.join(self.output, file_name), dates=history.dates,
+                         node_dates=history.node_dates,
+                         discount_factors=history.discount_factors)
+
+    def _write_csv(self, name, history):
+        writer = self._writers[name]
+        for date, node_dates, dfs in zip(history.dates, history.node_dates,
+                                         history.discount_factors):
+            built = ~np.isnat(node_dates)
+            writer.writerows(zip([str(date)] * built.sum(),
+                                 node_dates[built].astype(str),
+                                 dfs[built].tolist()))
+        self._files[name].flush()
+
+    def close(self):
+        for output_file in self._files.values():
+            output_file.close()
+        self._failures_file.close()
+
+
+def run(args, out=sys.stdout):
+    """
+    Builds and writes the curves for parsed arguments, printing progress to
+    out. Returns a dict of the run's statistics.
+    """
+    # curves on the same holiday calendar are built together, on its
+    # business days
+    groups = [(business_days(args.start, args.end, calendar), names)
+              for calendar, names in curve_calendars(args.db, args.curves).items()]
+    total = sum(len(dates) * len(names) for dates, names in groups)
+    writer = HistoryWriter(args.output, args.format, args.curves)
+    built = failed = 0
+    start = time.time()
+    try:
+        for dates, names in groups:
+            for index, histories in parallel.iter_curves_parallel(
+                    names, dates, args.db, args.workers, args.chunk_size,
+                    args.incremental):
+                writer.write(histories)
+                for history in histories.values():
+                    failed += len(history.failures)
+                    built += len(history) - len(history.failures)
+                elapsed = time.time() - start
+                print('{:>7}/{} curves  {:>8.1f} curves/s  {:>6} failed'.format(
+                    built + failed, total, built / elapsed if elapsed else 0.0, failed),
+                    file=out, flush=True)
+    finally:
+        writer.close()
+
+    elapsed = time.time() - start
+    dates = {date.serialNumber() for dates, names in groups for date in dates}
+    stats = {'dates': len(dates), 'curves': len(args.curves), 'built': built,
+             'failed': failed, 'seconds': elapsed,
+             'curves_per_second': built / elapsed if elapsed else 0.0}
+    print('Built {built} curves ({failed} failed) over {dates} dates in '
+          '{seconds:.1f}s, {curves_per_second:.1f} curves/s'.format(**stats),
+          file=out)
+    return stats
+
+
+def write_profile(profile, file_name):
+    """
+    Writes a profiling.Profile to file_name, as Prometheus text if it ends in
+    .prom, and as JSON otherwise.
+    """
+    with open(file_name, 'w') as profile_file:
+        if file_name.endswith('.prom'):
+            profile_file.write(profile.to_prometheus())
+        else:
+            profile_file.write(profile.to_json(indent=2))
+
+
+def main(argv=None):
+    """
+    Entry point of the qlpy-build command. Returns the exit status: 0 if
+    every curve was built, 1 if any failed (see failures.csv).
+    """
+    args = parse_args(argv)
+    if args.profile is None:
+        stats = run(args)
+    else:
+        with profiling.profile() as profile:
+            stats = run(args)
+        write_profile(profile, args.profile)
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
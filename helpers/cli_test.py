@@ -0,0 +1,73 @@
+import csv
+import os
+import sqlite3
+
+import pytest
+import QuantLib as ql
+
+import helpers.cli as cli
+
+
+@pytest.fixture
+def holiday_db_name(db_name, tmp_path):
+    # a copy of the database without rates on New Year's Day, as in real data
+    holiday_db_name = str(tmp_path / 'holiday.db')
+    conn = sqlite3.connect(holiday_db_name)
+    source = sqlite3.connect(db_name)
+    source.backup(conn)
+    source.close()
+    conn.execute("DELETE FROM rates WHERE date = '2015-01-01'")
+    conn.commit()
+    conn.close()
+    return holiday_db_name
+
+
+def build(db_name, output, start, end):
+    return cli.main(['--db', db_name, '--curves', 'USD_3M', 'USD_OIS',
+                     '--start', start, '--end', end, '--workers', '1',
+                     '--output', output])
+
+
+def failures(output):
+    with open(os.path.join(output, 'failures.csv'), newline='') as failures_file:
+        return list(csv.DictReader(failures_file))
+
+
+def test_business_days():
+    # 2015-01-19 is Martin Luther King Jr. Day
+    start, end = ql.Date(16, 1, 2015), ql.Date(20, 1, 2015)
+    assert cli.business_days(start, end) == [ql.Date(16, 1, 2015), ql.Date(19, 1, 2015),
+                                             ql.Date(20, 1, 2015)]
+    assert cli.business_days(start, end, 'NYSE') == [ql.Date(16, 1, 2015),
+                                                     ql.Date(20, 1, 2015)]
+
+
+def test_curve_calendars(db_name):
+    assert cli.curve_calendars(db_name, ['USD_3M', 'USD_OIS', 'USD_6M']) == {
+        'NYSE': ['USD_3M', 'USD_OIS'], None: ['USD_6M']}
+
+
+def test_exit_status(db_name, tmp_path):
+    output = str(tmp_path / 'built')
+    assert build(db_name, output, '2014-12-31', '2015-01-07') == 0
+    assert failures(output) == []
+    with open(os.path.join(output, 'USD_3M.csv'), newline='') as built_file:
+        dates = {row['date'] for row in csv.DictReader(built_file)}
+    # the curves are on the NYSE calendar, so New Year's Day is skipped even
+    # though the test database has rates for it
+    assert dates == {'2014-12-31', '2015-01-02', '2015-01-05', '2015-01-06',
+                     '2015-01-07'}
+
+
+def test_holidays_are_not_failures(holiday_db_name, tmp_path):
+    output = str(tmp_path / 'holiday')
+    assert build(holiday_db_name, output, '2014-12-31', '2015-01-05') == 0
+    assert failures(output) == []
+
+
+def test_exit_status_with_failures(db_name, tmp_path):
+    # there are no rates after 2015-01-07
+    output = str(tmp_path / 'failed')
+    assert build(db_name, output, '2015-01-07', '2015-01-08') == 1
+    assert [(row['curve_name'], row['date']) for row in failures(output)] == [
+        ('USD_3M', '2015-01-08'), ('USD_OIS', '2015-01-08')]
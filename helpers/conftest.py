@@ -0,0 +1,129 @@
+"""
+Shared fixtures of the helpers tests. The market data database is created
+from the csvs in data/ (2014-12-31), with a few more weekdays of rates
+shifted from those, for the tests that build histories.
+"""
+import csv
+import datetime
+import os
+import sqlite3
+
+import pytest
+import QuantLib as ql
+
+import helpers.db_handler as db_handler
+
+CURVE_DATE = ql.Date(31, 12, 2014)
+# the weekdays after CURVE_DATE added to the database, with the parallel
+# shift of every rate on each
+SHIFTS = [0.0002, -0.0001, 0.00015, 0.0003, -0.00025]
+# conventions added since the first databases were created
+ADDED_CONVENTIONS = ['general_Interpolation', 'futures_ConvexityVolatility',
+                     'futures_ConvexityMeanReversion']
+
+
+def _history_rows(conn):
+    rates = conn.execute('SELECT curve_name, instrument, rate FROM rates').fetchall()
+    date = datetime.date(2014, 12, 31)
+    for shift in SHIFTS:
+        date += datetime.timedelta(days=1)
+        while date.weekday() >= 5:
+            date += datetime.timedelta(days=1)
+        for curve_name, instrument, rate in rates:
+            if instrument.startswith('futures'):
+                # futures are quoted in price
+                rate -= shift * 100
+            else:
+                rate += shift
+            yield (curve_name, date.isoformat(), instrument, rate)
+
+
+@pytest.fixture(scope='session')
+def db_name(tmp_path_factory):
+    name = str(tmp_path_factory.mktemp('data') / 'market_data.db')
+    conn = db_handler.create_db(name)
+    conn.executemany(db_handler.INSERT_RATES_STMT, list(_history_rows(conn)))
+    conn.commit()
+    conn.close()
+    return name
+
+
+@pytest.fixture
+def baseline_db_name(tmp_path):
+    """
+    A database in the original schema, as db_handler.upgrade_db() finds it:
+    the csvs in data/ loaded as wide tables (rates_data and instruments with
+    a column per instrument), without the conventions added since.
+    """
+    with open(os.path.join(db_handler.DATA_DIR, 'conventions.csv'), newline='') as csv_file:
+        rows = [row for row in csv.reader(csv_file) if row[0] not in ADDED_CONVENTIONS]
+    conventions = str(tmp_path / 'conventions.csv')
+    with open(conventions, 'w', newline='') as csv_file:
+        csv.writer(csv_file).writerows(rows)
+
+    name = str(tmp_path / 'baseline.db')
+    conn = sqlite3.connect(name)
+    cursor = conn.cursor()
+    for file_name in (os.path.join(db_handler.DATA_DIR, 'rates_data.csv'),
+                      os.path.join(db_handler.DATA_DIR, 'instruments.csv'), conventions):
+        db_handler.load_csv(cursor, file_name)
+    conn.commit()
+    conn.close()
+    return name
+
+
+class InterpolationOverride:
+    """
+    Market data (see batch.MarketDataSet) with the general_Interpolation
+    convention of every curve replaced, for building the same curves with
+    each interpolation.
+    """
+    def __init__(self, market_data, interpolation):
+        self.market_data = market_data
+        self.interpolation = interpolation
+
+    def conventions(self, name):
+        conventions = dict(self.market_data.conventions(name))
+        conventions['general_Interpolation'] = self.interpolation
+        return conventions
+
+    def instrument_rates(self, name, iso_date):
+        return self.market_data.instrument_rates(name, iso_date)
+
+
+@pytest.fixture
+def interpolation_override():
+    """
+    InterpolationOverride, called with the market data and interpolation.
+    """
+    return InterpolationOverride
+
+
+@pytest.fixture
+def conn(db_name):
+    conn = sqlite3.connect(db_name)
+    conn.row_factory = db_handler.dict_factory
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def history_dates():
+    """
+    The curve dates in the database, in order.
+    """
+    dates = [CURVE_DATE]
+    while len(dates) <= len(SHIFTS):
+        dates.append(ql.WeekendsOnly().advance(dates[-1], 1, ql.Days))
+    return dates
+
+
+@pytest.fixture(autouse=True)
+def evaluation_date():
+    # every test starts on CURVE_DATE, and leaves the evaluation date as it
+    # found it
+    settings = ql.Settings.instance()
+    previous = settings.evaluationDate
+    settings.evaluationDate = CURVE_DATE
+    yield CURVE_DATE
+    settings.evaluationDate = previous
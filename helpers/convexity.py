@@ -0,0 +1,83 @@
+"""
+This module computes the convexity adjustments between interest rate futures
+and forward rates under the Hull-White one factor model. Futures are marked
+to market daily, so the futures rate is higher than the forward rate over the
+same period; the FuturesRateHelpers in curve.py subtract the adjustment
+before bootstrapping.
+
+The adjustments are the same as ql.HullWhite.convexityBias, but computed
+with numpy for whole arrays of futures at once: every future of a strip, or
+the strips of many curve dates (eg. a dates x futures array of prices, with
+the matching start and end serial numbers). The volatility and mean
+reversion come from the futures_ConvexityVolatility and
+futures_ConvexityMeanReversion conventions.
+"""
+import numpy as np
+
+import helpers.node_curve as node_curve
+
+# day count of the model times, from the curve date to the futures dates
+TIME_DAY_COUNT = 'Act365Fixed'
+
+
+def _decay(a, t):
+    # (1 - exp(-a t)) / a, which tends to t as the mean reversion goes to 0
+    a, t = np.broadcast_arrays(np.asarray(a, dtype=float), np.asarray(t, dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(a == 0.0, t, -np.expm1(-a * t) / np.where(a == 0.0, 1.0, a))
+
+
+def hull_white_bias(prices, start_times, end_times, volatility, mean_reversion):
+    """
+    Returns the Hull-White convexity adjustment (futures rate less forward
+    rate) of each future. All of the arguments broadcast against each other.
+
+    Args:
+        prices (np.ndarray):            futures prices, eg. 99.75
+        start_times (np.ndarray):       years from the curve date to the
+                                        start of each futures period
+        end_times (np.ndarray):         years to the end of each period
+        volatility (float):             Hull-White short rate volatility
+        mean_reversion (float):         Hull-White mean reversion
+
+    Returns:
+        adjustments (np.ndarray):       convexity adjustment of each future,
+                                        as a rate
+    """
+    t = np.asarray(start_times, dtype=float)
+    period = np.asarray(end_times, dtype=float) - t
+    half_variance = np.asarray(volatility, dtype=float) ** 2 / 2.0
+    period_decay = _decay(mean_reversion, period)
+    start_decay = _decay(mean_reversion, t)
+    # lambda accounts for the underlying being a rate, phi for the daily
+    # marking to market
+    lam = half_variance * 2.0 * _decay(2.0 * np.asarray(mean_reversion, dtype=float), t) * \
+        period_decay ** 2
+    phi = half_variance * period_decay * start_decay ** 2
+    futures_rates = (100.0 - np.asarray(prices, dtype=float)) / 100.0
+    return -np.expm1(-(lam + phi)) * (futures_rates + 1.0 / period)
+
+
+def adjustments(curve_serial, prices, start_serials, end_serials, volatility,
+                mean_reversion):
+    """
+    Returns the convexity adjustments of futures given by their dates, for
+    curves built on curve_serial (a serial number, or an array of them
+    broadcasting against the futures, eg. one per row of a dates x futures
+    array).
+
+    Args:
+        curve_serial (np.ndarray):      curve date serial number(s)
+        prices (np.ndarray):            futures prices
+        start_serials (np.ndarray):     serial numbers of the futures start
+                                        (IMM) dates
+        end_serials (np.ndarray):       serial numbers of the futures end dates
+        volatility (float):             Hull-White short rate volatility
+        mean_reversion (float):         Hull-White mean reversion
+
+    Returns:
+        adjustments (np.ndarray):       convexity adjustment of each future
+    """
+    start_times = node_curve.year_fractions(TIME_DAY_COUNT, curve_serial, start_serials)
+    end_times = node_curve.year_fractions(TIME_DAY_COUNT, curve_serial, end_serials)
+    return hull_white_bias(prices, start_times, end_times, volatility, mean_reversion)
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+import QuantLib as ql
+
+import helpers.batch as batch
+import helpers.convexity as convexity
+import helpers.curve as curve
+
+
+def quantlib_bias(price, start_time, end_time, volatility, mean_reversion):
+    return ql.HullWhite.convexityBias(float(price), float(start_time), float(end_time),
+                                      volatility, mean_reversion)
+
+
+@pytest.mark.parametrize('mean_reversion', [0.0, 0.03, 0.5])
+@pytest.mark.parametrize('volatility', [0.0, 0.005, 0.01, 0.02])
+def test_matches_quantlib(volatility, mean_reversion):
+    # QuantLib takes 1 - exp() where convexity.py uses expm1, so the two
+    # agree to a few ulps of the rates rather than of the adjustments
+    prices = np.linspace(94.0, 100.25, 7)
+    start_times = np.array([0.01, 0.25, 1.0, 3.0, 5.5, 9.75, 15.0])
+    end_times = start_times + np.array([0.25, 0.25, 0.26, 0.24, 0.25, 0.5, 1.0])
+    expected = [quantlib_bias(*args, volatility, mean_reversion)
+                for args in zip(prices, start_times, end_times)]
+    np.testing.assert_allclose(
+        convexity.hull_white_bias(prices, start_times, end_times, volatility,
+                                  mean_reversion),
+        expected, rtol=0, atol=1e-15)
+
+
+def test_small_mean_reversion():
+    # (1 - exp(-a t)) / a cancels as a goes to 0, which QuantLib's bias
+    # suffers from (its second difference below is 1e-9); with expm1 the bias
+    # stays smooth in a
+    prices = np.array([99.0, 94.0])
+    start_times, end_times = np.array([3.0, 15.0]), np.array([3.24, 16.0])
+    biases = [convexity.hull_white_bias(prices, start_times, end_times, 0.02, a)
+              for a in (0.0, 1e-9, 2e-9)]
+    np.testing.assert_allclose(biases[2] - 2.0 * biases[1] + biases[0], 0.0,
+                               rtol=0, atol=1e-15)
+
+
+def test_dates_by_futures():
+    # a dates x futures array of strips, one curve date per row
+    curve_serials = np.array([[42004], [42009], [42100]])
+    start_serials = curve_serials + np.array([[20, 111, 202, 293]])
+    end_serials = start_serials + 91
+    prices = np.array([[99.75, 99.5, 99.2, 98.9]]) - np.array([[0.0], [0.05], [0.1]])
+    adjustments = convexity.adjustments(curve_serials, prices, start_serials,
+                                        end_serials, 0.01, 0.03)
+    assert adjustments.shape == (3, 4)
+    expected = [[quantlib_bias(price, (start - row) / 365.0, (end - row) / 365.0,
+                               0.01, 0.03)
+                 for price, start, end in zip(*values)]
+                for row, values in zip(curve_serials[:, 0],
+                                       zip(prices, start_serials, end_serials))]
+    np.testing.assert_allclose(adjustments, expected, rtol=0, atol=1e-15)
+
+
+@pytest.fixture
+def libor(conn, evaluation_date):
+    market_data = batch.MarketDataSet(conn, ['USD_3M'], evaluation_date.ISO(),
+                                      evaluation_date.ISO())
+    return curve.LiborCurve('USD_3M', evaluation_date, conn, market_data=market_data)
+
+
+def curve_biases(libor):
+    # the QuantLib adjustment of each of the curve's futures at its price
+    conventions = libor.curve_conventions
+    reference = libor.curve_date.serialNumber()
+    biases = {}
+    for name, (quote, start, end) in libor.convexity.items():
+        biases[name] = quantlib_bias(libor.quotes[name].value(),
+                                     (start - reference) / 365.0,
+                                     (end - reference) / 365.0,
+                                     conventions.convexity_volatility,
+                                     conventions.convexity_mean_reversion)
+    return biases
+
+
+def test_curve_adjustments_match_quantlib(libor):
+    assert libor.curve_conventions.convexity_volatility > 0
+    for name, bias in curve_biases(libor).items():
+        assert libor.convexity[name][0].value() == pytest.approx(bias, abs=1e-15)
+
+
+def test_update_quotes_updates_adjustments(libor):
+    libor.update_quotes({'futures_3': libor.quotes['futures_3'].value() - 0.5})
+    for name, bias in curve_biases(libor).items():
+        assert libor.convexity[name][0].value() == pytest.approx(bias, abs=1e-15)
@@ -8,10 +8,6 @@ any questions on the use of this script, and fork it to make any
 improvements!
 
 TODO:   1. Put dicts in another file to import?
-        5. Add support for calculating futures convexity
-        9. holiday_calendar dict needs significant work. Might need 2 
-        functions so as to specify the country -> calendar. >> I should 
-        probably just simplify and specify both in the dict. <<
 
 """
 import csv
@@ -19,6 +15,34 @@ import itertools
 import os
 import QuantLib as ql
 
+import helpers.convexity as convexity
+import helpers.node_curve as node_curve
+import helpers.profiling as profiling
+import helpers.registry as registry
+import helpers.repository as repository
+import helpers.snapshot as snapshot
+
+DEFAULT_INTERPOLATION = 'CubicZero'
+
+# general_Interpolation convention -> (QuantLib piecewise curve, NodeCurve
+# interpolation mirroring it, see node_curve.py)
+piecewise_curves = {
+    'CubicZero': (ql.PiecewiseCubicZero, 'cubic_zero'),
+    'MonotonicCubicZero': (ql.PiecewiseMonotonicParabolicCubicZero,
+                           'monotonic_cubic_zero'),
+    'LinearZero': (ql.PiecewiseLinearZero, 'linear_zero'),
+    'LogLinearDiscount': (ql.PiecewiseLogLinearDiscount, 'log_linear_discount'),
+    'LogCubicDiscount': (ql.PiecewiseKrugerLogDiscount, 'kruger_log_discount'),
+    'FlatForward': (ql.PiecewiseFlatForward, 'log_linear_discount')
+}
+
+# attributes set by load_data() and by build(), which lazy and rehydrated
+# curves don't have until they're first asked for (see Curve.__getattr__)
+loaded_attributes = frozenset(['conventions', 'instrument_rates', 'curve_conventions',
+                               'settlement_date', 'currency', 'calendar',
+                               'interpolation'])
+built_attributes = frozenset(['instruments', 'quotes', 'convexity', 'ois_curve'])
+
 class Curve:
     """
     The Curve object is the primary result of this module. Curve 
@@ -52,81 +76,392 @@ class Curve:
                                 construction
         dates (str):            ISO dates for each of the maturity dates for each
                                 instrument you've added to the curve.
+        instrument_rates (dict): instrument type -> list of (instrument,
+                                maturity, rate) tuples for the curve date, as
+                                loaded by the market_data
+        quotes (dict):          instrument name -> ql.SimpleQuote for each of
+                                the rates used to build the curve. See
+                                update_quotes().
+        market_data (object):   source of the conventions, rates data, and
+                                instruments; either a preloaded MarketDataSet
+                                (see batch.py) or, by default, a
+                                MarketDataRepository querying conn
+        cache (CurveCache):     optional cache of built curves, used to share
+                                the OIS discounting curve between LiborCurves
+        data_version (int):     version of the market data the curve is built
+                                from, used as part of the cache key
+        lazy (bool):            if True, constructing the curve only records
+                                the inputs; the data is loaded and the curve
+                                bootstrapped on first use (discount_factor,
+                                iteration, the node attributes, or any of the
+                                attributes the build sets, eg. instruments,
+                                quotes and ois_curve) or on an explicit call
+                                to build()
+        store (CurveStore):     optional persistent store of built curves (see
+                                curve_store.py); if it holds the curve built
+                                from the same inputs, the nodes are rehydrated
+                                from it instead of bootstrapping, and newly
+                                built curves are saved to it
+        rehydrated (bool):      True if the nodes came from the store, in which
+                                case qlcurve is only built if it's needed, eg.
+                                when instruments or quotes are asked for
+        incremental (bool):     if True, the curve can be moved from one curve
+                                date to the next with roll(), reusing its rate
+                                helpers and last bootstrap, for building long
+                                histories (see batch.build_curves)
+        interpolation (str):    general_Interpolation convention, the type of
+                                QuantLib curve bootstrapped (see
+                                piecewise_curves), eg. 'CubicZero' or
+                                'LogLinearDiscount'
+        curve_conventions (CurveConventions):   the conventions compiled into
+                                the QuantLib objects the rate helpers are
+                                built from, shared between curves (see
+                                registry.py)
 
     """
-    def __init__(self, curve, curve_date, conn):
+    def __init__(self, curve, curve_date, conn, market_data=None, cache=None,
+                 data_version=0, lazy=False, store=None, incremental=False):
         self.name = curve
         self.curve_date = curve_date
         self.iso_date = curve_date.ISO()
         self.conn = conn
+        self.market_data = market_data
+        self.cache = cache
+        self.data_version = data_version
+        self.store = store
+        self.rehydrated = False
+        self.incremental = incremental
+        self.helper_key = None
+
+        path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data/')
 
-        self.day_count_fraction = {
-            'Act360': ql.Actual360(),
-            'Act365Fixed': ql.Actual365Fixed(),
-            'ActAct': ql.ActualActual(),
-            'Bus252': ql.Business252(),
-            '30360': ql.Thirty360()
-        }
+        if market_data is None:
+            self.market_data = repository.MarketDataRepository(conn)
+        self.lazy = lazy
+        self.loaded = False
+        self.qlcurve = None
 
-        # TODO: vastly increase the length of this dictionary
-        self.holiday_calendar = {
-        "NYSE": ql.UnitedStates(ql.UnitedStates.NYSE)
-        }
+        # nodes are extracted from the QuantLib curve on first use
+        self.reset_nodes()
 
-        path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data/')
+        # build curve (or rehydrate it from the store), unless it's lazy, in
+        # which case it's built on first use
+        if not lazy and not self.rehydrate():
+            self.ensure_built()
+
+    def load_data(self):
+        """
+        Loads the conventions and instrument rates for the curve from the
+        market_data, and sets a few general conventions. Called at the start
+        of build(); only loads the data once.
+        """
+        if self.loaded:
+            return
+
+        # get data, either from a preloaded MarketDataSet (see batch.py) or
+        # straight from the database
+        with profiling.stage(self.name, 'load_data'):
+            self.conventions = self.market_data.conventions(self.name)
+            self.instrument_rates = self.market_data.instrument_rates(
+                self.name, self.iso_date)
+
+        # the conventions compiled into QuantLib objects, shared between
+        # curves, see registry.py
+        self.curve_conventions = registry.curve_conventions(self.name,
+                                                            self.conventions)
 
-        # get data
-        cursor = conn.cursor()
-        sql_statement = ('SELECT * FROM conventions '
-                         'WHERE curve_name IS "{curve}"').format(**locals())
-        cursor.execute(sql_statement)
-        self.conventions = cursor.fetchone()
-        if self.conventions is None:
-            raise ValueError('No conventions exist for {self.name}'.format(**locals()))
-        
-        sql_statement = ('SELECT * FROM rates_data '
-<<<<<<< HEAD
-                         'WHERE curve_name IS "{curve}" '
-                         'AND date IS "{self.iso_date}"').format(**locals())
-        cursor.execute(sql_statement)
-        self.rates_data = cursor.fetchone()
-        
-=======
-<<<<<<< Updated upstream
-                         'where curve_name is "{curve}"').format(**locals())
-        cursor.execute(sql_statement)
-        self.market_data = cursor.fetchone()
-=======
-                         'WHERE curve_name IS "{self.name}" '
-                         'AND date IS "{self.iso_date}"').format(**locals())
-        cursor.execute(sql_statement)
-        self.rates_data = cursor.fetchone()
-        if self.rates_data is None:
-            raise ValueError('No data available for {self.name} on {self.iso_date}'.format(**locals()))
->>>>>>> Stashed changes
-
->>>>>>> 997fe749c9e04e95eb730523e8727d0fe6c91424
-        sql_statement = ('SELECT * FROM instruments '
-                         'where curve_name is "{curve}"').format(**locals())
-        cursor.execute(sql_statement)        
-        self.instrument_ids = cursor.fetchone()
-        if self.instrument_ids is None:
-            raise ValueError('No instruments specified for {self.name}'.format(**locals()))
-        
         # add a few general conventions
-        self.settlement_date = curve_date + ql.Period(
-            int(self.conventions['deposits_SpotLag']), ql.Days)
-        self.currency = self.conventions['general_Currency']
-        self.calendar = self.holiday_calendar[
-            self.conventions['general_HolidayCalendar']]
+        self.settlement_date = self.curve_date + self.curve_conventions.spot_lag
+        self.currency = self.curve_conventions.currency
+        self.calendar = self.curve_conventions.calendar
+        # databases created before the general_Interpolation convention
+        # build cubic zero curves
+        self.interpolation = (self.conventions.get('general_Interpolation') or
+                              DEFAULT_INTERPOLATION)
+        if self.interpolation not in piecewise_curves:
+            raise ValueError('Interpolation {self.interpolation} for {self.name} '
+                             'not recognized'.format(**locals()))
+        self.loaded = True
+
+    def __getattr__(self, attribute):
+        # only called for attributes that aren't set: those of lazy and
+        # rehydrated curves that are set by loading the data or building
+        if attribute in loaded_attributes and not self.__dict__.get('loaded', True):
+            self.load_data()
+        elif attribute in built_attributes and self.__dict__.get('qlcurve', 0) is None:
+            self.ensure_built()
+        else:
+            raise AttributeError('{} object has no attribute {}'.format(
+                type(self).__name__, attribute))
+        return getattr(self, attribute)
 
-        # build curve
-        self.build()
+    @property
+    def built(self):
+        return self.qlcurve is not None
+
+    def ensure_built(self):
+        """
+        Builds the curve if it hasn't been built yet (ie. it was constructed
+        with lazy=True), and returns the QuantLib curve.
+        """
+        if self.qlcurve is None:
+            with profiling.stage(self.name, 'build'):
+                self.build()
+            if self.store is not None and not self.rehydrated:
+                self.store.save(self)
+        return self.qlcurve
+
+    def rehydrate(self):
+        """
+        Takes the nodes from the store if it holds this curve built from the
+        same inputs. Returns True if the curve was rehydrated.
+        """
+        if self.store is None:
+            return False
+        stored = self.store.load(self)
+        if stored is None:
+            return False
+        self._dates, self._discount_factors, self._node_curve = stored
+        self.rehydrated = True
+        profiling.count(self.name, 'rehydrated')
+        return True
 
     def __iter__(self):
+        self.ensure_built()
         for inst in self.instruments:
             yield inst
 
+    def collect(self, collector_class):
+        """
+        Returns the InstrumentCollector of collector_class (eg. SwapsInsts)
+        for the curve, timed as its helpers stage (see profiling.py).
+        """
+        with profiling.stage(self.name, 'helpers.' + collector_class.__name__):
+            return collector_class(self)
+
+    def set_instruments(self, collectors):
+        """
+        Flattens the rate helpers of each InstrumentCollector into the
+        instruments list used to build the curve, and keeps the quote for
+        each instrument in the quotes dict so that rates can be updated later.
+
+        Args:
+            collectors (list):      list of InstrumentCollector objects
+        """
+        self.instruments = list(itertools.chain.from_iterable(collectors))
+        profiling.count(self.name, 'helpers', len(self.instruments))
+        self.reset_nodes()
+        self.quotes = {}
+        self.convexity = {}
+        for collector in collectors:
+            self.quotes.update(collector.quotes)
+            self.convexity.update(collector.convexity)
+        self.update_convexity()
+        self.helper_key = self.rate_helper_key(self.instrument_rates, self.curve_date)
+
+    def rate_helper_key(self, instrument_rates, curve_date):
+        """
+        Returns a key identifying the rate helpers a curve date's instruments
+        need: the instrument names, and the IMM dates of any futures (the only
+        helpers with fixed dates; the others move with the evaluation date).
+        Two dates with the same key can share rate helpers, with only the
+        quotes changed.
+        """
+        names = sorted(inst for inst_type, insts in instrument_rates.items()
+                       if inst_type != 'futures' for inst, maturity, rate in insts)
+        strip = []
+        if instrument_rates.get('futures'):
+            strip = [(number, date.serialNumber()) for number, date in
+                     FuturesInsts.strip(curve_date, self.curve_conventions)]
+        return tuple(names), tuple(strip)
+
+    def piecewise_curve(self):
+        """
+        Returns the QuantLib curve bootstrapped from the instruments, of the
+        type given by the general_Interpolation convention (see
+        piecewise_curves), with its reference date at the settlement date.
+        Incremental curves take the reference date from the evaluation date
+        (plus the spot lag in calendar days, the same as settlement_date), so
+        that they move with it.
+        """
+        curve_type = piecewise_curves[self.interpolation][0]
+        day_count = self.curve_conventions.deposits_day_count
+        if self.incremental:
+            return curve_type(self.curve_conventions.deposits_spot_lag,
+                              ql.NullCalendar(), self.instruments, day_count)
+        return curve_type(self.settlement_date, self.instruments, day_count)
+
+    def roll(self, curve_date):
+        """
+        Moves a built incremental curve to a new curve date, eg. the next date
+        of a history, and moves the QuantLib evaluation date with it. The
+        conventions are kept, and if the new date has the same instruments
+        (see rate_helper_key) the rate helpers and QuantLib curve are kept as
+        well, with only the quotes updated; QuantLib then re-bootstraps on
+        next use, starting from the previous date's solution. Otherwise (or if
+        the curve isn't incremental) the curve is rebuilt for the new date.
+        With a store, a curve stored from the same inputs is rehydrated
+        rather than bootstrapped again (see rehydrate()).
+
+        Args:
+            curve_date (ql.Date):   new curve date
+
+        Returns:
+            reused (bool):          True if the rate helpers were reused
+        """
+        if curve_date == self.curve_date and self.built:
+            return True
+        self.ensure_built()
+        iso_date = curve_date.ISO()
+        instrument_rates = self.market_data.instrument_rates(self.name, iso_date)
+        ois_curve = getattr(self, 'ois_curve', None)
+        if ois_curve is not None:
+            ois_curve.roll(curve_date)
+
+        reused = (self.incremental and
+                  self.rate_helper_key(instrument_rates, curve_date) == self.helper_key)
+        self.curve_date = curve_date
+        self.iso_date = iso_date
+        self.instrument_rates = instrument_rates
+        self.settlement_date = curve_date + self.curve_conventions.spot_lag
+        self.rehydrated = False
+        profiling.count(self.name, 'rolls')
+
+        settings = ql.Settings.instance()
+        if settings.evaluationDate != curve_date:
+            settings.evaluationDate = curve_date
+        if reused:
+            for inst_type, insts in instrument_rates.items():
+                for inst, maturity, rate in insts:
+                    if inst_type == 'futures':
+                        inst = 'futures_' + str(int(maturity))
+                    # skips the futures outside the strip, and any
+                    # instrument types the curve isn't built from
+                    if inst in self.quotes:
+                        self.quotes[inst].setValue(float(rate))
+            # the futures are a day closer to their start dates
+            self.update_convexity()
+            if ois_curve is not None:
+                # the OIS curve was rebuilt if its own instruments changed
+                self.link_ois_curve()
+            self.reset_nodes()
+            profiling.count(self.name, 'helpers_reused')
+        else:
+            self.reset_nodes()
+            # the rate helpers are for the previous date; they're rebuilt
+            # below, or by ensure_built() if the curve is rehydrated
+            self.qlcurve = None
+        if self.rehydrate():
+            return reused
+        if not reused:
+            self.build()
+        if self.store is not None:
+            self.store.save(self)
+        return reused
+
+    def update_quotes(self, quotes):
+        """
+        Sets new rates on the quotes that the curve was built with. The
+        QuantLib curve observes its quotes, so it is re-bootstrapped lazily the
+        next time it's queried, without rebuilding any of the rate helpers or
+        going back to the database.
+
+        Args:
+            quotes (dict):          instrument name -> rate, eg.
+                                    {'swaps_10YR': 0.0231}. The names are the
+                                    same as in the rates table.
+        """
+        self.ensure_built()
+        for inst, rate in quotes.items():
+            try:
+                quote = self.quotes[inst]
+            except KeyError:
+                raise ValueError('{inst} is not an instrument of '
+                                 '{self.name}'.format(**locals()))
+            quote.setValue(float(rate))
+        self.update_convexity()
+        self.reset_nodes()
+
+    def update_convexity(self):
+        """
+        Sets the convexity adjustment quotes of the futures (see
+        convexity.py) from their current prices, in one vectorized pass over
+        the strip. The Hull-White volatility and mean reversion come from the
+        futures_ConvexityVolatility and futures_ConvexityMeanReversion
+        conventions; without them, the adjustments are zero.
+        """
+        if not self.convexity:
+            return
+        names = list(self.convexity)
+        quotes, starts, ends = zip(*[self.convexity[name] for name in names])
+        prices = [self.quotes[name].value() for name in names]
+        adjustments = convexity.adjustments(
+            self.curve_date.serialNumber(), prices, starts, ends,
+            self.curve_conventions.convexity_volatility,
+            self.curve_conventions.convexity_mean_reversion)
+        for quote, adjustment in zip(quotes, adjustments.tolist()):
+            quote.setValue(adjustment)
+
+    def reset_nodes(self):
+        """
+        Drops the node dates, discount factors, and NodeCurve taken from the
+        QuantLib curve, so they are extracted again on next use.
+        """
+        self._dates = None
+        self._discount_factors = None
+        self._node_curve = None
+
+    @property
+    def nodes_extracted(self):
+        """
+        True once the node dates, discount factors and NodeCurve have been
+        read from the QuantLib curve, after which they can be used on any
+        evaluation date.
+        """
+        return (self._dates is not None and self._discount_factors is not None and
+                self._node_curve is not None)
+
+    @property
+    def dates(self):
+        if self._dates is None:
+            self.extract_nodes()
+        return self._dates
+
+    @property
+    def discount_factors(self):
+        if self._discount_factors is None:
+            self.extract_nodes()
+        return self._discount_factors
+
+    def extract_nodes(self):
+        """
+        Reads the node dates and discount factors from the QuantLib curve
+        into the dates and discount_factors lists.
+        """
+        if self.qlcurve is None and self.rehydrate():
+            return
+        qlcurve = self.bootstrap()
+        with profiling.stage(self.name, 'extract_nodes'):
+            self._dates = []
+            self._discount_factors = []
+
+            for date in qlcurve.dates():
+                self._dates.append(date.ISO())
+                self._discount_factors.append(qlcurve.discount(date))
+
+    def bootstrap(self):
+        """
+        Builds the curve if needed, and bootstraps the QuantLib curve now
+        rather than on its first query, so that the bootstrap is timed as its
+        own stage (see profiling.py). Returns the QuantLib curve.
+        """
+        qlcurve = self.ensure_built()
+        with profiling.stage(self.name, 'bootstrap'):
+            # any query triggers the (lazy) bootstrap; the node dates are
+            # the cheapest
+            qlcurve.dates()
+        return qlcurve
+
     def discount_factor(self, date):
         """
         Returns the discount factor for a specific date for the curve whose
@@ -141,7 +476,72 @@ class Curve:
             discount factor(float): discount factor for that date you requested
 
         """
-        return self.qlcurve.discount(date)
+        if self.qlcurve is None and self.rehydrated:
+            return float(self.node_curve.discount([date.serialNumber()])[0])
+        return self.ensure_built().discount(date)
+
+    @property
+    def node_curve(self):
+        """
+        NodeCurve (see node_curve.py) holding the bootstrapped nodes of the
+        QuantLib curve, used for the vectorized queries.
+        """
+        if self._node_curve is None and self.qlcurve is None:
+            self.rehydrate()
+        if self._node_curve is None:
+            qlcurve = self.bootstrap()
+            with profiling.stage(self.name, 'node_curve'):
+                self._node_curve = node_curve.NodeCurve.from_qlcurve(
+                    qlcurve, self.curve_conventions.deposits_day_count_name,
+                    qlcurve.allowsExtrapolation(),
+                    piecewise_curves[self.interpolation][1])
+        return self._node_curve
+
+    def discount_factor_array(self, dates):
+        """
+        Vectorized version of discount_factor(). Returns the discount factors
+        for a whole array of dates, computed from the curve nodes and the same
+        interpolation as the QuantLib curve.
+
+        Args:
+            dates (np.ndarray):     array of datetime64 dates or QuantLib
+                                    serial numbers
+
+        Returns:
+            discount factors (np.ndarray): discount factor for each date
+        """
+        return self.node_curve.discount(dates)
+
+    def zero_rate_array(self, dates):
+        """
+        Returns the continuously compounded zero rates, in the curve day count,
+        for an array of dates.
+
+        Args:
+            dates (np.ndarray):     array of datetime64 dates or QuantLib
+                                    serial numbers
+
+        Returns:
+            zero rates (np.ndarray): zero rate for each date
+        """
+        return self.node_curve.zero_rate(dates)
+
+    def forward_rate_array(self, start_dates, end_dates, day_count=None):
+        """
+        Returns the simply compounded forward rates between two arrays of
+        dates.
+
+        Args:
+            start_dates (np.ndarray):   array of forward start dates
+            end_dates (np.ndarray):     array of forward end dates
+            day_count (str, optional):  day count of the forward accrual, as
+                                        named in conventions.csv
+                                        default: the curve day count
+
+        Returns:
+            forward rates (np.ndarray): forward rate for each period
+        """
+        return self.node_curve.forward_rate(start_dates, end_dates, day_count)
 
     def csv_dict_helper(self, curve, filename, datatype=str):
         """
@@ -191,6 +591,17 @@ class Curve:
             outfile.writerows(data)
         output.close()
 
+    def export_snapshot(self, file_name=None):
+        """
+        Writes the curve to a binary snapshot file (see snapshot.py), by
+        default outputs/<name>.npy.
+        """
+        if file_name is None:
+            path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'outputs/')
+            file_name = path + self.name + '.npy'
+        snapshot.write(file_name, [self])
+        return file_name
+
 class LiborCurve(Curve):
     """
     LiborCurve implementation of the Curve object. Used for generating
@@ -200,39 +611,76 @@ class LiborCurve(Curve):
     discount the swaps. 
 
     Note: Not to be used for overnight indices.
+
+    Attributes:
+        discount_curve (ql.RelinkableYieldTermStructureHandle):    handle the
+                                swaps are discounted on, linked to the OIS
+                                curve; relinked when the OIS curve is rebuilt
+                                on a roll, so that reused swap rate helpers
+                                don't discount on the previous date's curve
     """
-    def __init__(self, curve, curve_date, conn):
-        super(LiborCurve, self).__init__(curve, curve_date, conn)
+    def __init__(self, curve, curve_date, conn, **kwargs):
+        self.discount_curve = ql.RelinkableYieldTermStructureHandle()
+        self._linked_ois_curve = None
+        super(LiborCurve, self).__init__(curve, curve_date, conn, **kwargs)
 
     def build(self):
         """
-        Currently a private method that handles the actual curve construction.
-        Applied here in case I ever want to make the LiborCurve object lazy,
-        and require that some method be called before the curve is actually
-        built.
+        Handles the actual curve construction: loads the market data, collects
+        the instruments, and bootstraps the QuantLib curve. Called from the
+        constructor, or, if the LiborCurve was constructed with lazy=True, on
+        first use.
         """
+        self.load_data()
 
-        if self.conventions['general_RequiresOIS'].lower() == 'true':
-            self.ois_curvename = self.conventions['general_Currency'] + "_OIS"
-            self.ois_curve = OISCurve(self.ois_curvename, self.curve_date, self.conn)
+        if self.curve_conventions.requires_ois:
+            self.ois_curvename = self.curve_conventions.ois_name
+            with profiling.stage(self.name, 'ois_curve'):
+                self.build_ois_curve()
+                # bootstrapped now rather than within this curve's
+                # bootstrap, so that the two are timed apart
+                self.ois_curve.bootstrap()
+            self.link_ois_curve()
 
         # InstrumentCollector objects
-        self.instruments = DepositsInsts(self)
-        self.instruments += FuturesInsts(self)
-        self.instruments += FRAsInsts(self)
-        self.instruments += SwapsInsts(self)
-        
-        self.qlcurve = ql.PiecewiseCubicZero(
-                                self.settlement_date,
-                                self.instruments,
-                                self.day_count_fraction[self.conventions['deposits_DCF']])
-
-        self.dates = []
-        self.discount_factors = []
-
-        for date in self.qlcurve.dates():
-            self.dates.append(date.ISO())
-            self.discount_factors.append(self.qlcurve.discount(date))
+        self.set_instruments([self.collect(DepositsInsts),
+                              self.collect(FuturesInsts),
+                              self.collect(FRAsInsts),
+                              self.collect(SwapsInsts)])
+
+        self.qlcurve = self.piecewise_curve()
+
+    def build_ois_curve(self):
+        """
+        Sets ois_curve to the OIS curve the swaps are discounted on, from the
+        cache if the LiborCurve has one.
+        """
+        # called while building, so ois_curve mustn't trigger a build
+        if self.__dict__.get('ois_curve') is not None and \
+                self.ois_curve.curve_date == self.curve_date:
+            # already rolled to this date along with the curve, see roll()
+            return
+        if self.cache is not None:
+            self.ois_curve = self.cache.get_or_build(
+                OISCurve, self.ois_curvename, self.curve_date, self.conn,
+                market_data=self.market_data, data_version=self.data_version,
+                store=self.store, incremental=self.incremental)
+        else:
+            self.ois_curve = OISCurve(self.ois_curvename, self.curve_date,
+                                      self.conn, market_data=self.market_data,
+                                      store=self.store,
+                                      incremental=self.incremental)
+
+    def link_ois_curve(self):
+        """
+        Links discount_curve to the OIS curve's QuantLib curve, if it isn't
+        already. roll() calls this after rolling the OIS curve, which
+        rebuilds it if its instruments changed.
+        """
+        qlcurve = self.ois_curve.ensure_built()
+        if qlcurve is not self._linked_ois_curve:
+            self.discount_curve.linkTo(qlcurve)
+            self._linked_ois_curve = qlcurve
 
 class OISCurve(Curve):
     """
@@ -242,32 +690,23 @@ class OISCurve(Curve):
     Note: Not to be used for LIBOR (and similar) indices.
     """
 
-    def __init__(self, curve, curve_date, conn):
-        super(OISCurve, self).__init__(curve, curve_date, conn)
+    def __init__(self, curve, curve_date, conn, **kwargs):
+        super(OISCurve, self).__init__(curve, curve_date, conn, **kwargs)
 
     def build(self):
         """
-        Currently a private method that handles the actual curve construction.
-        Applied here in case I ever want to make the OISCurve object lazy,
-        and require that some method be called before the curve is actually
-        built.
+        Handles the actual curve construction: loads the market data, collects
+        the instruments, and bootstraps the QuantLib curve. Called from the
+        constructor, or, if the OISCurve was constructed with lazy=True, on
+        first use.
         """
+        self.load_data()
 
         # InstrumentCollector objects
-        self.instruments = DepositsInsts(self) # Should only take 1 O/N rate
-        self.instruments += OISSwapsInsts(self)
-
-        self.qlcurve = ql.PiecewiseCubicZero(
-            self.settlement_date,
-            self.instruments,
-            self.day_count_fraction[self.conventions['deposits_DCF']])
+        self.set_instruments([self.collect(DepositsInsts), # Should only take 1 O/N rate
+                              self.collect(OISSwapsInsts)])
 
-        self.dates = []
-        self.discount_factors = []
-
-        for date in self.qlcurve.dates():
-            self.dates.append(date.ISO())
-            self.discount_factors.append(self.qlcurve.discount(date))
+        self.qlcurve = self.piecewise_curve()
 
 class InstrumentCollector:
     """
@@ -280,13 +719,10 @@ class InstrumentCollector:
     well as re-defining several magic methods for list concatenation.
     """
     def __init__(self):
-        self.bus_day_convention = {
-            'Modified Following': ql.ModifiedFollowing,
-            'Following': ql.Following,
-            'Preceding': ql.Preceding,
-            'Modified Preceding': ql.ModifiedPreceding,
-            'Unadjusted': ql.Unadjusted
-        }
+        # instrument name -> ql.SimpleQuote, filled by get_instruments
+        self.quotes = {}
+        # futures name -> (convexity ql.SimpleQuote, start serial, end serial)
+        self.convexity = {}
 
     def __iter__(self):
         for inst in self.instruments:
@@ -298,7 +734,7 @@ class InstrumentCollector:
     def __len__(self):
         return len(self.instruments)
 
-    def get_instruments(self, curve):
+    def get_instruments(self, curve, filter_string):
         """
         The get_instruments function serves to return a list of tuples,
         where each item holds the ql.period object and the associated
@@ -316,52 +752,21 @@ class InstrumentCollector:
                                         the period is a ql.Period object and
                                         the rate is a floating number
         """
-<<<<<<< Updated upstream
         instruments = []
 
-        # filter instruments for instruments
-        insts = [key for key, value in curve.instrument_ids.items() 
-            if filter_string in key and 
-            value.upper() == 'TRUE']
-
         # create list of tuples (ql.Period, ql.SimpleQuote)
-        for inst in insts:
+        for inst, maturity, rate in curve.instrument_rates.get(filter_string, []):
             period = self.period_function(inst)
-            rate = ql.SimpleQuote(float(curve.rates_data[inst]))
+            rate = ql.SimpleQuote(float(rate))
+            self.quotes[inst] = rate
             instruments.append((period, rate))
         return instruments
-=======
-        sql_stmt = ('SELECT INSTRUMENT_CONVENTIONS.intrument_type, ' 
-                           'RATES_DATA.rate, '
-                           'INSTRUMENT_CONVENTIONS.instrument_maturity '
-                      'FROM CURVE_INSTRUMENTS '
-                        'JOIN RATES_DATA ON CURVE_INSTRUMENTS.instrument_name'
-                          ' = RATES_DATA.instrument_name AND '
-                        'JOIN INSTRUMENT_CONVENTIONS ON CURVE_INSTRUMENTS.instrument_name'
-                          ' = INSTRUMENT_CONVENTIONS.instrument_name '
-                      'WHERE CURVE_INSTRUMENTS.curve_name = {self.curve_name} AND '
-                        'RATES_DATA.date = {self.iso_date}').format(**locals())
-        
-        cursor.execute(sql_stmt) 
-       
-        insts = {}
- 
-        for row in cursor:
-            try:
-                insts[row['instrument_type']]row['instrument_maturity'] = row['rate']
-            except KeyError:
-                insts[row['instrument_type']] = {}
-                insts[row['instrument_type']]row['instrument_maturity'] = row['rate']
-        
-        return insts
->>>>>>> Stashed changes
 
     def period_function(self, string):
         """
-        period_function parses a string (something like 'deposits_ON' or
-        'swaps_10YR') and returns the length (in the examples, 1 and 10)
-        and the period (in the examples, days and years). It then returns
-        the QuantLib object for each.
+        period_function returns the QuantLib period of a string like
+        'deposits_ON' or 'swaps_10YR' (in the examples, 1 day and 10 years).
+        Each string is only parsed once, see registry.tenor().
 
         Args:
             string (str):           string of instrument, eg. 'deposits_ON'
@@ -370,27 +775,7 @@ class InstrumentCollector:
             Period (ql.object):   Object-equivalent of the period in the
                                     input string
         """
-
-        units = {
-        'ON': ql.Period(1, ql.Days),
-        'TN': ql.Period(2, ql.Days),
-        'SN': ql.Period(3, ql.Days),
-        'W' : ql.Weeks,
-        'WK': ql.Weeks,
-        'M' : ql.Months,
-        'MO': ql.Months,
-        'Y' : ql.Years,
-        'YR': ql.Years
-        }
-
-        inst = string.split('_')[1]
-        digits = ''.join([s for s in inst if s.isdigit()])
-        period = ''.join([s for s in inst if s.isalpha()])
-
-        if digits == '':
-            return units[period]
-        else:
-            return ql.Period(int(digits), units[period])
+        return registry.tenor(string)
 
 class DepositsInsts(InstrumentCollector):
     """
@@ -433,14 +818,15 @@ class DepositsInsts(InstrumentCollector):
             deposit_rate_helpers (list):    list of ql.DepositRateHelper
                                             objects.
         """
+        conventions = curve.curve_conventions
         return [ql.DepositRateHelper(
             ql.QuoteHandle(rate),
             period,
-            int(curve.conventions['deposits_SpotLag']),
-            curve.calendar,
-            self.bus_day_convention[curve.conventions['deposits_Adjustment']],
+            conventions.deposits_spot_lag,
+            conventions.calendar,
+            conventions.deposits_adjustment,
             False,  # end of month
-            curve.day_count_fraction[curve.conventions['deposits_DCF']]) 
+            conventions.deposits_day_count)
             for period, rate in self._inst_ids]
 
 class FRAsInsts(InstrumentCollector):
@@ -488,17 +874,11 @@ class FRAsInsts(InstrumentCollector):
         """
         instruments = []
 
-        # filter instruments for instruments
-        insts = [key for key, value in curve.instrument_ids.items() 
-            if 'fras' in key and 
-            value.upper() == 'TRUE']
-
-        # create list of tuples (ql.Period, ql.SimpleQuote)
-        for inst in insts:
-            inst_period = inst.split('_')[1]
-            start_month = int(inst_period.split('x')[0])
-            end_month = int(inst_period.split('x')[1])
-            rate = ql.SimpleQuote(float(curve.rates_data[inst]))
+        # create list of tuples (start_month, end_month, ql.SimpleQuote)
+        for inst, maturity, rate in curve.instrument_rates.get('fras', []):
+            start_month, end_month = registry.fra_months(maturity)
+            rate = ql.SimpleQuote(float(rate))
+            self.quotes[inst] = rate
             instruments.append((start_month, end_month, rate))
         return instruments
 
@@ -519,15 +899,16 @@ class FRAsInsts(InstrumentCollector):
             deposit_rate_helpers (list):    list of ql.FraRateHelper
                                             objects.
         """
+        conventions = curve.curve_conventions
         return [ql.FraRateHelper(
                 ql.QuoteHandle(rate),
                 start_month,
                 end_month,
-                int(curve.conventions['fras_SpotLag']),
-                curve.calendar,
-                self.bus_day_convention[curve.conventions['fras_Adjustment']],
+                conventions.fras_spot_lag,
+                conventions.calendar,
+                conventions.fras_adjustment,
                 False, # end of month,
-                curve.day_count_fraction[curve.conventions['fras_DCF']])
+                conventions.fras_day_count)
                 for start_month, end_month, rate in self._inst_ids]
 
 class FuturesInsts(InstrumentCollector):
@@ -568,17 +949,49 @@ class FuturesInsts(InstrumentCollector):
             futures (list):             list of tuples, each tuple containing a ql
                                         Period object and a floating point rate
         """
-        futures = [(ql.IMM.nextDate(curve.curve_date),
-                    ql.SimpleQuote(float(curve.rates_data['futures_1'])))]
-        for future in range(int(curve.conventions['futures_NumberOfFutures']) - 1):
-            period = ql.IMM.nextDate(futures[future][0])
-            quote = ql.SimpleQuote(float(curve.rates_data['futures_' + str(future + 2)]))
+        # futures maturities are their position in the strip, eg. 'futures_1'
+        prices = {int(maturity): rate
+                  for inst, maturity, rate in curve.instrument_rates.get('futures', [])}
+        if not prices:
+            return []
+        conventions = curve.curve_conventions
+        for missing in range(1, conventions.futures_count + 1):
+            if missing not in prices:
+                raise ValueError('No price for futures_{missing} for {curve.name} '
+                                 'on {curve.iso_date}'.format(**locals()))
+        futures = []
+        tenor = conventions.futures_period
+        adjustment = conventions.futures_adjustment
+        for number, period in self.strip(curve.curve_date, conventions):
+            quote = ql.SimpleQuote(float(prices[number]))
+            self.quotes['futures_' + str(number)] = quote
+            # the end date is the one the FuturesRateHelper uses; the
+            # adjustment is set by curve.update_convexity()
+            end = curve.calendar.advance(period, tenor, adjustment, False)
+            self.convexity['futures_' + str(number)] = (
+                ql.SimpleQuote(0.0), period.serialNumber(), end.serialNumber())
             futures.append((period, quote))
-        if (futures[0][0] - curve.curve_date) > \
-                int(curve.conventions['futures_DaysToExclude']):
-            return futures[:-1]
-        else:
-            return futures[1:]
+        return futures
+
+    @staticmethod
+    def strip(curve_date, conventions):
+        """
+        Returns the futures used to build a curve on curve_date, as a list of
+        (number, IMM date) tuples. Of the futures_NumberOfFutures contracts
+        from the next IMM date, the first is dropped if it expires within
+        futures_DaysToExclude days, otherwise the last is dropped.
+
+        Args:
+            curve_date (ql.Date):               curve date
+            conventions (CurveConventions):     compiled conventions of the
+                                                curve, see registry.py
+        """
+        dates = [ql.IMM.nextDate(curve_date)]
+        for future in range(conventions.futures_count - 1):
+            dates.append(ql.IMM.nextDate(dates[-1]))
+        if (dates[0] - curve_date) > conventions.futures_days_to_exclude:
+            return list(enumerate(dates[:-1], 1))
+        return list(enumerate(dates[1:], 2))
 
     def get_rate_helpers(self, curve):
         """
@@ -587,9 +1000,9 @@ class FuturesInsts(InstrumentCollector):
         FuturesRateHelper QuantLib objects. This object uses the conventions
         dict, along with the periods/rates from the get_instruments method. Note
         that the End of Month parameter has been permanently set to False,
-        as I am not aware of any future instruments that only pay EOM. Further
-        note that convexity has been hard-coded to zero, but will be implemented
-        at a later date.
+        as I am not aware of any future instruments that only pay EOM. The
+        convexity adjustment of each future is a live quote, set by the
+        curve's update_convexity().
 
         Args:
             curve (LiborCurve object):      curve that you're building
@@ -598,16 +1011,19 @@ class FuturesInsts(InstrumentCollector):
             deposit_rate_helpers (list):    list of ql.FuturesRateHelper
                                             objects.
         """
+        conventions = curve.curve_conventions
         return [ql.FuturesRateHelper(
                 ql.QuoteHandle(rate),
                 period,
-                int(curve.conventions['futures_Tenor']),
-                curve.calendar,
-                self.bus_day_convention[curve.conventions['futures_Adjustment']],
+                conventions.futures_tenor,
+                conventions.calendar,
+                conventions.futures_adjustment,
                 False, # End of month
-                curve.day_count_fraction[curve.conventions['futures_DCF']],
-                ql.QuoteHandle(ql.SimpleQuote(0.0)))
-                for period, rate in self._inst_ids]
+                conventions.futures_day_count,
+                ql.QuoteHandle(convexity_quote))
+                # convexity holds the futures in the same order as _inst_ids
+                for (period, rate), (convexity_quote, start, end)
+                in zip(self._inst_ids, self.convexity.values())]
 
 class SwapsInsts(InstrumentCollector):
     """
@@ -632,29 +1048,6 @@ class SwapsInsts(InstrumentCollector):
     def __init__(self, curve):
         super(SwapsInsts, self).__init__()
 
-        self.swap_freq = {
-        'Once'      : ql.Once,
-        'Annual'    : ql.Annual,
-        'Semiannual': ql.Semiannual,
-        'Quarterly' : ql.Quarterly,
-        'Monthly'   : ql.Monthly,
-        'Daily'     : ql.Daily
-        }
-
-        self.ibor_indices = {
-        'AUD': ql.AUDLibor,
-        'CAD': ql.Cdor,
-        'CHF': ql.CHFLibor,
-        'DKK': ql.DKKLibor,
-        'EUR': ql.Euribor,
-        'GBP': ql.GBPLibor,
-        'JPY': ql.JPYLibor,
-        'NZD': ql.NZDLibor,
-        'SEK': ql.SEKLibor,
-        'TRL': ql.TRLibor,
-        'USD': ql.USDLibor
-        }
-
         self._inst_ids = self.get_instruments(curve, 'swaps')
         self.instruments = self.get_rate_helpers(curve)
 
@@ -673,28 +1066,31 @@ class SwapsInsts(InstrumentCollector):
             swap_rate_helpers (list):   list of ql.SwapRateHelper
                                         objects.
         """
-        if curve.conventions['general_RequiresOIS'].lower() == 'true':
+        conventions = curve.curve_conventions
+        if conventions.ibor_index is None and self._inst_ids:
+            raise ValueError('No Ibor index for {curve.name}'.format(**locals()))
+        if conventions.requires_ois:
             return [ql.SwapRateHelper(
                 ql.QuoteHandle(rate),
                 period,
-                curve.calendar,
-                self.swap_freq[curve.conventions['swaps_FixedFreq']],
-                self.bus_day_convention[curve.conventions['swaps_FixedAdjustment']],
-                curve.day_count_fraction[curve.conventions['swaps_FixedLegDCF']],
-                self.ibor_indices[curve.currency](self.period_function(curve.name)),
+                conventions.calendar,
+                conventions.swaps_fixed_frequency,
+                conventions.swaps_fixed_adjustment,
+                conventions.swaps_fixed_day_count,
+                conventions.ibor_index,
                 ql.QuoteHandle(ql.SimpleQuote(0)), # spread on floating leg
                 ql.Period(0, ql.Days), # days forward start
-                ql.YieldTermStructureHandle(curve.ois_curve.qlcurve))
+                curve.discount_curve)
                 for period, rate in self._inst_ids]
         else:            
             return [ql.SwapRateHelper(
                 ql.QuoteHandle(rate),
                 period,
-                curve.calendar,
-                self.swap_freq[curve.conventions['swaps_FixedFreq']],
-                self.bus_day_convention[curve.conventions['swaps_FixedAdjustment']],
-                curve.day_count_fraction[curve.conventions['swaps_FixedLegDCF']],
-                self.ibor_indices[curve.currency](self.period_function(curve.name)))
+                conventions.calendar,
+                conventions.swaps_fixed_frequency,
+                conventions.swaps_fixed_adjustment,
+                conventions.swaps_fixed_day_count,
+                conventions.ibor_index)
                 for period, rate in self._inst_ids]
 
 class OISSwapsInsts(InstrumentCollector):
@@ -720,21 +1116,6 @@ class OISSwapsInsts(InstrumentCollector):
     def __init__(self, curve):
         super(OISSwapsInsts, self).__init__()
 
-        self.swap_freq = {
-        'Once'      : ql.Once,
-        'Annual'    : ql.Annual,
-        'Semiannual': ql.Semiannual,
-        'Quarterly' : ql.Quarterly,
-        'Monthly'   : ql.Monthly,
-        'Daily'     : ql.Daily
-        }
-
-        self.ibor_indices = {
-        'EUR': ql.Eonia(),
-        'GBP': ql.Sonia(),
-        'USD': ql.FedFunds()
-        }
-
         self._inst_ids = self.get_instruments(curve, 'swaps')
         self.instruments = self.get_rate_helpers(curve)
 
@@ -753,10 +1134,19 @@ class OISSwapsInsts(InstrumentCollector):
             swap_rate_helpers (list):   list of ql.SwapRateHelper
                                         objects.
         """
+        # with telescopic value dates, each overnight coupon only needs the
+        # fixing dates at its ends rather than one per business day; with no
+        # spread on the overnight leg the compounding telescopes, so the
+        # curve is unchanged
+        conventions = curve.curve_conventions
+        if conventions.overnight_index is None and self._inst_ids:
+            raise ValueError('No overnight index for {curve.name}'.format(**locals()))
         return [ql.OISRateHelper(
-                                   int(curve.conventions['deposits_SpotLag']),
+                                   conventions.deposits_spot_lag,
                                    period,
                                    ql.QuoteHandle(rate),
-                                   self.ibor_indices[curve.currency])
+                                   conventions.overnight_index,
+                                   ql.YieldTermStructureHandle(),
+                                   True)  # telescopic value dates
             for period, rate in self._inst_ids]
 
@@ -0,0 +1,140 @@
+"""
+This module holds the CurveCache, a small LRU cache of built Curve objects.
+The main use is dual-curve bootstrapping: every LiborCurve that requires an
+OIS curve for discounting would otherwise bootstrap its own copy, so building
+USD_1M, USD_3M and USD_6M on the same date would build USD_OIS three times.
+With a shared cache, the OIS curve is built once and reused.
+
+Curves are keyed on the curve type (eg. OISCurve), name, ISO date, data
+version, whether the curve is incremental, and the source of its market data
+(the connection, or a preloaded MarketDataSet), so that curves built
+differently are never served for each other; see CacheKey. The data version
+is supplied by the caller and should be changed whenever the underlying
+market data changes; invalidate() can also be used to drop entries
+explicitly.
+
+Note that QuantLib rate helpers move with the global evaluation date, so a
+built curve is only consistent while the evaluation date is its curve date.
+Entries for any other date are treated as stale and rebuilt.
+"""
+import collections
+
+import QuantLib as ql
+
+CacheKey = collections.namedtuple(
+    'CacheKey', 'curve_type name iso_date data_version incremental source')
+
+
+def market_data_source(market_data):
+    """
+    Returns what a curve's market data is loaded from, for the CacheKey: the
+    connection of a MarketDataRepository, so that curves built straight from
+    the same connection are shared, or the market data object itself (eg. a
+    MarketDataSet).
+    """
+    return getattr(market_data, 'conn', market_data)
+
+
+def curve_key(curve):
+    """
+    Returns the CacheKey of a built curve.
+    """
+    return CacheKey(type(curve), curve.name, curve.iso_date, curve.data_version,
+                    curve.incremental, market_data_source(curve.market_data))
+
+
+class CurveCache:
+    """
+    LRU cache of built Curve objects.
+
+    Args:
+        maxsize (int, optional):    maximum number of curves held before the
+                                    least recently used curve is evicted
+                                    default: 64
+
+    Attributes:
+        hits (int):                 number of lookups served from the cache
+        misses (int):               number of lookups that required a build
+    """
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._curves = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._curves)
+
+    def __contains__(self, key):
+        return key in self._curves
+
+    def get(self, key):
+        """
+        Returns the cached curve for a CacheKey, or None if there is no
+        usable curve in the cache. Does not count towards hits or misses.
+        """
+        curve = self._curves.get(key)
+        if curve is None:
+            return None
+        if ql.Settings.instance().evaluationDate != curve.curve_date:
+            del self._curves[key]
+            return None
+        self._curves.move_to_end(key)
+        return curve
+
+    def put(self, curve):
+        """
+        Adds a built curve to the cache, evicting the least recently used
+        curve if the cache is full.
+        """
+        key = curve_key(curve)
+        self._curves[key] = curve
+        self._curves.move_to_end(key)
+        while len(self._curves) > self.maxsize:
+            self._curves.popitem(last=False)
+
+    def get_or_build(self, curve_type, name, curve_date, conn, **kwargs):
+        """
+        Returns the cached curve if there is one, otherwise builds the curve
+        with curve_type (eg. OISCurve), caches it and returns it. Any keyword
+        arguments are passed to the curve constructor; the curve is built with
+        this cache, so nested curves are shared as well.
+
+        Args:
+            curve_type (class):         Curve subclass to build on a miss
+            name (str):                 curve name
+            curve_date (ql.Date):       curve date
+            conn (sqlite3.Connection):  market data database connection
+
+        Returns:
+            curve (Curve):              the built curve
+        """
+        market_data = kwargs.get('market_data')
+        key = CacheKey(curve_type, name, curve_date.ISO(),
+                       kwargs.get('data_version', 0),
+                       kwargs.get('incremental', False),
+                       conn if market_data is None else market_data_source(market_data))
+        curve = self.get(key)
+        if curve is not None:
+            self.hits += 1
+            return curve
+        self.misses += 1
+        kwargs['cache'] = self
+        curve = curve_type(name, curve_date, conn, **kwargs)
+        self.put(curve)
+        return curve
+
+    def invalidate(self, name=None, iso_date=None):
+        """
+        Drops cached curves. With no arguments the whole cache is cleared,
+        otherwise only the curves matching the name and/or ISO date given.
+
+        Returns:
+            count (int):                number of curves dropped
+        """
+        keys = [key for key in self._curves
+                if (name is None or key.name == name) and
+                (iso_date is None or key.iso_date == iso_date)]
+        for key in keys:
+            del self._curves[key]
+        return len(keys)
@@ -0,0 +1,57 @@
+import helpers.batch as batch
+import helpers.curve as curve
+import helpers.curve_cache as curve_cache
+
+
+def market_data_set(conn, date):
+    return batch.MarketDataSet(conn, ['USD_3M'], date.ISO(), date.ISO())
+
+
+def test_same_curve_is_shared(conn, evaluation_date):
+    cache = curve_cache.CurveCache()
+    market_data = market_data_set(conn, evaluation_date)
+    ois = cache.get_or_build(curve.OISCurve, 'USD_OIS', evaluation_date, conn,
+                             market_data=market_data)
+    assert cache.get(curve_cache.curve_key(ois)) is ois
+    # the LiborCurve discounts on the cached OIS curve
+    libor = cache.get_or_build(curve.LiborCurve, 'USD_3M', evaluation_date, conn,
+                               market_data=market_data)
+    assert libor.ois_curve is ois
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_curves_built_differently_are_not_shared(conn, evaluation_date):
+    cache = curve_cache.CurveCache()
+    market_data = market_data_set(conn, evaluation_date)
+    ois = cache.get_or_build(curve.OISCurve, 'USD_OIS', evaluation_date, conn,
+                             market_data=market_data)
+    # another curve type of the same name
+    assert cache.get(curve_cache.curve_key(ois)._replace(curve_type=curve.LiborCurve)) is None
+    others = [
+        cache.get_or_build(curve.OISCurve, 'USD_OIS', evaluation_date, conn,
+                           market_data=market_data, incremental=True),
+        cache.get_or_build(curve.OISCurve, 'USD_OIS', evaluation_date, conn,
+                           market_data=market_data_set(conn, evaluation_date)),
+        cache.get_or_build(curve.OISCurve, 'USD_OIS', evaluation_date, conn),
+        cache.get_or_build(curve.OISCurve, 'USD_OIS', evaluation_date, conn,
+                           market_data=market_data, data_version=1)
+    ]
+    assert cache.hits == 0
+    assert len(set(map(id, [ois] + others))) == len(others) + 1
+    assert len({curve_cache.curve_key(built) for built in [ois] + others}) == len(others) + 1
+
+
+def test_curves_from_the_connection_are_shared(conn, evaluation_date):
+    cache = curve_cache.CurveCache()
+    ois = cache.get_or_build(curve.OISCurve, 'USD_OIS', evaluation_date, conn)
+    assert cache.get_or_build(curve.OISCurve, 'USD_OIS', evaluation_date, conn) is ois
+    assert curve_cache.market_data_source(ois.market_data) is conn
+
+
+def test_invalidate(conn, evaluation_date):
+    cache = curve_cache.CurveCache()
+    cache.get_or_build(curve.LiborCurve, 'USD_3M', evaluation_date, conn,
+                       market_data=market_data_set(conn, evaluation_date))
+    assert cache.invalidate(name='USD_OIS') == 1
+    assert cache.invalidate(iso_date=evaluation_date.ISO()) == 1
+    assert len(cache) == 0
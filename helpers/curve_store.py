@@ -0,0 +1,178 @@
+"""
+This module holds the CurveStore, which keeps bootstrapped curve nodes in
+the built_curves table of the market data database, so that a curve whose
+inputs haven't changed since it was last built is rehydrated from its stored
+nodes instead of being bootstrapped again.
+
+Each stored curve is stamped with a hash of everything the bootstrap depends
+on: the curve type, its conventions and instrument rates, those of the OIS
+curve it discounts with (if any), and STORE_VERSION. A stored curve is only
+used when the hash of the current inputs matches; otherwise the curve is
+rebuilt and the stored nodes are replaced. STORE_VERSION should be bumped
+whenever a change to the curve code changes the curves built from the same
+data.
+
+The store is used by passing it to the Curve objects, eg.
+
+    store = curve_store.CurveStore(conn)
+    usd = curve.LiborCurve('USD_3M', date, conn, store=store)
+
+A rehydrated curve answers node and discount factor queries from its
+NodeCurve; the QuantLib curve is only bootstrapped if something needs it
+(eg. the instruments, or update_quotes()).
+
+Each save() commits, unless it's made within a batch(), eg. the builds of a
+whole history (see batch.build_curves), which commit once at the end.
+"""
+import contextlib
+import hashlib
+import json
+
+import numpy as np
+
+import helpers.db_handler as db_handler
+import helpers.node_curve as node_curve
+
+STORE_VERSION = 1
+
+LOAD_SQL = ('SELECT reference_serial, day_count, interpolation, extrapolate, '
+            'node_serials, discount_factors '
+            'FROM built_curves WHERE curve_name = ? AND date = ? AND input_hash = ?')
+SAVE_SQL = 'INSERT OR REPLACE INTO built_curves VALUES (?,?,?,?,?,?,?,?,?);'
+
+
+def input_names(curve):
+    """
+    Returns the names of the curves whose market data a curve is built
+    from: the curve itself and, for dual-curve bootstraps, its OIS curve.
+    """
+    names = [curve.name]
+    if curve.conventions['general_RequiresOIS'].lower() == 'true':
+        names.append(curve.conventions['general_Currency'] + '_OIS')
+    return names
+
+
+def input_hash(curve):
+    """
+    Returns the SHA-256 hex digest of the inputs a curve is built from.
+    """
+    curve.load_data()
+    inputs = [STORE_VERSION, type(curve).__name__, curve.iso_date]
+    for name in input_names(curve):
+        conventions = curve.market_data.conventions(name)
+        rates = curve.market_data.instrument_rates(name, curve.iso_date)
+        inputs.append([name,
+                       sorted(conventions.items()),
+                       sorted((inst_type, sorted(insts))
+                              for inst_type, insts in rates.items())])
+    return hashlib.sha256(json.dumps(inputs).encode()).hexdigest()
+
+
+class CurveStore:
+    """
+    Persistent store of built curve nodes, keyed on (curve name, ISO date)
+    and stamped with the input hash.
+
+    Args:
+        conn (sqlite3.Connection):  market data database connection
+
+    Attributes:
+        hits (int):                 number of curves rehydrated
+        misses (int):               number of lookups with no stored curve
+                                    for the current inputs
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.hits = 0
+        self.misses = 0
+        self._batches = 0
+        # id(curve) -> (curve, ISO date, input hash) of the lookups that
+        # missed, as those curves are then built and saved from the same
+        # inputs (a LiborCurve's OIS curve is looked up and saved in between)
+        self._missed = {}
+        cursor = conn.cursor()
+        db_handler.create_built_curves_table(cursor)
+        conn.commit()
+
+    def load(self, curve):
+        """
+        Returns the stored (node ISO dates, discount factors, NodeCurve) of a
+        curve if they were built from the same inputs, otherwise None.
+        """
+        digest = input_hash(curve)
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(LOAD_SQL, (curve.name, curve.iso_date, digest))
+        row = cursor.fetchone()
+        if row is None:
+            self.misses += 1
+            self._missed[id(curve)] = (curve, curve.iso_date, digest)
+            return None
+        self.hits += 1
+
+        reference_serial, day_count, interpolation, extrapolate, serials, dfs = row
+        serials = np.frombuffer(serials, dtype=np.int64)
+        dfs = np.frombuffer(dfs, dtype=np.float64)
+        nodes = node_curve.NodeCurve.from_discount_factors(
+            reference_serial, serials, dfs, day_count, bool(extrapolate),
+            interpolation)
+        iso_dates = [str(date) for date in node_curve.to_datetime64(serials)]
+        return iso_dates, dfs.tolist(), nodes
+
+    def save(self, curve):
+        """
+        Stores the nodes of a built curve, replacing any previous version.
+        The QuantLib evaluation date should be the curve date.
+        """
+        missed = self._missed.pop(id(curve), None)
+        if missed is not None and missed[1] == curve.iso_date:
+            digest = missed[2]
+        else:
+            digest = input_hash(curve)
+        nodes = curve.node_curve
+        serials = node_curve.to_serials(np.array(curve.dates, dtype='datetime64[D]'))
+        dfs = np.asarray(curve.discount_factors, dtype=np.float64)
+        cursor = self.conn.cursor()
+        cursor.execute(SAVE_SQL, (curve.name, curve.iso_date, digest,
+                                  nodes.reference_serial, nodes.day_count,
+                                  nodes.interpolation, int(nodes.extrapolate),
+                                  serials.tobytes(), dfs.tobytes()))
+        if not self._batches:
+            self.conn.commit()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Defers the commits of the curves saved in the with block to a single
+        commit at its end. Batches can be nested; the outermost one commits.
+        """
+        self._batches += 1
+        try:
+            yield self
+        finally:
+            self._batches -= 1
+            if not self._batches:
+                self.conn.commit()
+                # curves that failed to build are never saved
+                self._missed.clear()
+
+    def invalidate(self, name=None, iso_date=None):
+        """
+        Deletes stored curves. With no arguments every curve is deleted,
+        otherwise only the curves matching the name and/or ISO date given.
+
+        Returns:
+            count (int):                number of curves deleted
+        """
+        sql = 'DELETE FROM built_curves WHERE 1 = 1'
+        params = []
+        if name is not None:
+            sql += ' AND curve_name = ?'
+            params.append(name)
+        if iso_date is not None:
+            sql += ' AND date = ?'
+            params.append(iso_date)
+        cursor = self.conn.cursor()
+        cursor.execute(sql, params)
+        self.conn.commit()
+        return cursor.rowcount
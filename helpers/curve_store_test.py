@@ -0,0 +1,153 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import helpers.batch as batch
+import helpers.curve as curve
+import helpers.curve_store as curve_store
+
+
+class ShiftedMarketData:
+    # market data with every rate of one curve shifted
+    def __init__(self, market_data, name, shift):
+        self.market_data = market_data
+        self.name = name
+        self.shift = shift
+
+    def conventions(self, name):
+        return self.market_data.conventions(name)
+
+    def instrument_rates(self, name, iso_date):
+        instrument_rates = self.market_data.instrument_rates(name, iso_date)
+        if name != self.name:
+            return instrument_rates
+        return {inst_type: [(inst, maturity, rate + self.shift)
+                            for inst, maturity, rate in insts]
+                for inst_type, insts in instrument_rates.items()}
+
+
+@pytest.fixture
+def store(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'store.db'))
+    yield curve_store.CurveStore(conn)
+    conn.close()
+
+
+@pytest.fixture
+def market_data(conn, evaluation_date):
+    return batch.MarketDataSet(conn, ['USD_3M'], evaluation_date.ISO(),
+                               evaluation_date.ISO())
+
+
+def build(conn, date, market_data, store):
+    return curve.LiborCurve('USD_3M', date, conn, market_data=market_data, store=store)
+
+
+def query_serials(built):
+    return np.arange(built.settlement_date.serialNumber(),
+                     built.qlcurve.maxDate().serialNumber(), 7)
+
+
+def test_rehydrates_unchanged_curve(conn, evaluation_date, market_data, store):
+    built = build(conn, evaluation_date, market_data, store)
+    assert not built.rehydrated
+    serials = query_serials(built)
+    expected = built.discount_factor_array(serials)
+
+    rehydrated = build(conn, evaluation_date, market_data, store)
+    assert rehydrated.rehydrated
+    assert not rehydrated.built
+    assert rehydrated.dates == built.dates
+    np.testing.assert_array_equal(rehydrated.discount_factors, built.discount_factors)
+    np.testing.assert_allclose(rehydrated.discount_factor_array(serials), expected,
+                               rtol=0, atol=5e-15)
+
+    # bootstrapped when the quotes are needed, giving the same curve
+    rehydrated.update_quotes({})
+    assert rehydrated.built
+    np.testing.assert_allclose(rehydrated.discount_factor_array(serials), expected,
+                               rtol=0, atol=1e-15)
+
+
+@pytest.mark.parametrize('name', ['USD_3M', 'USD_OIS'])
+def test_changed_inputs_rebuild(conn, evaluation_date, market_data, store, name):
+    # the hash covers the OIS curve a LIBOR curve discounts with
+    build(conn, evaluation_date, market_data, store)
+    shifted = build(conn, evaluation_date,
+                    ShiftedMarketData(market_data, name, 0.0001), store)
+    assert not shifted.rehydrated
+    # the stored curve is replaced
+    assert not build(conn, evaluation_date, market_data, store).rehydrated
+
+
+def test_input_hash(conn, evaluation_date, market_data):
+    built = build(conn, evaluation_date, market_data, None)
+    assert curve_store.input_names(built) == ['USD_3M', 'USD_OIS']
+    assert curve_store.input_hash(built) == curve_store.input_hash(
+        build(conn, evaluation_date, market_data, None))
+    ois = curve.OISCurve('USD_OIS', evaluation_date, conn, market_data=market_data)
+    assert curve_store.input_names(ois) == ['USD_OIS']
+    assert curve_store.input_hash(ois) != curve_store.input_hash(built)
+
+
+def test_invalidate(conn, evaluation_date, market_data, store):
+    build(conn, evaluation_date, market_data, store)
+    assert store.invalidate(name='USD_3M') == 1
+    assert not build(conn, evaluation_date, market_data, store).rehydrated
+    assert store.invalidate(iso_date=evaluation_date.ISO()) == 2
+    assert store.invalidate() == 0
+
+
+class CountingConnection:
+    # counts the commits made on a connection
+    def __init__(self, conn):
+        self.conn = conn
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+        self.conn.commit()
+
+    def __getattr__(self, attribute):
+        return getattr(self.conn, attribute)
+
+
+def test_inputs_hashed_once_per_build(conn, evaluation_date, market_data, store,
+                                      monkeypatch):
+    hashes = []
+    input_hash = curve_store.input_hash
+    monkeypatch.setattr(curve_store, 'input_hash',
+                        lambda built: hashes.append(built.name) or input_hash(built))
+    build(conn, evaluation_date, market_data, store)
+    assert sorted(hashes) == ['USD_3M', 'USD_OIS']
+
+
+def test_history_commits_once(conn, history_dates, tmp_path):
+    store_conn = CountingConnection(sqlite3.connect(str(tmp_path / 'store.db')))
+    store = curve_store.CurveStore(store_conn)
+    for incremental in (False, True):
+        store.invalidate()
+        store_conn.commits = 0
+        batch.build_curves(['USD_3M', 'USD_OIS'], history_dates, conn, store=store,
+                           incremental=incremental)
+        assert store_conn.commits == 1
+        assert store.conn.execute('SELECT COUNT(*) FROM built_curves').fetchone()[0] == \
+            2 * len(history_dates)
+    store_conn.close()
+
+
+def test_rolls_rehydrate(conn, history_dates, store):
+    names = ['USD_3M', 'USD_OIS']
+    built = batch.build_curves(names, history_dates, conn, store=store)
+    assert store.misses == 2 * len(history_dates)
+    rolled = batch.build_curves(names, history_dates, conn, store=store,
+                                incremental=True)
+    # every date is rehydrated, the first by building and the rest by rolling
+    assert store.hits == 2 * len(history_dates)
+    assert store.misses == 2 * len(history_dates)
+    for name in names:
+        assert not rolled[name].failures
+        np.testing.assert_array_equal(rolled[name].node_dates, built[name].node_dates)
+        np.testing.assert_array_equal(rolled[name].discount_factors,
+                                      built[name].discount_factors)
@@ -0,0 +1,88 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import helpers.batch as batch
+import helpers.curve as curve
+import helpers.curve_store as curve_store
+
+
+@pytest.fixture
+def market_data(conn, evaluation_date):
+    return batch.MarketDataSet(conn, ['USD_3M'], evaluation_date.ISO(),
+                               evaluation_date.ISO())
+
+
+@pytest.fixture
+def store(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'store.db'))
+    yield curve_store.CurveStore(conn)
+    conn.close()
+
+
+@pytest.fixture
+def eager(conn, evaluation_date, market_data):
+    return curve.LiborCurve('USD_3M', evaluation_date, conn, market_data=market_data)
+
+
+def query_serials(built):
+    return np.arange(built.settlement_date.serialNumber(),
+                     built.qlcurve.maxDate().serialNumber(), 7)
+
+
+def quote_values(built):
+    return {inst: quote.value() for inst, quote in built.quotes.items()}
+
+
+def assert_same_curve(built, expected):
+    assert built.dates == expected.dates
+    assert built.discount_factors == expected.discount_factors
+    assert quote_values(built) == quote_values(expected)
+    assert len(built.instruments) == len(expected.instruments)
+    assert built.ois_curve.dates == expected.ois_curve.dates
+    assert built.ois_curve.discount_factors == expected.ois_curve.discount_factors
+    serials = query_serials(expected)
+    np.testing.assert_array_equal(built.discount_factor_array(serials),
+                                  expected.discount_factor_array(serials))
+
+
+def test_lazy_builds_on_first_use(conn, evaluation_date, market_data, eager):
+    lazy = curve.LiborCurve('USD_3M', evaluation_date, conn, market_data=market_data,
+                            lazy=True)
+    assert not lazy.loaded and not lazy.built
+    assert lazy.discount_factor(evaluation_date + 365) == eager.discount_factor(
+        evaluation_date + 365)
+    assert_same_curve(lazy, eager)
+
+
+@pytest.mark.parametrize('attribute', ['instruments', 'quotes', 'convexity', 'ois_curve'])
+def test_lazy_builds_for_built_attributes(conn, evaluation_date, market_data, eager,
+                                          attribute):
+    lazy = curve.LiborCurve('USD_3M', evaluation_date, conn, market_data=market_data,
+                            lazy=True)
+    getattr(lazy, attribute)
+    assert lazy.built
+    assert_same_curve(lazy, eager)
+
+
+def test_lazy_loads_for_loaded_attributes(conn, evaluation_date, market_data, eager):
+    lazy = curve.LiborCurve('USD_3M', evaluation_date, conn, market_data=market_data,
+                            lazy=True)
+    assert lazy.settlement_date == eager.settlement_date
+    assert lazy.interpolation == eager.interpolation
+    assert lazy.loaded and not lazy.built
+    with pytest.raises(AttributeError, match='no attribute ois_curvename'):
+        lazy.ois_curvename
+
+
+def test_rehydrated_builds_for_built_attributes(conn, evaluation_date, market_data,
+                                                eager, store):
+    curve.LiborCurve('USD_3M', evaluation_date, conn, market_data=market_data,
+                     store=store)
+    rehydrated = curve.LiborCurve('USD_3M', evaluation_date, conn,
+                                  market_data=market_data, store=store)
+    assert rehydrated.rehydrated and not rehydrated.built
+    assert quote_values(rehydrated) == quote_values(eager)
+    assert rehydrated.built
+    assert_same_curve(rehydrated, eager)
@@ -1,6 +1,14 @@
 import csv
+import itertools
+import os
 import sqlite3
 
+# the csvs a new database is created from, found relative to the package so
+# that the database can be created or upgraded from any working directory
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+RATES_COLUMNS = ['curve_name', 'date', 'instrument', 'rate']
+INSERT_RATES_STMT = 'INSERT OR REPLACE INTO rates VALUES (?,?,?,?);'
+
 def load_csv(cursor, file_name):
     '''
     Invert and load simple csv's to the database as tables
@@ -11,7 +19,7 @@ def load_csv(cursor, file_name):
         columns = zip(*rows)
         headers = next(columns)
 
-    table_name = file_name.split('/')[-1].split('.')[0]
+    table_name = os.path.basename(file_name).split('.')[0]
     
     create_table_stmt = ('CREATE TABLE IF NOT EXISTS '
                          '{table_name}{headers};').format(**locals())
@@ -21,6 +29,303 @@ def load_csv(cursor, file_name):
     cursor.execute(create_table_stmt)
     cursor.executemany(insert_stmt, columns)
 
+def create_rates_table(cursor):
+    '''
+    Create the normalized rates table, with one row per (curve, date,
+    instrument). The primary key doubles as the index for curve and date
+    range lookups, and adding an instrument needs no schema change.
+    '''
+    cursor.execute('CREATE TABLE IF NOT EXISTS rates ('
+                   'curve_name TEXT NOT NULL, '
+                   'date TEXT NOT NULL, '
+                   'instrument TEXT NOT NULL, '
+                   'rate REAL NOT NULL, '
+                   'PRIMARY KEY (curve_name, date, instrument)'
+                   ') WITHOUT ROWID;')
+
+def _long_rows(headers, columns):
+    # turn wide (curve_name, date, inst_1, inst_2, ...) rows into
+    # (curve_name, date, instrument, rate) rows, skipping blank rates
+    for column in columns:
+        curve_name, date = column[0], column[1]
+        for instrument, rate in zip(headers[2:], column[2:]):
+            if rate is not None and rate != '':
+                yield (curve_name, date, instrument, float(rate))
+
+def _stream_csv_rates(csv_file):
+    # yield (curve_name, date, instrument, rate) rows from either a long
+    # format csv (curve_name,date,instrument,rate) or a transposed csv
+    # (instruments down the first column, one column per curve and date),
+    # reading one line at a time
+    reader = csv.reader(csv_file)
+    first_row = next(reader)
+    if [col.strip().lower() for col in first_row] == RATES_COLUMNS:
+        for row in reader:
+            if len(row) == 4 and row[3] != '':
+                yield (row[0], row[1], row[2], float(row[3]))
+    else:
+        curve_names = first_row[1:]
+        dates = next(reader)[1:]
+        for row in reader:
+            instrument = row[0]
+            for curve_name, date, rate in zip(curve_names, dates, row[1:]):
+                if rate != '':
+                    yield (curve_name, date, instrument, float(rate))
+
+def _stream_arrow_rates(file_name, batch_size):
+    # yield rate rows from a Parquet or Arrow IPC file, one record batch at
+    # a time. pyarrow is only needed for these formats.
+    try:
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('pyarrow is required to load Parquet and Arrow files')
+
+    if file_name.endswith('.parquet'):
+        batches = pyarrow.parquet.ParquetFile(file_name).iter_batches(
+            batch_size=batch_size, columns=RATES_COLUMNS)
+    else:
+        reader = pyarrow.ipc.open_file(file_name)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+
+    for batch in batches:
+        columns = [batch.column(batch.schema.get_field_index(name)).to_pylist()
+                   for name in RATES_COLUMNS]
+        for curve_name, date, instrument, rate in zip(*columns):
+            if rate is not None:
+                yield (curve_name, _iso_date(date), instrument, float(rate))
+
+def _iso_date(date):
+    # date32 and timestamp columns come back as datetime.date and
+    # datetime.datetime; the rates table holds ISO dates, eg. '2015-01-02'
+    if hasattr(date, 'isoformat'):
+        return date.isoformat()[:10]
+    return str(date)
+
+def load_rates_csv(cursor, file_name):
+    '''
+    Load a rates csv -- either transposed, as in data/rates_data.csv, or in
+    long (curve_name, date, instrument, rate) format -- into the normalized
+    rates table. The file is streamed rather than read into memory.
+    '''
+    with open(file_name, 'r', newline='') as csv_file:
+        create_rates_table(cursor)
+        cursor.executemany(INSERT_RATES_STMT, _stream_csv_rates(csv_file))
+
+def ingest_rates(conn, file_name, batch_size=50000):
+    '''
+    Bulk load a large file of historical rates into the rates table with
+    constant memory. Rows are read incrementally and inserted with
+    executemany in batches of batch_size, committing after each batch.
+    While loading, the database runs in WAL mode with synchronous=OFF;
+    the previous journal mode and synchronous setting are restored
+    afterwards.
+
+    Accepts csv files (transposed or long format), and Parquet (.parquet)
+    or Arrow IPC (.arrow, .feather) files with curve_name, date,
+    instrument, and rate columns.
+
+    Returns the number of rows loaded.
+    '''
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    synchronous = cursor.execute('PRAGMA synchronous;').fetchone()[0]
+    journal_mode = cursor.execute('PRAGMA journal_mode;').fetchone()[0]
+    cursor.execute('PRAGMA journal_mode=WAL;')
+    cursor.execute('PRAGMA synchronous=OFF;')
+    create_rates_table(cursor)
+    conn.commit()
+
+    count = 0
+    try:
+        if file_name.endswith(('.parquet', '.arrow', '.feather')):
+            rows = _stream_arrow_rates(file_name, batch_size)
+            count = _insert_batches(conn, cursor, rows, batch_size)
+        else:
+            with open(file_name, 'r', newline='') as csv_file:
+                rows = _stream_csv_rates(csv_file)
+                count = _insert_batches(conn, cursor, rows, batch_size)
+    finally:
+        # the journal mode can only change outside a transaction
+        conn.commit()
+        cursor.execute('PRAGMA journal_mode={journal_mode};'.format(**locals()))
+        cursor.execute('PRAGMA synchronous={synchronous};'.format(**locals()))
+    return count
+
+def _insert_batches(conn, cursor, rows, batch_size):
+    count = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return count
+        cursor.executemany(INSERT_RATES_STMT, batch)
+        conn.commit()
+        count += len(batch)
+
+def migrate_rates_data(cursor):
+    '''
+    Copy the wide rates_data table of an existing database into the
+    normalized rates table. Returns False if there is no rates_data table.
+    '''
+    cursor.execute('SELECT name FROM sqlite_master '
+                   "WHERE type = 'table' AND name = 'rates_data';")
+    if cursor.fetchone() is None:
+        return False
+
+    create_rates_table(cursor)
+    read_cursor = cursor.connection.cursor()
+    read_cursor.row_factory = None
+    read_cursor.execute('SELECT * FROM rates_data;')
+    headers = [col[0] for col in read_cursor.description]
+    cursor.executemany(INSERT_RATES_STMT, _long_rows(headers, read_cursor))
+    return True
+
+def create_instrument_tables(cursor):
+    '''
+    Create the curve_instruments table, listing the instruments used to
+    build each curve, and the instrument_conventions table, holding the
+    type (eg. 'swaps') and maturity (eg. '10YR') of each instrument.
+    '''
+    cursor.execute('CREATE TABLE IF NOT EXISTS curve_instruments ('
+                   'curve_name TEXT NOT NULL, '
+                   'instrument TEXT NOT NULL, '
+                   'PRIMARY KEY (curve_name, instrument)'
+                   ') WITHOUT ROWID;')
+    cursor.execute('CREATE TABLE IF NOT EXISTS instrument_conventions ('
+                   'instrument TEXT PRIMARY KEY, '
+                   'instrument_type TEXT NOT NULL, '
+                   'instrument_maturity TEXT NOT NULL'
+                   ') WITHOUT ROWID;')
+
+def _insert_instruments(cursor, rows):
+    # rows of (curve_name, instrument, flag); instrument names take the
+    # form type_maturity, eg. 'swaps_10YR', 'fras_3x6' or 'futures_1'
+    create_instrument_tables(cursor)
+    for curve_name, instrument, flag in rows:
+        if str(flag).upper() != 'TRUE':
+            continue
+        instrument_type, instrument_maturity = instrument.split('_', 1)
+        cursor.execute('INSERT OR IGNORE INTO curve_instruments '
+                       'VALUES (?,?);', (curve_name, instrument))
+        cursor.execute('INSERT OR IGNORE INTO instrument_conventions '
+                       'VALUES (?,?,?);',
+                       (instrument, instrument_type, instrument_maturity))
+
+def load_instruments_csv(cursor, file_name):
+    '''
+    Load a transposed instruments csv (instruments down the first column,
+    one column per curve, flagged TRUE if the curve uses the instrument, as
+    in data/instruments.csv) into the curve_instruments and
+    instrument_conventions tables.
+    '''
+    def flags(reader):
+        curve_names = next(reader)[1:]
+        for row in reader:
+            for curve_name, flag in zip(curve_names, row[1:]):
+                yield (curve_name, row[0], flag)
+
+    with open(file_name, 'r', newline='') as csv_file:
+        _insert_instruments(cursor, flags(csv.reader(csv_file)))
+
+def migrate_instruments(cursor):
+    '''
+    Copy the wide instruments table of an existing database into the
+    curve_instruments and instrument_conventions tables. Returns False if
+    there is no instruments table.
+    '''
+    cursor.execute('SELECT name FROM sqlite_master '
+                   "WHERE type = 'table' AND name = 'instruments';")
+    if cursor.fetchone() is None:
+        return False
+
+    read_cursor = cursor.connection.cursor()
+    read_cursor.row_factory = None
+    read_cursor.execute('SELECT * FROM instruments;')
+    headers = [col[0] for col in read_cursor.description]
+    _insert_instruments(cursor, [(row[0], instrument, flag)
+                                 for row in read_cursor
+                                 for instrument, flag in zip(headers[1:], row[1:])])
+    return True
+
+def create_built_curves_table(cursor):
+    '''
+    Create the built_curves table, holding the bootstrapped nodes of each
+    (curve, date) with a hash of the inputs they were built from (see
+    curve_store.py). Node serials and discount factors are stored as
+    int64 and float64 array blobs.
+    '''
+    cursor.execute('CREATE TABLE IF NOT EXISTS built_curves ('
+                   'curve_name TEXT NOT NULL, '
+                   'date TEXT NOT NULL, '
+                   'input_hash TEXT NOT NULL, '
+                   'reference_serial INTEGER NOT NULL, '
+                   'day_count TEXT NOT NULL, '
+                   'interpolation TEXT NOT NULL, '
+                   'extrapolate INTEGER NOT NULL, '
+                   'node_serials BLOB NOT NULL, '
+                   'discount_factors BLOB NOT NULL, '
+                   'PRIMARY KEY (curve_name, date)'
+                   ') WITHOUT ROWID;')
+
+def upgrade_conventions(cursor, file_name):
+    '''
+    Add any conventions in a conventions csv that the conventions table of an
+    existing database lacks (eg. general_Interpolation) as new columns,
+    filled in for the curves in the csv. Returns the names of the columns
+    added.
+    '''
+    with open(file_name, 'r') as csv_file:
+        rows = list(csv.reader(csv_file))
+    curve_names = rows[0][1:]
+
+    cursor.execute('PRAGMA table_info(conventions);')
+    existing = set(row[1] for row in cursor.fetchall())
+    if not existing:
+        return []
+    added = []
+    for row in rows[1:]:
+        column = row[0]
+        if column in existing:
+            continue
+        cursor.execute("ALTER TABLE conventions ADD COLUMN '{column}';".format(**locals()))
+        cursor.executemany("UPDATE conventions SET '{column}' = ? "
+                           'WHERE curve_name = ?;'.format(**locals()),
+                           [(value, curve_name) for curve_name, value
+                            in zip(curve_names, row[1:])])
+        added.append(column)
+    return added
+
+def upgrade_db(conn):
+    '''
+    Bring an existing market_data database up to the current schema:
+    migrate the wide rates_data and instruments tables to the normalized
+    tables if needed, and add any missing tables, indexes, and conventions.
+    '''
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute('SELECT name FROM sqlite_master '
+                   "WHERE type = 'table' AND name = 'rates';")
+    if cursor.fetchone() is None:
+        migrate_rates_data(cursor)
+    cursor.execute('SELECT name FROM sqlite_master '
+                   "WHERE type = 'table' AND name = 'curve_instruments';")
+    if cursor.fetchone() is None:
+        migrate_instruments(cursor)
+    upgrade_conventions(cursor, os.path.join(DATA_DIR, 'conventions.csv'))
+    create_built_curves_table(cursor)
+    create_indexes(cursor)
+    conn.commit()
+
+def create_indexes(cursor):
+    '''
+    Index the market data tables on the columns the curve queries filter on,
+    so lookups stay logarithmic as the tables grow. The rates and
+    instrument tables are indexed by their primary keys. Safe to run against
+    an existing database.
+    '''
+    cursor.execute('CREATE INDEX IF NOT EXISTS conventions_curve '
+                   'ON conventions (curve_name);')
+
 def create_db(db_name):
     '''
     Create a market_data qlpy database with requisite simple tables if
@@ -29,9 +334,11 @@ def create_db(db_name):
     conn = sqlite3.connect(db_name)
     cursor = conn.cursor()
 
-    load_csv(cursor, 'data/rates_data.csv')
-    load_csv(cursor, 'data/instruments.csv')
-    load_csv(cursor, 'data/conventions.csv')
+    load_rates_csv(cursor, os.path.join(DATA_DIR, 'rates_data.csv'))
+    load_instruments_csv(cursor, os.path.join(DATA_DIR, 'instruments.csv'))
+    load_csv(cursor, os.path.join(DATA_DIR, 'conventions.csv'))
+    create_built_curves_table(cursor)
+    create_indexes(cursor)
 
     conn.commit()
 
@@ -0,0 +1,107 @@
+import datetime
+import sqlite3
+
+import pytest
+
+import helpers.db_handler as db_handler
+
+ROWS = [('USD_3M', '2015-01-02', 'swaps_10YR', 0.0221),
+        ('USD_3M', '2015-01-02', 'swaps_30YR', 0.0259),
+        ('USD_OIS', '2015-01-05', 'swaps_10YR', 0.0198)]
+
+
+@pytest.fixture
+def target(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'target.db'))
+    yield conn
+    conn.close()
+
+
+def stored_rows(conn):
+    return conn.execute('SELECT curve_name, date, instrument, rate FROM rates '
+                        'ORDER BY curve_name, date, instrument').fetchall()
+
+
+def pragmas(conn):
+    return (conn.execute('PRAGMA journal_mode;').fetchone()[0],
+            conn.execute('PRAGMA synchronous;').fetchone()[0])
+
+
+def test_ingest_long_csv(target, tmp_path):
+    file_name = str(tmp_path / 'rates.csv')
+    with open(file_name, 'w') as csv_file:
+        csv_file.write('curve_name,date,instrument,rate\n')
+        for row in ROWS:
+            csv_file.write(','.join(map(str, row)) + '\n')
+    before = pragmas(target)
+    assert db_handler.ingest_rates(target, file_name, batch_size=2) == len(ROWS)
+    assert stored_rows(target) == ROWS
+    assert pragmas(target) == before
+
+
+@pytest.mark.parametrize('date_type', ['date32', 'timestamp'])
+def test_ingest_parquet(target, tmp_path, date_type):
+    pa = pytest.importorskip('pyarrow')
+    parquet = pytest.importorskip('pyarrow.parquet')
+    dates = [datetime.datetime.strptime(row[1], '%Y-%m-%d') for row in ROWS]
+    if date_type == 'date32':
+        dates = pa.array([date.date() for date in dates], type=pa.date32())
+    else:
+        dates = pa.array(dates, type=pa.timestamp('us'))
+    table = pa.table({'curve_name': [row[0] for row in ROWS], 'date': dates,
+                      'instrument': [row[2] for row in ROWS],
+                      'rate': [row[3] for row in ROWS]})
+    file_name = str(tmp_path / 'rates.parquet')
+    parquet.write_table(table, file_name)
+
+    before = pragmas(target)
+    assert db_handler.ingest_rates(target, file_name) == len(ROWS)
+    # the dates are stored as ISO dates, whatever their Arrow type
+    assert stored_rows(target) == ROWS
+    assert pragmas(target) == before
+
+
+def table_rows(conn, table_name):
+    return sorted(conn.execute('SELECT * FROM {}'.format(table_name)).fetchall())
+
+
+def conventions_by_curve(conn):
+    # the conventions of each curve, whatever the order of the columns
+    cursor = conn.execute('SELECT * FROM conventions')
+    headers = [column[0] for column in cursor.description]
+    return {row[0]: dict(zip(headers, row)) for row in cursor}
+
+
+def test_upgrade_baseline_db(baseline_db_name, db_name):
+    conn = sqlite3.connect(baseline_db_name)
+    # the wide tables, as the curves used to query them
+    cursor = conn.execute('SELECT * FROM rates_data')
+    headers = [column[0] for column in cursor.description]
+    wide_rates = [(row[0], row[1], instrument, float(rate)) for row in cursor
+                  for instrument, rate in zip(headers[2:], row[2:]) if rate != '']
+    cursor = conn.execute('SELECT * FROM instruments')
+    headers = [column[0] for column in cursor.description]
+    flagged = [(row[0], instrument) for row in cursor
+               for instrument, flag in zip(headers[1:], row[1:]) if flag.upper() == 'TRUE']
+
+    db_handler.upgrade_db(conn)
+    assert stored_rows(conn) == sorted(wide_rates)
+    assert table_rows(conn, 'curve_instruments') == sorted(flagged)
+
+    # the same as a database created from the csvs
+    created = sqlite3.connect(db_name)
+    assert stored_rows(conn) == [row for row in stored_rows(created)
+                                 if row[1] == '2014-12-31']
+    for table_name in ('curve_instruments', 'instrument_conventions'):
+        assert table_rows(conn, table_name) == table_rows(created, table_name)
+    assert conventions_by_curve(conn) == conventions_by_curve(created)
+    assert {row[0] for row in conn.execute('SELECT name FROM sqlite_master')} >= \
+        {'built_curves', 'conventions_curve'}
+    created.close()
+
+    # upgrading again changes nothing
+    before = [table_rows(conn, table_name) for table_name in ('rates', 'curve_instruments')]
+    db_handler.upgrade_db(conn)
+    assert [table_rows(conn, table_name)
+            for table_name in ('rates', 'curve_instruments')] == before
+    conn.close()
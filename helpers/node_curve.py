@@ -0,0 +1,429 @@
+"""
+This module holds the NodeCurve, a numpy-only representation of a
+bootstrapped curve: the curve's reference date, the times of its nodes, and
+the interpolated values at each node. It can answer discount factor, zero
+rate, and forward rate queries for whole arrays of dates at once, instead of
+one QuantLib call per date.
+
+The interpolation mirrors the QuantLib curve it was taken from, so results
+agree with qlcurve.discount() to floating point tolerance. The cubic zero
+curve (ql.PiecewiseCubicZero, which uses the default Kruger cubic on
+continuously compounded zero rates), the monotonic parabolic cubic zero
+curve, the linear zero curve, and the log-linear (or flat
+forward) and Kruger log cubic discount curves are supported.
+
+Dates are passed either as numpy datetime64 arrays or as arrays of QuantLib
+serial numbers.
+"""
+import numpy as np
+
+# QuantLib date serial numbers count days from 30-Dec-1899
+QL_EPOCH = np.datetime64('1899-12-30', 'D')
+
+
+def to_serials(dates):
+    """
+    Converts an array of datetime64 dates, or of QuantLib serial numbers, to
+    an array of integer serial numbers.
+    """
+    dates = np.asarray(dates)
+    if np.issubdtype(dates.dtype, np.datetime64):
+        return (dates.astype('datetime64[D]') - QL_EPOCH).astype(np.int64)
+    return dates.astype(np.int64)
+
+
+def to_datetime64(serials):
+    """
+    Converts an array of QuantLib serial numbers to datetime64[D] dates.
+    """
+    return QL_EPOCH + np.asarray(serials, dtype=np.int64)
+
+
+def _thirty360(start, end):
+    # 30/360 bond basis
+    start, end = to_datetime64(start), to_datetime64(end)
+    y1, y2 = [d.astype('datetime64[Y]').astype(np.int64) for d in (start, end)]
+    m1, m2 = [(d.astype('datetime64[M]').astype(np.int64) % 12) + 1 for d in (start, end)]
+    d1, d2 = [(d - d.astype('datetime64[M]')).astype(np.int64) + 1 for d in (start, end)]
+    d1 = np.minimum(d1, 30)
+    d2 = np.where((d2 == 31) & (d1 == 30), 30, d2)
+    return (360 * (y2 - y1) + 30 * (m2 - m1) + (d2 - d1)) / 360.0
+
+
+def _actact(start, end):
+    # Actual/Actual ISDA: days in each calendar year over that year's length
+    def year_start(years):
+        return to_serials((years - 1970).astype('datetime64[Y]'))
+
+    def year_of(serials):
+        return to_datetime64(serials).astype('datetime64[Y]').astype(np.int64) + 1970
+
+    lo, hi = np.minimum(start, end), np.maximum(start, end)
+    y1, y2 = year_of(lo), year_of(hi)
+    fraction = ((year_start(y1 + 1) - lo) / (year_start(y1 + 1) - year_start(y1)) +
+                (y2 - y1 - 1) +
+                (hi - year_start(y2)) / (year_start(y2 + 1) - year_start(y2)))
+    return np.sign(end - start) * fraction
+
+
+year_fraction_functions = {
+    'Act360': lambda start, end: (end - start) / 360.0,
+    'Act365Fixed': lambda start, end: (end - start) / 365.0,
+    'ActAct': _actact,
+    '30360': _thirty360
+}
+
+
+def year_fractions(day_count, start, end):
+    """
+    Vectorized year fractions between serial numbers for the day count
+    conventions used in conventions.csv (Bus252 needs a holiday calendar and
+    is not supported).
+
+    Args:
+        day_count (str):        day count name, eg. 'Act360'
+        start (np.ndarray):     start serial numbers
+        end (np.ndarray):       end serial numbers
+
+    Returns:
+        year_fractions (np.ndarray)
+    """
+    try:
+        function = year_fraction_functions[day_count]
+    except KeyError:
+        raise ValueError('Day count {day_count} is not supported for vectorized '
+                         'queries'.format(**locals()))
+    return function(np.asarray(start, dtype=np.int64), np.asarray(end, dtype=np.int64))
+
+
+class LocalCubic:
+    """
+    Piecewise cubic interpolation through the nodes, with the derivative at
+    each node estimated from the neighbouring slopes, as QuantLib's local
+    CubicInterpolation schemes do. Subclasses implement derivatives().
+    """
+    def __init__(self, x, y):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        dx = np.diff(self.x)
+        slopes = np.diff(self.y) / dx
+
+        if len(self.x) == 2:
+            d = np.array([slopes[0], slopes[0]])
+        else:
+            d = self.derivatives(dx, slopes)
+
+        self.a = d[:-1]
+        self.b = (3.0 * slopes - d[1:] - 2.0 * d[:-1]) / dx
+        self.c = (d[1:] + d[:-1] - 2.0 * slopes) / dx ** 2
+
+    def derivatives(self, dx, slopes):
+        raise NotImplementedError
+
+    def _locate(self, x):
+        i = np.searchsorted(self.x[:-1], x, side='right') - 1
+        return np.clip(i, 0, len(self.x) - 2)
+
+    def __call__(self, x):
+        i = self._locate(x)
+        dx = x - self.x[i]
+        return self.y[i] + dx * (self.a[i] + dx * (self.b[i] + dx * self.c[i]))
+
+    def derivative(self, x):
+        i = self._locate(x)
+        dx = x - self.x[i]
+        return self.a[i] + dx * (2.0 * self.b[i] + 3.0 * dx * self.c[i])
+
+
+class KrugerCubic(LocalCubic):
+    """
+    Kruger's local derivative estimates, matching QuantLib's default Cubic
+    interpolation (non-monotonic, with the end derivatives taken from the
+    adjacent segments).
+    """
+    def derivatives(self, dx, slopes):
+        d = np.empty(len(slopes) + 1)
+        with np.errstate(divide='ignore'):
+            d[1:-1] = np.where(slopes[:-1] * slopes[1:] < 0.0, 0.0,
+                               2.0 / (1.0 / slopes[:-1] + 1.0 / slopes[1:]))
+        d[0] = (3.0 * slopes[0] - d[1]) / 2.0
+        d[-1] = (3.0 * slopes[-1] - d[-2]) / 2.0
+        return d
+
+
+class ParabolicCubic(LocalCubic):
+    """
+    Parabolic (three point) derivative estimates, as QuantLib's
+    ParabolicCubic interpolation. With monotonic, the derivatives are limited
+    by the Hyman filter, as in MonotonicParabolicCubic, so the interpolation
+    doesn't overshoot the nodes.
+    """
+    def __init__(self, x, y, monotonic=False):
+        self.monotonic = monotonic
+        super(ParabolicCubic, self).__init__(x, y)
+
+    def derivatives(self, dx, slopes):
+        d = np.empty(len(slopes) + 1)
+        # the parabola through each node and its neighbours
+        parabolic = (dx[:-1] * slopes[1:] + dx[1:] * slopes[:-1]) / (dx[:-1] + dx[1:])
+        d[1:-1] = parabolic
+        d[0] = (((2.0 * dx[0] + dx[1]) * slopes[0] - dx[0] * slopes[1]) /
+                (dx[0] + dx[1]))
+        d[-1] = (((2.0 * dx[-1] + dx[-2]) * slopes[-1] - dx[-1] * slopes[-2]) /
+                 (dx[-1] + dx[-2]))
+        if self.monotonic:
+            d = self._hyman_filter(d, dx, slopes, parabolic)
+        return d
+
+    @staticmethod
+    def _hyman_filter(d, dx, slopes, parabolic):
+        n = len(d)
+        limit = np.empty(n)
+        limit[0] = 3.0 * np.abs(slopes[0])
+        limit[-1] = 3.0 * np.abs(slopes[-1])
+        signs = np.empty(n)
+        signs[0], signs[-1] = slopes[0], slopes[-1]
+        for i in range(1, n - 1):
+            pm = parabolic[i - 1]
+            m = 3.0 * min(abs(slopes[i - 1]), abs(slopes[i]), abs(pm))
+            if i > 1 and (slopes[i - 1] - slopes[i - 2]) * (slopes[i] - slopes[i - 1]) > 0.0:
+                pd = ((slopes[i - 1] * (2.0 * dx[i - 1] + dx[i - 2]) -
+                       slopes[i - 2] * dx[i - 1]) / (dx[i - 2] + dx[i - 1]))
+                if pm * pd > 0.0 and pm * (slopes[i - 1] - slopes[i - 2]) > 0.0:
+                    m = max(m, 1.5 * min(abs(pm), abs(pd)))
+            if i < n - 2 and (slopes[i] - slopes[i - 1]) * (slopes[i + 1] - slopes[i]) > 0.0:
+                pu = ((slopes[i] * (2.0 * dx[i] + dx[i + 1]) - slopes[i + 1] * dx[i]) /
+                      (dx[i] + dx[i + 1]))
+                if pm * pu > 0.0 and -pm * (slopes[i] - slopes[i - 1]) > 0.0:
+                    m = max(m, 1.5 * min(abs(pm), abs(pu)))
+            limit[i] = m
+            signs[i] = pm
+        return np.where(d * signs > 0.0, np.sign(d) * np.minimum(np.abs(d), limit), 0.0)
+
+
+class CubicZero:
+    """
+    Kruger cubic interpolation of zero rates, as in ql.PiecewiseCubicZero.
+    """
+    trait = 'zero'
+
+    def __init__(self, times, zero_rates):
+        self.cubic = self.make_cubic(times, zero_rates)
+        self.t_max = times[-1]
+        self.z_max = zero_rates[-1]
+
+    @staticmethod
+    def make_cubic(times, zero_rates):
+        return KrugerCubic(times, zero_rates)
+
+    def zero_rates(self, t):
+        return self.cubic(t)
+
+    def forward_max(self):
+        # instantaneous forward at the last node, d(zt)/dt
+        return self.z_max + self.t_max * self.cubic.derivative(self.t_max)
+
+
+class MonotonicCubicZero(CubicZero):
+    """
+    Monotonic (Hyman filtered) parabolic cubic interpolation of zero rates, as
+    in ql.PiecewiseMonotonicParabolicCubicZero.
+    """
+    @staticmethod
+    def make_cubic(times, zero_rates):
+        return ParabolicCubic(times, zero_rates, monotonic=True)
+
+
+class LinearZero:
+    """
+    Linear interpolation of zero rates, as in ql.PiecewiseLinearZero.
+    """
+    trait = 'zero'
+
+    def __init__(self, times, zero_rates):
+        self.times = times
+        self.values = zero_rates
+
+    def zero_rates(self, t):
+        return np.interp(t, self.times, self.values)
+
+    def forward_max(self):
+        slope = (self.values[-1] - self.values[-2]) / (self.times[-1] - self.times[-2])
+        return self.values[-1] + self.times[-1] * slope
+
+
+class LogLinearDiscount:
+    """
+    Linear interpolation of log discount factors (ie. flat forwards between
+    nodes), as in ql.PiecewiseLogLinearDiscount and ql.PiecewiseFlatForward.
+    """
+    trait = 'discount'
+
+    def __init__(self, times, zero_rates):
+        self.times = times
+        self.log_dfs = -zero_rates * times
+        self.forwards = -np.diff(self.log_dfs) / np.diff(times)
+
+    def zero_rates(self, t):
+        t = np.asarray(t, dtype=float)
+        log_dfs = np.interp(t, self.times, self.log_dfs)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(t > 0, -log_dfs / np.where(t > 0, t, 1.0),
+                            self.forwards[0])
+
+    def forward_max(self):
+        return self.forwards[-1]
+
+
+class KrugerLogDiscount:
+    """
+    Kruger cubic interpolation of log discount factors, as in
+    ql.PiecewiseKrugerLogDiscount.
+    """
+    trait = 'discount'
+
+    def __init__(self, times, zero_rates):
+        self.t_max = times[-1]
+        self.cubic = KrugerCubic(times, -zero_rates * times)
+
+    def zero_rates(self, t):
+        t = np.asarray(t, dtype=float)
+        log_dfs = self.cubic(t)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(t > 0, -log_dfs / np.where(t > 0, t, 1.0),
+                            -self.cubic.derivative(np.zeros_like(t)))
+
+    def forward_max(self):
+        return -self.cubic.derivative(self.t_max)
+
+
+interpolations = {
+    'cubic_zero': CubicZero,
+    'monotonic_cubic_zero': MonotonicCubicZero,
+    'linear_zero': LinearZero,
+    'log_linear_discount': LogLinearDiscount,
+    'kruger_log_discount': KrugerLogDiscount
+}
+
+
+class NodeCurve:
+    """
+    Numpy representation of a bootstrapped curve.
+
+    Args:
+        reference_serial (int):     serial number of the curve reference date
+        times (np.ndarray):         year fractions of each node from the
+                                    reference date, starting at 0
+        zero_rates (np.ndarray):    continuously compounded zero rate at each
+                                    node
+        day_count (str):            day count name used for the node times,
+                                    eg. 'Act360'
+        extrapolate (bool, optional):   allow queries past the last node,
+                                        using flat forwards as QuantLib does
+                                        default: False
+        interpolation (str, optional):  interpolation between the nodes,
+                                        one of the interpolations keys
+                                        default: 'cubic_zero'
+    """
+    def __init__(self, reference_serial, times, zero_rates, day_count,
+                 extrapolate=False, interpolation='cubic_zero'):
+        self.reference_serial = int(reference_serial)
+        self.times = np.asarray(times, dtype=float)
+        self.zero_rates = np.asarray(zero_rates, dtype=float)
+        self.day_count = day_count
+        self.extrapolate = extrapolate
+        self.interpolation = interpolation
+        try:
+            self.interpolator = interpolations[interpolation](self.times,
+                                                              self.zero_rates)
+        except KeyError:
+            raise ValueError('Interpolation {interpolation} not '
+                             'recognized'.format(**locals()))
+
+    @classmethod
+    def from_qlcurve(cls, qlcurve, day_count, extrapolate=False,
+                     interpolation='cubic_zero'):
+        """
+        Takes the nodes of a bootstrapped QuantLib piecewise curve, whose
+        interpolation is given by interpolation (eg. 'linear_zero' for a
+        ql.PiecewiseLinearZero). The zero curves' node data are their zero
+        rates; for the other curves the zero rates are taken from the node
+        discount factors.
+        """
+        reference_serial = qlcurve.referenceDate().serialNumber()
+        if getattr(interpolations.get(interpolation), 'trait', None) == 'zero':
+            return cls(reference_serial, qlcurve.times(), qlcurve.data(),
+                       day_count, extrapolate, interpolation)
+        node_serials = [date.serialNumber() for date in qlcurve.dates()]
+        discount_factors = [qlcurve.discount(date) for date in qlcurve.dates()]
+        return cls.from_discount_factors(reference_serial, node_serials,
+                                         discount_factors, day_count,
+                                         extrapolate, interpolation)
+
+    @classmethod
+    def from_discount_factors(cls, reference_serial, node_serials,
+                              discount_factors, day_count, extrapolate=False,
+                              interpolation='cubic_zero'):
+        """
+        Rebuilds a curve from its node dates and discount factors, eg. as
+        stored in a snapshot. The zero rate of the first node, at time 0,
+        follows the next node, as in the QuantLib zero curves.
+        """
+        node_serials = np.asarray(node_serials, dtype=np.int64)
+        times = year_fractions(day_count, reference_serial, node_serials)
+        zero_rates = np.zeros(len(times))
+        zero_rates[1:] = -np.log(np.asarray(discount_factors[1:], dtype=float)) / times[1:]
+        if len(times) > 1:
+            zero_rates[0] = zero_rates[1]
+        return cls(reference_serial, times, zero_rates, day_count, extrapolate,
+                   interpolation)
+
+    def time_from_reference(self, dates):
+        serials = to_serials(dates)
+        return year_fractions(self.day_count, self.reference_serial, serials)
+
+    def _zero_rates(self, t):
+        if (t < 0).any():
+            raise ValueError('Dates before the curve reference date')
+        t_max = self.times[-1]
+        beyond = t > t_max
+        if not beyond.any():
+            return self.interpolator.zero_rates(t)
+        if not self.extrapolate:
+            raise ValueError('Dates past the last curve node '
+                             'and extrapolation is disabled')
+        z_max = self.zero_rates[-1]
+        fwd_max = self.interpolator.forward_max()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            flat = (z_max * t_max + fwd_max * (t - t_max)) / t
+        return np.where(beyond, flat,
+                        self.interpolator.zero_rates(np.minimum(t, t_max)))
+
+    def discount(self, dates):
+        """
+        Returns an array of discount factors for an array of dates.
+        """
+        t = self.time_from_reference(dates)
+        return np.exp(-self._zero_rates(t) * t)
+
+    def zero_rate(self, dates):
+        """
+        Returns an array of continuously compounded zero rates, in the curve
+        day count, for an array of dates.
+        """
+        return self._zero_rates(self.time_from_reference(dates))
+
+    def forward_rate(self, start_dates, end_dates, day_count=None):
+        """
+        Returns an array of simply compounded forward rates between two arrays
+        of dates.
+
+        Args:
+            start_dates (np.ndarray):   forward start dates
+            end_dates (np.ndarray):     forward end dates
+            day_count (str, optional):  day count name of the forward accrual
+                                        default: the curve day count
+        """
+        start, end = to_serials(start_dates), to_serials(end_dates)
+        accrual = year_fractions(day_count or self.day_count, start, end)
+        return (self.discount(start) / self.discount(end) - 1.0) / accrual
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+import QuantLib as ql
+
+import helpers.batch as batch
+import helpers.curve as curve
+import helpers.node_curve as node_curve
+
+day_counters = {
+    'Act360': ql.Actual360(),
+    'Act365Fixed': ql.Actual365Fixed(),
+    'ActAct': ql.ActualActual(ql.ActualActual.ISDA),
+    '30360': ql.Thirty360(ql.Thirty360.BondBasis)
+}
+
+
+def query_serials(libor):
+    # every node, and dates spread from the settlement date to the last node
+    qlcurve = libor.qlcurve
+    start = libor.settlement_date.serialNumber()
+    end = qlcurve.maxDate().serialNumber()
+    return np.unique(np.r_[np.linspace(start, end, 2000).astype(np.int64),
+                           [date.serialNumber() for date in qlcurve.dates()]])
+
+
+@pytest.fixture(params=sorted(curve.piecewise_curves))
+def libor(request, conn, evaluation_date, interpolation_override):
+    market_data = batch.MarketDataSet(conn, ['USD_3M'], evaluation_date.ISO(),
+                                      evaluation_date.ISO())
+    return curve.LiborCurve('USD_3M', evaluation_date, conn,
+                            market_data=interpolation_override(market_data,
+                                                               request.param))
+
+
+def test_discount_matches_quantlib(libor):
+    serials = query_serials(libor)
+    expected = [libor.qlcurve.discount(ql.Date(int(serial))) for serial in serials]
+    np.testing.assert_allclose(libor.discount_factor_array(serials), expected,
+                               rtol=0, atol=1e-15)
+
+
+def test_zero_rate_matches_quantlib(libor):
+    # the zero rate is -log(df) / t, so its error grows as t goes to 0
+    serials = query_serials(libor)[1:]
+    day_count = libor.qlcurve.dayCounter()
+    expected = [libor.qlcurve.zeroRate(ql.Date(int(serial)), day_count,
+                                       ql.Continuous).rate()
+                for serial in serials]
+    np.testing.assert_allclose(libor.zero_rate_array(serials), expected,
+                               rtol=0, atol=1e-14)
+
+
+def test_forward_rate_matches_quantlib(libor):
+    serials = query_serials(libor)
+    starts, ends = serials[:-90], serials[90:]
+    day_count = libor.qlcurve.dayCounter()
+    expected = [libor.qlcurve.forwardRate(ql.Date(int(start)), ql.Date(int(end)),
+                                          day_count, ql.Simple).rate()
+                for start, end in zip(starts, ends)]
+    np.testing.assert_allclose(libor.forward_rate_array(starts, ends), expected,
+                               rtol=0, atol=1e-15)
+
+
+def test_extrapolation_matches_quantlib(libor):
+    qlcurve = libor.qlcurve
+    qlcurve.enableExtrapolation()
+    nodes = node_curve.NodeCurve.from_qlcurve(
+        qlcurve, libor.curve_conventions.deposits_day_count_name, True,
+        curve.piecewise_curves[libor.interpolation][1])
+    last = qlcurve.maxDate().serialNumber()
+    serials = np.arange(last + 1, last + 3650, 30)
+    expected = [qlcurve.discount(ql.Date(int(serial))) for serial in serials]
+    np.testing.assert_allclose(nodes.discount(serials), expected, rtol=0, atol=1e-15)
+
+
+def test_datetime64_dates(libor):
+    serials = query_serials(libor)
+    np.testing.assert_array_equal(
+        libor.discount_factor_array(node_curve.to_datetime64(serials)),
+        libor.discount_factor_array(serials))
+
+
+@pytest.mark.parametrize('day_count', sorted(day_counters))
+def test_year_fractions_match_quantlib(day_count):
+    starts = np.arange(ql.Date(1, 1, 2014).serialNumber(),
+                       ql.Date(1, 1, 2016).serialNumber(), 7)
+    ends = starts + np.arange(len(starts)) * 37 % 3000 + 1
+    expected = [day_counters[day_count].yearFraction(ql.Date(int(start)),
+                                                     ql.Date(int(end)))
+                for start, end in zip(starts, ends)]
+    np.testing.assert_allclose(node_curve.year_fractions(day_count, starts, ends),
+                               expected, rtol=0, atol=1e-15)
+
+
+def test_dates_before_reference_date(libor):
+    reference = libor.qlcurve.referenceDate().serialNumber()
+    with pytest.raises(ValueError, match='before the curve reference date'):
+        libor.discount_factor_array(np.array([reference - 1]))
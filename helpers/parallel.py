@@ -0,0 +1,151 @@
+"""
+This module fans curve history builds out across a process pool. QuantLib
+bootstrapping is CPU-bound and single-threaded, and neither the sqlite
+connection nor the global QuantLib evaluation date can be shared safely, so
+each worker process opens its own connection to the market data database and
+moves its own evaluation date while it builds.
+
+The requested dates are split into contiguous chunks; each chunk is built in
+a worker with batch.build_curves (one bulk data load per chunk) and the
+resulting CurveHistory objects are merged back together in date order.
+When profiling, each chunk is profiled in its worker and the profiles are
+merged into the caller's (see profiling.py).
+"""
+import concurrent.futures
+import os
+import sqlite3
+
+import QuantLib as ql
+
+import helpers.batch as batch
+import helpers.db_handler as db_handler
+import helpers.profiling as profiling
+
+# per-process connection, opened by the pool initializer
+_conn = None
+
+
+def _init_worker(db_name):
+    global _conn
+    _conn = sqlite3.connect(db_name)
+    _conn.row_factory = db_handler.dict_factory
+
+
+def _build_dates(names, dates, incremental):
+    try:
+        return batch.build_curves(names, dates, _conn, incremental=incremental)
+    except Exception as error:
+        # eg. a curve with no conventions: the chunk's dates fail, rather than
+        # the whole run
+        return batch.failed_histories(names, dates, error)
+
+
+def _build_chunk(names, serials, incremental=False, profile=False):
+    # ql.Date objects cannot be pickled, so dates cross the process boundary
+    # as serial numbers
+    dates = [ql.Date(serial) for serial in serials]
+    if not profile:
+        return _build_dates(names, dates, incremental), None
+    with profiling.profile() as chunk_profile:
+        histories = _build_dates(names, dates, incremental)
+    return histories, chunk_profile.curves
+
+
+def chunk_dates(serials, chunks):
+    """
+    Splits a list of date serial numbers into at most chunks contiguous,
+    roughly equal-sized lists, preserving order.
+    """
+    size, extra = divmod(len(serials), chunks)
+    result, start = [], 0
+    for i in range(chunks):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            result.append(serials[start:end])
+        start = end
+    return result
+
+
+def _chunks(serials, workers, chunk_size):
+    if chunk_size:
+        return [serials[i:i + chunk_size]
+                for i in range(0, len(serials), chunk_size)]
+    return chunk_dates(serials, workers * 4)
+
+
+def iter_curves_parallel(names, dates, db_name, workers=None, chunk_size=None,
+                         incremental=False):
+    """
+    Builds curves as build_curves_parallel does, but yields the histories of
+    each chunk of dates as soon as it is built, so that results can be
+    written out while the rest are still building. Chunks are yielded in the
+    order they finish, not in date order. If profiling is on (see
+    profiling.py), the workers' profiles are merged into the active one.
+
+    Args:
+        see build_curves_parallel
+        incremental (bool, optional):   roll the curves from date to date
+                                        within each chunk (see
+                                        batch.build_curves)
+                                        default: False
+
+    Yields:
+        (index, histories) (tuple):     the chunk's position in date order,
+                                        and a dict of curve name ->
+                                        CurveHistory for its dates
+    """
+    workers = workers or os.cpu_count() or 1
+    serials = [date.serialNumber() for date in dates]
+    if not serials:
+        return
+    chunks = _chunks(serials, workers, chunk_size)
+    profile = profiling.active()
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(db_name,)) as executor:
+        futures = {executor.submit(_build_chunk, names, chunk, incremental,
+                                   profile is not None): index
+                   for index, chunk in enumerate(chunks)}
+        for future in concurrent.futures.as_completed(futures):
+            histories, chunk_profile = future.result()
+            if chunk_profile is not None:
+                profile.merge(chunk_profile)
+            yield futures[future], histories
+
+
+def build_curves_parallel(names, dates, db_name, workers=None, chunk_size=None,
+                          incremental=False):
+    """
+    Builds every curve in names as of every date in dates across a pool of
+    worker processes. The result is the same as batch.build_curves, with the
+    histories in date order regardless of which worker finished first.
+
+    Args:
+        names (list):               list of curve names, eg. ['USD_3M']
+        dates (list):               list of ql.Date curve dates
+        db_name (str):              path to the market data database; each
+                                    worker opens its own connection
+        workers (int, optional):    number of worker processes
+                                    default: os.cpu_count()
+        chunk_size (int, optional): number of dates built per task
+                                    default: dates split evenly, four
+                                    chunks per worker
+        incremental (bool, optional):   roll the curves from date to date
+                                        within each chunk
+                                        default: False
+
+    Returns:
+        histories (dict):           curve name -> CurveHistory, in the same
+                                    order as names
+    """
+    dates = list(dates)
+    if not dates:
+        return batch.build_curves(names, [], None)
+
+    results = dict(iter_curves_parallel(names, dates, db_name, workers,
+                                        chunk_size, incremental))
+    return {name: batch.CurveHistory.concatenate(
+                [results[index][name] for index in sorted(results)])
+            for name in names}
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import QuantLib as ql
+
+import helpers.batch as batch
+import helpers.parallel as parallel
+
+NAMES = ['USD_3M', 'USD_OIS']
+
+
+@pytest.fixture
+def dates(history_dates):
+    # out of order, with a weekend and a date after the last rates, which fail
+    return (history_dates[3:] + [ql.Date(3, 1, 2015), ql.Date(8, 1, 2015)] +
+            history_dates[:3])
+
+
+def assert_same_histories(histories, expected, atol=0):
+    assert list(histories) == list(expected)
+    for name in expected:
+        np.testing.assert_array_equal(histories[name].dates, expected[name].dates)
+        np.testing.assert_array_equal(histories[name].node_dates,
+                                      expected[name].node_dates)
+        np.testing.assert_allclose(histories[name].discount_factors,
+                                   expected[name].discount_factors, rtol=0, atol=atol)
+        assert histories[name].failures == expected[name].failures
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_matches_serial_build(db_name, conn, dates, incremental):
+    expected = batch.build_curves(NAMES, dates, conn, incremental=incremental)
+    assert sorted(expected['USD_3M'].failures) == ['2015-01-03', '2015-01-08']
+    histories = parallel.build_curves_parallel(NAMES, dates, db_name, workers=2,
+                                               chunk_size=2, incremental=incremental)
+    # rolled curves start each bootstrap from the previous date's solution,
+    # which differs where the chunks start, so they agree to within the
+    # bootstrap accuracy
+    assert_same_histories(histories, expected, atol=1e-10 if incremental else 0)
+
+
+def test_chunk_dates():
+    assert parallel.chunk_dates(list(range(7)), 3) == [[0, 1, 2], [3, 4], [5, 6]]
+    assert parallel.chunk_dates([0, 1], 4) == [[0], [1]]
+
+
+def test_failed_chunks(db_name, dates):
+    # a curve without conventions fails every date, rather than the run
+    histories = parallel.build_curves_parallel(['USD_6M'], dates, db_name, workers=2,
+                                               chunk_size=3)
+    history = histories['USD_6M']
+    np.testing.assert_array_equal(history.dates, np.array([date.ISO() for date in dates],
+                                                          dtype='datetime64[D]'))
+    assert sorted(history.failures) == sorted(date.ISO() for date in dates)
+    assert all('No conventions exist for USD_6M' in message
+               for message in history.failures.values())
+
+
+def test_no_dates(db_name):
+    histories = parallel.build_curves_parallel(NAMES, [], db_name)
+    assert [len(histories[name]) for name in NAMES] == [0, 0]
@@ -0,0 +1,232 @@
+"""
+This module is the opt-in instrumentation of curve builds: the time spent in
+each stage of building a curve, and counters of the work done, per curve.
+Profiling is off unless a profile() context is open, and the hooks in
+curve.py and repository.py then cost a global lookup and an empty context
+manager each, so they can stay on the hot path.
+
+    with profiling.profile() as prof:
+        curve.LiborCurve('USD_3M', date, conn).extract_nodes()
+    print(prof.to_json())
+
+The stages recorded by the curves are
+    load_data               loading the conventions and rates (the queries,
+                            or the lookups in a preloaded MarketDataSet)
+    ois_curve               building and bootstrapping the OIS discounting
+                            curve of a LiborCurve; the OIS curve's own
+                            stages are also recorded under its name
+    helpers.<collector>     constructing the rate helpers of each
+                            InstrumentCollector, eg. helpers.SwapsInsts
+    bootstrap               bootstrapping the QuantLib curve, which it does
+                            lazily on first use
+    extract_nodes           reading the node dates and discount factors
+    node_curve              building the NodeCurve from the QuantLib curve
+    build                   the whole of Curve.build(): load_data, ois_curve
+                            (including its bootstrap) and the helpers
+and the counters are
+    queries                 database queries run for the curve; the bulk
+                            queries of a MarketDataSet count once for every
+                            curve they load
+    helpers                 rate helpers the curve was bootstrapped from
+    rehydrated              builds skipped by taking the nodes from a store
+    rolls                   incremental rolls to a new date, and
+    helpers_reused          the rolls that kept the rate helpers
+
+QuantLib doesn't expose the iterations of its bootstrap to Python, so the
+bootstrap is measured by its time and its number of calls.
+"""
+import contextlib
+import json
+import time
+
+# the Profile recording, while a profile() context is open
+_active = None
+
+
+class _NullStage:
+    # the shared stage returned while profiling is off
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('profile', 'curve_name', 'stage_name', 'start')
+
+    def __init__(self, profile, curve_name, stage_name):
+        self.profile = profile
+        self.curve_name = curve_name
+        self.stage_name = stage_name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.record(self.curve_name, self.stage_name,
+                            time.perf_counter() - self.start)
+        return False
+
+
+class Profile:
+    """
+    The Profile holds the stage timings and counters recorded while it's
+    active, per curve name.
+
+    Args:
+        callback (function, optional):  called as callback(curve_name,
+                                        stage_name, seconds) as each stage
+                                        finishes, eg. to log slow builds
+                                        default: None
+
+    Attributes:
+        curves (dict):              curve name -> {'stages': stage name ->
+                                    {'calls': int, 'seconds': float},
+                                    'counters': counter name -> int}
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.curves = {}
+
+    def _curve(self, curve_name):
+        if curve_name not in self.curves:
+            self.curves[curve_name] = {'stages': {}, 'counters': {}}
+        return self.curves[curve_name]
+
+    def record(self, curve_name, stage_name, seconds):
+        """
+        Adds a call of seconds to a curve's stage.
+        """
+        stages = self._curve(curve_name)['stages']
+        if stage_name not in stages:
+            stages[stage_name] = {'calls': 0, 'seconds': 0.0}
+        stages[stage_name]['calls'] += 1
+        stages[stage_name]['seconds'] += seconds
+        if self.callback is not None:
+            self.callback(curve_name, stage_name, seconds)
+
+    def add(self, curve_name, counter, number=1):
+        """
+        Adds number to a curve's counter.
+        """
+        counters = self._curve(curve_name)['counters']
+        counters[counter] = counters.get(counter, 0) + number
+
+    def merge(self, curves):
+        """
+        Adds the curves dict of another profile, eg. one recorded in a
+        worker process (see parallel.py), to this one.
+        """
+        for curve_name, recorded in curves.items():
+            stages = self._curve(curve_name)['stages']
+            for stage_name, totals in recorded['stages'].items():
+                if stage_name not in stages:
+                    stages[stage_name] = {'calls': 0, 'seconds': 0.0}
+                stages[stage_name]['calls'] += totals['calls']
+                stages[stage_name]['seconds'] += totals['seconds']
+            for counter, number in recorded['counters'].items():
+                self.add(curve_name, counter, number)
+
+    def to_json(self, **kwargs):
+        """
+        Returns the curves dict as a JSON string; kwargs are passed to
+        json.dumps, eg. indent=2.
+        """
+        return json.dumps(self.curves, sort_keys=True, **kwargs)
+
+    def to_prometheus(self, prefix='qlpy_curve'):
+        """
+        Returns the profile in the Prometheus text exposition format: the
+        <prefix>_stage_seconds_total and <prefix>_stage_calls_total of each
+        curve and stage, and a <prefix>_<counter>_total for each counter,
+        labelled by curve.
+        """
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            name = prefix + '_' + name
+            lines.append('# HELP {name} {help_text}'.format(**locals()))
+            lines.append('# TYPE {name} {kind}'.format(**locals()))
+            for labels, value in samples:
+                label_text = ','.join('{}="{}"'.format(label, _escape(label_value))
+                                      for label, label_value in labels)
+                lines.append('{name}{{{label_text}}} {value!r}'.format(**locals()))
+
+        stages = [(curve_name, stage_name, totals)
+                  for curve_name, recorded in sorted(self.curves.items())
+                  for stage_name, totals in sorted(recorded['stages'].items())]
+        if stages:
+            metric('stage_seconds_total', 'counter',
+                   'Seconds spent in each stage of building a curve.',
+                   [((('curve', curve_name), ('stage', stage_name)), totals['seconds'])
+                    for curve_name, stage_name, totals in stages])
+            metric('stage_calls_total', 'counter',
+                   'Calls of each stage of building a curve.',
+                   [((('curve', curve_name), ('stage', stage_name)), totals['calls'])
+                    for curve_name, stage_name, totals in stages])
+        counters = sorted({counter for recorded in self.curves.values()
+                           for counter in recorded['counters']})
+        for counter in counters:
+            metric(counter + '_total', 'counter',
+                   'Curve build {} counter.'.format(counter.replace('_', ' ')),
+                   [((('curve', curve_name),), recorded['counters'][counter])
+                    for curve_name, recorded in sorted(self.curves.items())
+                    if counter in recorded['counters']])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+@contextlib.contextmanager
+def profile(callback=None):
+    """
+    Records the curve builds in the with block into a new Profile, which is
+    returned by the context manager. An enclosing profile() doesn't see the
+    builds of a nested one.
+
+    Args:
+        callback (function, optional):  see Profile
+    """
+    global _active
+    previous = _active
+    _active = Profile(callback)
+    try:
+        yield _active
+    finally:
+        _active = previous
+
+
+def active():
+    """
+    Returns the Profile being recorded, or None if profiling is off.
+    """
+    return _active
+
+
+def stage(curve_name, stage_name):
+    """
+    Returns a context manager timing a stage of a curve's build, eg.
+
+        with profiling.stage(self.name, 'bootstrap'):
+            qlcurve.dates()
+    """
+    if _active is None:
+        return _NULL_STAGE
+    return _Stage(_active, curve_name, stage_name)
+
+
+def count(curve_name, counter, number=1):
+    """
+    Adds number to a curve's counter, if profiling is on.
+    """
+    if _active is not None:
+        _active.add(curve_name, counter, number)
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import helpers.curve as curve
+import helpers.profiling as profiling
+
+
+def test_records_stages_and_counters():
+    calls = []
+    with profiling.profile(lambda *call: calls.append(call[:2])) as profile:
+        assert profiling.active() is profile
+        with profiling.stage('USD_3M', 'bootstrap'):
+            pass
+        with profiling.stage('USD_3M', 'bootstrap'):
+            pass
+        profiling.count('USD_3M', 'helpers', 37)
+    assert profiling.active() is None
+    stages = profile.curves['USD_3M']['stages']
+    assert stages['bootstrap']['calls'] == 2
+    assert stages['bootstrap']['seconds'] >= 0.0
+    assert profile.curves['USD_3M']['counters'] == {'helpers': 37}
+    assert calls == [('USD_3M', 'bootstrap')] * 2
+    assert json.loads(profile.to_json()) == profile.curves
+    assert 'qlpy_curve_helpers_total{curve="USD_3M"} 37' in profile.to_prometheus()
+
+
+def test_records_curve_builds(conn, evaluation_date):
+    with profiling.profile() as profile:
+        curve.LiborCurve('USD_3M', evaluation_date, conn).extract_nodes()
+    assert set(profile.curves) == {'USD_3M', 'USD_OIS'}
+    for stage_name in ('load_data', 'build', 'bootstrap', 'extract_nodes'):
+        assert profile.curves['USD_3M']['stages'][stage_name]['calls'] == 1
+    assert profile.curves['USD_3M']['counters']['queries'] > 0
+
+
+def test_off_outside_a_profile():
+    assert profiling.active() is None
+    with profiling.stage('USD_3M', 'bootstrap') as stage:
+        profiling.count('USD_3M', 'helpers')
+    assert stage is profiling._NULL_STAGE
+
+
+def test_restored_when_the_body_raises():
+    with profiling.profile() as outer:
+        with pytest.raises(RuntimeError, match='bootstrap failed'):
+            with profiling.profile() as inner:
+                with profiling.stage('USD_3M', 'bootstrap'):
+                    raise RuntimeError('bootstrap failed')
+        # the stage that raised is still recorded, in the inner profile only
+        assert profiling.active() is outer
+        assert inner.curves['USD_3M']['stages']['bootstrap']['calls'] == 1
+        assert outer.curves == {}
+    assert profiling.active() is None
+
+    with pytest.raises(ValueError):
+        with profiling.profile():
+            raise ValueError
+    assert profiling.active() is None
@@ -0,0 +1,347 @@
+"""
+This module is the registry of the QuantLib convention objects the curves
+are built with: day counters, business day conventions, frequencies,
+holiday calendars, and Ibor and overnight indices, looked up by the names
+used in conventions.csv (eg. 'Act360', 'Modified Following', 'Semiannual').
+
+Each object is constructed the first time it's asked for and then shared by
+every curve and instrument collector in the process, rather than every Curve
+and InstrumentCollector building its own dicts of QuantLib objects. The
+shared objects are never modified: the rate helpers clone the indices they
+are given, and calendars are shared through calendars.py.
+
+A curve's conventions are compiled once into a CurveConventions, holding
+the resolved objects and parsed numbers, and cached by curve name, so that
+building rate helpers needs no string parsing or lookups. Instrument tenors,
+eg. 'swaps_10YR', are parsed once per process by tenor().
+"""
+import QuantLib as ql
+
+import helpers.calendars as calendars
+
+# conventions.csv day count name -> QuantLib day counter factory. The
+# conventions of ActualActual and Thirty360 are explicit, as QuantLib no
+# longer has defaults for them; they match node_curve.year_fractions
+day_counts = {
+    'Act360': lambda: ql.Actual360(),
+    'Act365Fixed': lambda: ql.Actual365Fixed(),
+    'ActAct': lambda: ql.ActualActual(ql.ActualActual.ISDA),
+    'Bus252': lambda: ql.Business252(),
+    '30360': lambda: ql.Thirty360(ql.Thirty360.BondBasis)
+}
+
+# conventions.csv adjustment name -> QuantLib business day convention
+business_day_conventions = {
+    'Modified Following': ql.ModifiedFollowing,
+    'Following': ql.Following,
+    'Preceding': ql.Preceding,
+    'Modified Preceding': ql.ModifiedPreceding,
+    'Unadjusted': ql.Unadjusted
+}
+
+# conventions.csv frequency name -> QuantLib frequency
+frequencies = {
+    'Once': ql.Once,
+    'Annual': ql.Annual,
+    'Semiannual': ql.Semiannual,
+    'Quarterly': ql.Quarterly,
+    'Monthly': ql.Monthly,
+    'Daily': ql.Daily
+}
+
+# currency -> QuantLib Ibor index class, constructed with the index tenor
+ibor_indices = {
+    'AUD': ql.AUDLibor,
+    'CAD': ql.Cdor,
+    'CHF': ql.CHFLibor,
+    'DKK': ql.DKKLibor,
+    'EUR': ql.Euribor,
+    'GBP': ql.GBPLibor,
+    'JPY': ql.JPYLibor,
+    'NZD': ql.NZDLibor,
+    'SEK': ql.SEKLibor,
+    'TRL': ql.TRLibor,
+    'USD': ql.USDLibor
+}
+
+# currency -> QuantLib overnight index class
+overnight_indices = {
+    'EUR': ql.Eonia,
+    'GBP': ql.Sonia,
+    'USD': ql.FedFunds
+}
+
+# tenor string units -> QuantLib time unit, or the ql.Period of the
+# overnight tenors
+tenor_units = {
+    'ON': ql.Period(1, ql.Days),
+    'TN': ql.Period(2, ql.Days),
+    'SN': ql.Period(3, ql.Days),
+    'W' : ql.Weeks,
+    'WK': ql.Weeks,
+    'M' : ql.Months,
+    'MO': ql.Months,
+    'Y' : ql.Years,
+    'YR': ql.Years
+}
+
+_day_counts = {}
+_ibor_indices = {}
+_overnight_indices = {}
+_tenors = {}
+_fra_months = {}
+# curve name -> (conventions dict, CurveConventions compiled from it)
+_curve_conventions = {}
+
+
+def _lookup(table, kind, name):
+    try:
+        return table[name]
+    except KeyError:
+        raise ValueError('{kind} {name} not recognized'.format(**locals()))
+
+
+def day_count(name):
+    """
+    Returns the shared QuantLib day counter for a day count name.
+    """
+    if name not in _day_counts:
+        _day_counts[name] = _lookup(day_counts, 'Day count', name)()
+    return _day_counts[name]
+
+
+def business_day_convention(name):
+    """
+    Returns the QuantLib business day convention for an adjustment name.
+    """
+    return _lookup(business_day_conventions, 'Adjustment', name)
+
+
+def frequency(name):
+    """
+    Returns the QuantLib frequency for a frequency name.
+    """
+    return _lookup(frequencies, 'Frequency', name)
+
+
+def calendar(name):
+    """
+    Returns the shared QuantLib calendar for a holiday calendar name.
+    """
+    return calendars.quantlib_calendar(name)
+
+
+def ibor_index(currency, tenor):
+    """
+    Returns the shared Ibor index of a currency, eg. USD LIBOR, for a
+    ql.Period tenor.
+    """
+    key = (currency, tenor.length(), tenor.units())
+    if key not in _ibor_indices:
+        _ibor_indices[key] = _lookup(ibor_indices, 'Ibor index for', currency)(tenor)
+    return _ibor_indices[key]
+
+
+def overnight_index(currency):
+    """
+    Returns the shared overnight index of a currency, eg. Fed Funds.
+    """
+    if currency not in _overnight_indices:
+        _overnight_indices[currency] = _lookup(overnight_indices,
+                                               'Overnight index for', currency)()
+    return _overnight_indices[currency]
+
+
+def tenor(name):
+    """
+    Returns the ql.Period of an instrument or curve name, eg. 1 day for
+    'deposits_ON', 10 years for 'swaps_10YR' and 3 months for 'USD_3M'.
+    Each name is parsed once, the first time it's asked for.
+    """
+    if name not in _tenors:
+        inst = name.split('_')[-1]
+        digits = ''.join([s for s in inst if s.isdigit()])
+        period = ''.join([s for s in inst if s.isalpha()])
+        units = tenor_units.get(period)
+        if units is None or (digits == '') != isinstance(units, ql.Period):
+            raise ValueError('Tenor of {name} not recognized'.format(**locals()))
+        _tenors[name] = units if digits == '' else ql.Period(int(digits), units)
+    return _tenors[name]
+
+
+def fra_months(maturity):
+    """
+    Returns the (start month, end month) of a FRA maturity, eg. (3, 6) for
+    '3x6'.
+    """
+    if maturity not in _fra_months:
+        try:
+            start_month, end_month = (int(month) for month in maturity.split('x'))
+        except ValueError:
+            raise ValueError('FRA maturity {maturity} not recognized'.format(**locals()))
+        _fra_months[maturity] = (start_month, end_month)
+    return _fra_months[maturity]
+
+
+def _compile(resolve, value):
+    # conventions a curve doesn't use can be left blank, eg. the futures
+    # conventions of an OIS curve
+    if value is None or value == '':
+        return None
+    return resolve(value)
+
+
+def _months(months):
+    return ql.Period(int(months), ql.Months)
+
+
+# CurveConventions attribute -> (resolve, conventions.csv name) of the
+# conventions of each instrument type, compiled the first time a collector
+# asks for them, as a curve only uses the conventions of its instruments
+_instrument_conventions = {
+    'fras_spot_lag': (int, 'fras_SpotLag'),
+    'fras_day_count': (day_count, 'fras_DCF'),
+    'fras_adjustment': (business_day_convention, 'fras_Adjustment'),
+    'futures_tenor': (int, 'futures_Tenor'),
+    'futures_period': (_months, 'futures_Tenor'),
+    'futures_day_count': (day_count, 'futures_DCF'),
+    'futures_adjustment': (business_day_convention, 'futures_Adjustment'),
+    'futures_count': (int, 'futures_NumberOfFutures'),
+    'futures_days_to_exclude': (int, 'futures_DaysToExclude'),
+    'swaps_fixed_frequency': (frequency, 'swaps_FixedFreq'),
+    'swaps_fixed_adjustment': (business_day_convention, 'swaps_FixedAdjustment'),
+    'swaps_fixed_day_count': (day_count, 'swaps_FixedLegDCF')
+}
+
+
+class CurveConventions:
+    """
+    The conventions of a curve (one column of conventions.csv) compiled into
+    the QuantLib objects and numbers the rate helpers are built from. Use
+    curve_conventions() rather than constructing one, so that each curve's
+    conventions are only compiled once.
+
+    The general and deposits conventions are compiled with the curve. The
+    fras_, futures_ and swaps_ conventions are compiled the first time
+    they're used, so a curve without FRAs, say, doesn't need valid FRA
+    conventions; after that they're plain attributes like the others.
+    Blank conventions compile to None; any other value that can't be
+    resolved raises a ValueError.
+
+    Attributes:
+        name (str):                         curve name, eg. 'USD_3M'
+        source (dict):                      the conventions compiled
+        currency (str):                     eg. 'USD'
+        requires_ois (bool):                True if the swaps are discounted
+                                            on an OIS curve
+        ois_name (str):                     name of that OIS curve, eg.
+                                            'USD_OIS'
+        calendar (ql.Calendar):             holiday calendar
+        spot_lag (ql.Period):               deposits spot lag in days, from the
+                                            curve date to the settlement date
+        deposits_spot_lag (int):            settlement days of the deposits
+        deposits_day_count_name (str):      eg. 'Act360', also the day count
+                                            of the NodeCurve
+        deposits_day_count (ql.DayCounter)
+        deposits_adjustment (int):          ql business day convention
+        fras_spot_lag (int)
+        fras_day_count (ql.DayCounter)
+        fras_adjustment (int)
+        futures_tenor (int):                months of each futures period
+        futures_period (ql.Period):         futures_tenor as a period
+        futures_day_count (ql.DayCounter)
+        futures_adjustment (int)
+        futures_count (int):                futures in the strip, see
+                                            curve.FuturesInsts.strip()
+        futures_days_to_exclude (int)
+        convexity_volatility (float):       Hull-White convexity adjustment
+                                            parameters, 0 if not set
+        convexity_mean_reversion (float)
+        swaps_fixed_frequency (int):        ql frequency of the fixed leg
+        swaps_fixed_adjustment (int)
+        swaps_fixed_day_count (ql.DayCounter)
+        ibor_index (ql.IborIndex):          floating index of the swaps, for
+                                            the tenor in the curve name, or
+                                            None (eg. for OIS curves)
+        overnight_index (ql.OvernightIndex):    or None
+    """
+    __slots__ = ('name', 'source', 'currency', 'requires_ois', 'ois_name',
+                 'calendar', 'spot_lag', 'deposits_spot_lag',
+                 'deposits_day_count_name', 'deposits_day_count',
+                 'deposits_adjustment', 'fras_spot_lag', 'fras_day_count',
+                 'fras_adjustment', 'futures_tenor', 'futures_period',
+                 'futures_day_count', 'futures_adjustment', 'futures_count',
+                 'futures_days_to_exclude', 'convexity_volatility',
+                 'convexity_mean_reversion', 'swaps_fixed_frequency',
+                 'swaps_fixed_adjustment', 'swaps_fixed_day_count',
+                 'ibor_index', 'overnight_index')
+
+    def __init__(self, name, conventions):
+        get = conventions.get
+        self.name = name
+        self.source = dict(conventions)
+        self.currency = conventions['general_Currency']
+        self.requires_ois = get('general_RequiresOIS', '').lower() == 'true'
+        self.ois_name = self.currency + '_OIS'
+        self.calendar = calendar(conventions['general_HolidayCalendar'])
+
+        self.deposits_spot_lag = int(conventions['deposits_SpotLag'])
+        self.spot_lag = ql.Period(self.deposits_spot_lag, ql.Days)
+        self.deposits_day_count_name = conventions['deposits_DCF']
+        self.deposits_day_count = day_count(self.deposits_day_count_name)
+        self.deposits_adjustment = _compile(business_day_convention,
+                                            get('deposits_Adjustment'))
+
+        # databases created before the convexity conventions don't adjust
+        self.convexity_volatility = float(get('futures_ConvexityVolatility') or 0.0)
+        self.convexity_mean_reversion = float(get('futures_ConvexityMeanReversion') or 0.0)
+
+        self.ibor_index = None
+        self.overnight_index = None
+        if self.currency in ibor_indices:
+            try:
+                self.ibor_index = ibor_index(self.currency, tenor(name))
+            except ValueError:
+                # no tenor in the curve name, eg. 'USD_OIS'
+                pass
+        if self.currency in overnight_indices:
+            self.overnight_index = overnight_index(self.currency)
+
+    def __getattr__(self, attribute):
+        # only called for the slots that haven't been set, ie. the
+        # instrument conventions that haven't been used yet
+        try:
+            resolve, key = _instrument_conventions[attribute]
+        except KeyError:
+            raise AttributeError(attribute)
+        value = _compile(resolve, self.source.get(key))
+        setattr(self, attribute, value)
+        return value
+
+
+def curve_conventions(name, conventions):
+    """
+    Returns the CurveConventions of a curve's conventions dict. They are
+    compiled the first time, and then shared until the curve's conventions
+    change (eg. the same curve name in another database).
+
+    The last dict compiled for each curve is kept. Asking again with that
+    same dict, eg. from a MarketDataSet, skips comparing the conventions, so
+    the dicts shouldn't be changed in place. Another dict, eg. each query
+    of a MarketDataRepository, is compared with the compiled conventions.
+
+    Args:
+        name (str):                 curve name, eg. 'USD_3M'
+        conventions (dict):         convention name -> value, as loaded from
+                                    the conventions table
+
+    Returns:
+        compiled (CurveConventions)
+    """
+    source, compiled = _curve_conventions.get(name, (None, None))
+    if source is conventions:
+        return compiled
+    if compiled is None or compiled.source != conventions:
+        compiled = CurveConventions(name, conventions)
+    _curve_conventions[name] = (conventions, compiled)
+    return compiled
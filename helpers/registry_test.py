@@ -0,0 +1,64 @@
+import pytest
+import QuantLib as ql
+
+import helpers.registry as registry
+
+
+@pytest.fixture
+def conventions_table(conn):
+    return {row['curve_name']: row for row in conn.execute('SELECT * FROM conventions')}
+
+
+def test_compiled_conventions_match_the_table(conventions_table):
+    assert conventions_table
+    for name, row in conventions_table.items():
+        compiled = registry.curve_conventions(name, row)
+        assert compiled.source == row
+        assert compiled.currency == row['general_Currency']
+        assert compiled.requires_ois == (row['general_RequiresOIS'].lower() == 'true')
+        assert compiled.calendar == registry.calendar(row['general_HolidayCalendar'])
+        assert compiled.deposits_spot_lag == int(row['deposits_SpotLag'])
+        assert compiled.spot_lag == ql.Period(int(row['deposits_SpotLag']), ql.Days)
+        assert compiled.deposits_day_count_name == row['deposits_DCF']
+        assert compiled.deposits_day_count == registry.day_count(row['deposits_DCF'])
+        assert compiled.deposits_adjustment == registry.business_day_convention(
+            row['deposits_Adjustment'])
+        for attribute, (resolve, key) in registry._instrument_conventions.items():
+            value = row.get(key)
+            expected = None if value in (None, '') else resolve(value)
+            assert getattr(compiled, attribute) == expected, (name, attribute)
+
+
+def test_indices(conventions_table):
+    libor = registry.curve_conventions('USD_3M', conventions_table['USD_3M'])
+    assert libor.ois_name == 'USD_OIS'
+    assert libor.ibor_index.tenor() == ql.Period(3, ql.Months)
+    assert libor.ibor_index.currency() == ql.USDCurrency()
+    ois = registry.curve_conventions('USD_OIS', conventions_table['USD_OIS'])
+    assert ois.ibor_index is None
+    assert ois.overnight_index.currency() == ql.USDCurrency()
+
+
+class UncomparableDict(dict):
+    # conventions that fail the test if they're compared
+    def __eq__(self, other):
+        raise AssertionError('the conventions were compared')
+
+    __ne__ = __eq__
+    __hash__ = None
+
+
+def test_recompiled_when_the_conventions_change(conventions_table, monkeypatch):
+    monkeypatch.setattr(registry, '_curve_conventions', {})
+    row = UncomparableDict(conventions_table['USD_3M'])
+    compiled = registry.curve_conventions('USD_3M', row)
+    # the same dict again is shared without comparing it
+    assert registry.curve_conventions('USD_3M', row) is compiled
+    # an equal dict is compared, and shares the compiled conventions
+    assert registry.curve_conventions('USD_3M', dict(row)) is compiled
+
+    changed = dict(row, deposits_DCF='Act365Fixed')
+    recompiled = registry.curve_conventions('USD_3M', changed)
+    assert recompiled is not compiled
+    assert recompiled.deposits_day_count == ql.Actual365Fixed()
+    assert registry.curve_conventions('USD_3M', changed) is recompiled
@@ -0,0 +1,199 @@
+"""
+This module is the data access layer for the market data database. All of
+the queries are fixed SQL strings with bound parameters, so values are never
+formatted into the SQL, and sqlite3's per-connection statement cache can
+reuse the prepared statement for every curve that is built on the connection.
+
+The instruments and rates for a curve are loaded with a single JOIN across
+the curve_instruments, rates, and instrument_conventions tables, grouped by
+instrument type, eg.
+
+    {'deposits': [('deposits_ON', 'ON', 0.000852), ...],
+     'swaps':    [('swaps_4YR', '4YR', 0.015775), ...]}
+
+The MarketDataRepository has the same conventions() and instrument_rates()
+interface as batch.MarketDataSet, so either can be passed to the Curve
+objects as their market_data. Each query is counted in the queries counter of
+the curves it loads, while profiling (see profiling.py).
+"""
+import helpers.db_handler as db_handler
+import helpers.profiling as profiling
+
+CONVENTIONS_SQL = 'SELECT * FROM conventions WHERE curve_name = ?'
+# every instrument of the curve, with a NULL rate for any instrument that
+# has no rate on the date
+INSTRUMENT_RATES_ON_SQL = (
+    'SELECT curve_instruments.curve_name, '
+           ':date, '
+           'instrument_conventions.instrument_type, '
+           'curve_instruments.instrument, '
+           'instrument_conventions.instrument_maturity, '
+           'rates.rate '
+      'FROM curve_instruments '
+        'JOIN instrument_conventions '
+          'ON curve_instruments.instrument = instrument_conventions.instrument '
+        'LEFT JOIN rates ON curve_instruments.curve_name = rates.curve_name '
+          'AND curve_instruments.instrument = rates.instrument '
+          'AND rates.date = :date '
+      'WHERE curve_instruments.curve_name = :name')
+# the rates over a date range; dates missing some of the curve's instruments
+# are found by comparing against CURVE_INSTRUMENTS_SQL
+INSTRUMENT_RATES_BETWEEN_SQL = (
+    'SELECT curve_instruments.curve_name, '
+           'rates.date, '
+           'instrument_conventions.instrument_type, '
+           'curve_instruments.instrument, '
+           'instrument_conventions.instrument_maturity, '
+           'rates.rate '
+      'FROM curve_instruments '
+        'JOIN rates ON curve_instruments.curve_name = rates.curve_name '
+          'AND curve_instruments.instrument = rates.instrument '
+        'JOIN instrument_conventions '
+          'ON curve_instruments.instrument = instrument_conventions.instrument '
+      'WHERE curve_instruments.curve_name = ? AND rates.date BETWEEN ? AND ?')
+CURVE_INSTRUMENTS_SQL = (
+    'SELECT curve_instruments.instrument '
+      'FROM curve_instruments '
+        'JOIN instrument_conventions '
+          'ON curve_instruments.instrument = instrument_conventions.instrument '
+      'WHERE curve_instruments.curve_name = ?')
+
+# the bulk queries take a variable number of curve names; the SQL only
+# depends on that count, so it's cached per (table, count)
+_bulk_sql = {}
+
+
+def _by_names_sql(table_name, count):
+    key = (table_name, count)
+    if key not in _bulk_sql:
+        q_marks = ('?,' * count)[:-1]
+        _bulk_sql[key] = ('SELECT * FROM {table_name} '
+                          'WHERE curve_name IN ({q_marks})').format(**locals())
+    return _bulk_sql[key]
+
+
+def missing_instruments(instrument_rates, instruments):
+    """
+    Returns the sorted names of the instruments (a curve's instruments, eg.
+    from MarketDataRepository.curve_instruments()) that have no rate in
+    instrument_rates.
+    """
+    present = set(inst for insts in instrument_rates.values()
+                  for inst, maturity, rate in insts)
+    return sorted(set(instruments) - present)
+
+
+def missing_rates_error(name, iso_date, missing):
+    """
+    Returns the ValueError for a curve date that is missing the rates of some
+    of the curve's instruments.
+    """
+    missing = ', '.join(missing)
+    return ValueError('No rates for {missing} for {name} on '
+                      '{iso_date}'.format(**locals()))
+
+
+def group_instrument_rates(rows):
+    """
+    Groups (curve_name, date, instrument_type, instrument, maturity, rate)
+    rows into a dict of (curve_name, date) -> instrument type -> list of
+    (instrument, maturity, rate) tuples.
+    """
+    result = {}
+    for curve_name, date, inst_type, instrument, maturity, rate in rows:
+        by_type = result.setdefault((curve_name, date), {})
+        by_type.setdefault(inst_type, []).append((instrument, maturity, rate))
+    return result
+
+
+class MarketDataRepository:
+    """
+    The MarketDataRepository runs the market data queries for the Curve
+    objects against a sqlite3 connection, regardless of the row_factory set
+    on the connection.
+
+    Args:
+        conn (sqlite3.Connection):  market data database connection
+    """
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _cursor(self, row_factory=db_handler.dict_factory):
+        cursor = self.conn.cursor()
+        cursor.row_factory = row_factory
+        return cursor
+
+    def conventions(self, name):
+        cursor = self._cursor()
+        cursor.execute(CONVENTIONS_SQL, (name,))
+        profiling.count(name, 'queries')
+        row = cursor.fetchone()
+        if row is None:
+            raise ValueError('No conventions exist for {name}'.format(**locals()))
+        return row
+
+    def instrument_rates(self, name, iso_date):
+        """
+        Returns every instrument used to build a curve, with its type,
+        maturity and rate on a date, in one round trip. Raises a ValueError
+        if there are no rates for the curve on the date, or if any of its
+        instruments has no rate.
+
+        Args:
+            name (str):                 curve name
+            iso_date (str):             ISO date of the rates
+
+        Returns:
+            instrument_rates (dict):    instrument type -> list of
+                                        (instrument, maturity, rate) tuples
+        """
+        cursor = self._cursor(row_factory=None)
+        cursor.execute(INSTRUMENT_RATES_ON_SQL, {'name': name, 'date': iso_date})
+        profiling.count(name, 'queries')
+        rows = cursor.fetchall()
+        missing = sorted(row[3] for row in rows if row[5] is None)
+        if len(missing) == len(rows):
+            raise ValueError('No data available for {name} on {iso_date}'.format(**locals()))
+        if missing:
+            raise missing_rates_error(name, iso_date, missing)
+        return group_instrument_rates(rows)[(name, iso_date)]
+
+    def conventions_for(self, names):
+        """
+        Returns a dict of curve name -> conventions row for several curves,
+        in one query.
+        """
+        cursor = self._cursor()
+        cursor.execute(_by_names_sql('conventions', len(names)), list(names))
+        for name in names:
+            profiling.count(name, 'queries')
+        return {row['curve_name']: row for row in cursor}
+
+    def curve_instruments(self, names):
+        """
+        Returns a dict of curve name -> list of the names of the instruments
+        the curve is built from, for several curves.
+        """
+        cursor = self._cursor(row_factory=None)
+        result = {}
+        for name in names:
+            cursor.execute(CURVE_INSTRUMENTS_SQL, (name,))
+            profiling.count(name, 'queries')
+            result[name] = [row[0] for row in cursor]
+        return result
+
+    def instrument_rates_between(self, names, start_date, end_date):
+        """
+        Returns a dict of (curve name, ISO date) -> instrument rates (see
+        instrument_rates()) for several curves over a date range
+        (inclusive). Each curve is one range scan of the rates primary key.
+        Dates missing some of a curve's instruments are included as they
+        are; see missing_instruments().
+        """
+        result = {}
+        cursor = self._cursor(row_factory=None)
+        for name in names:
+            cursor.execute(INSTRUMENT_RATES_BETWEEN_SQL, (name, start_date, end_date))
+            profiling.count(name, 'queries')
+            result.update(group_instrument_rates(cursor))
+        return result
@@ -0,0 +1,113 @@
+import sqlite3
+
+import pytest
+
+import helpers.batch as batch
+import helpers.db_handler as db_handler
+import helpers.repository as repository
+
+MISSING = 'No rates for swaps_40YR for USD_OIS on 2014-12-31'
+
+
+@pytest.fixture
+def missing_conn(db_name, tmp_path):
+    # a copy of the database without the 40YR OIS swap on the curve date
+    conn = sqlite3.connect(str(tmp_path / 'missing.db'))
+    source = sqlite3.connect(db_name)
+    source.backup(conn)
+    source.close()
+    conn.execute("DELETE FROM rates WHERE curve_name = 'USD_OIS' AND "
+                 "instrument = 'swaps_40YR' AND date = '2014-12-31'")
+    conn.commit()
+    conn.row_factory = db_handler.dict_factory
+    yield conn
+    conn.close()
+
+
+def test_instrument_rates(conn):
+    instrument_rates = repository.MarketDataRepository(conn).instrument_rates(
+        'USD_3M', '2014-12-31')
+    assert set(instrument_rates) == {'deposits', 'fras', 'futures', 'swaps'}
+    assert ('swaps_10YR', '10YR') in [(inst, maturity) for inst, maturity, rate
+                                      in instrument_rates['swaps']]
+    assert all(rate is not None for insts in instrument_rates.values()
+               for inst, maturity, rate in insts)
+
+
+def test_no_data(conn):
+    with pytest.raises(ValueError, match='No data available for USD_3M on 2015-01-03'):
+        repository.MarketDataRepository(conn).instrument_rates('USD_3M', '2015-01-03')
+    market_data = batch.MarketDataSet(conn, ['USD_3M'], '2014-12-31', '2015-01-05')
+    with pytest.raises(ValueError, match='No data available for USD_3M on 2015-01-03'):
+        market_data.instrument_rates('USD_3M', '2015-01-03')
+
+
+def test_missing_rates(missing_conn):
+    with pytest.raises(ValueError, match=MISSING):
+        repository.MarketDataRepository(missing_conn).instrument_rates('USD_OIS',
+                                                                       '2014-12-31')
+    market_data = batch.MarketDataSet(missing_conn, ['USD_3M'], '2014-12-31', '2015-01-02')
+    with pytest.raises(ValueError, match=MISSING):
+        market_data.instrument_rates('USD_OIS', '2014-12-31')
+    # the other dates are complete
+    assert market_data.instrument_rates('USD_OIS', '2015-01-02')
+
+
+def test_missing_rates_fail_the_date(missing_conn, history_dates):
+    dates = history_dates[:3]
+    histories = batch.build_curves(['USD_3M', 'USD_OIS'], dates, missing_conn)
+    for name in ('USD_3M', 'USD_OIS'):
+        assert list(histories[name].failures) == ['2014-12-31']
+        assert MISSING in histories[name].failures['2014-12-31']
+
+
+def test_missing_instruments():
+    instrument_rates = {'deposits': [('deposits_ON', 'ON', 0.001)],
+                        'swaps': [('swaps_2YR', '2YR', 0.009)]}
+    assert repository.missing_instruments(
+        instrument_rates, ['swaps_2YR', 'swaps_5YR', 'deposits_ON', 'swaps_10YR']) == \
+        ['swaps_10YR', 'swaps_5YR']
+
+
+def old_curve_data(conn, curve, iso_date):
+    # the per-curve queries Curve.load_data() ran against the wide tables
+    cursor = conn.cursor()
+    cursor.row_factory = db_handler.dict_factory
+    conventions = cursor.execute('SELECT * FROM conventions '
+                                 'WHERE curve_name IS "{curve}"'.format(**locals())).fetchone()
+    rates_data = cursor.execute('SELECT * FROM rates_data WHERE curve_name IS "{curve}" '
+                                'AND date IS "{iso_date}"'.format(**locals())).fetchone()
+    instrument_ids = cursor.execute('SELECT * FROM instruments WHERE curve_name '
+                                    'IS "{curve}"'.format(**locals())).fetchone()
+    instrument_rates = {}
+    for inst, flag in instrument_ids.items():
+        if flag.upper() == 'TRUE':
+            inst_type, maturity = inst.split('_', 1)
+            instrument_rates.setdefault(inst_type, []).append(
+                (inst, maturity, float(rates_data[inst])))
+    return conventions, instrument_rates
+
+
+def sorted_rates(instrument_rates):
+    return {inst_type: sorted(insts) for inst_type, insts in instrument_rates.items()}
+
+
+@pytest.mark.parametrize('name', ['USD_3M', 'USD_OIS'])
+def test_matches_the_wide_tables(baseline_db_name, name):
+    conn = sqlite3.connect(baseline_db_name)
+    db_handler.upgrade_db(conn)
+    conventions, instrument_rates = old_curve_data(conn, name, '2014-12-31')
+
+    data = repository.MarketDataRepository(conn)
+    assert data.conventions(name) == conventions
+    assert data.conventions_for([name, 'USD_6M']) == {name: conventions}
+    assert sorted_rates(data.instrument_rates(name, '2014-12-31')) == \
+        sorted_rates(instrument_rates)
+    assert sorted(data.curve_instruments([name])[name]) == sorted(
+        inst for insts in instrument_rates.values() for inst, maturity, rate in insts)
+
+    market_data = batch.MarketDataSet(conn, [name], '2014-12-31', '2014-12-31')
+    assert market_data.conventions(name) == conventions
+    assert sorted_rates(market_data.instrument_rates(name, '2014-12-31')) == \
+        sorted_rates(instrument_rates)
+    conn.close()
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+import helpers.batch as batch
+import helpers.curve as curve
+import helpers.risk as risk
+
+
+class BumpedMarketData:
+    # market data with the rate of one instrument of one curve moved
+    def __init__(self, market_data, name, instrument, bump):
+        self.market_data = market_data
+        self.name = name
+        self.instrument = instrument
+        self.bump = bump
+
+    def conventions(self, name):
+        return self.market_data.conventions(name)
+
+    def instrument_rates(self, name, iso_date):
+        instrument_rates = self.market_data.instrument_rates(name, iso_date)
+        if name != self.name:
+            return instrument_rates
+        return {inst_type: [(inst, maturity, rate + self.bump if inst == self.instrument
+                             else rate) for inst, maturity, rate in insts]
+                for inst_type, insts in instrument_rates.items()}
+
+
+def market_data_set(conn, date):
+    return batch.MarketDataSet(conn, ['USD_3M'], date.ISO(), date.ISO())
+
+
+def rebuilt_move(market_data, date, conn, name, instrument, bump):
+    # the move in the USD_3M node zero rates from rebuilding it with one rate
+    # bumped, for comparing with a Jacobian column
+    base = curve.LiborCurve('USD_3M', date, conn, market_data=market_data)
+    bumped = curve.LiborCurve('USD_3M', date, conn, market_data=BumpedMarketData(
+        market_data, name, instrument, bump))
+    return bumped.node_curve.zero_rates - base.node_curve.zero_rates
+
+
+@pytest.mark.parametrize('interpolation', sorted(curve.piecewise_curves))
+def test_jacobian_matches_rebuild(conn, evaluation_date, interpolation_override,
+                                  interpolation):
+    market_data = interpolation_override(market_data_set(conn, evaluation_date),
+                                         interpolation)
+    libor = curve.LiborCurve('USD_3M', evaluation_date, conn, market_data=market_data)
+    jacobian = risk.node_jacobian(libor, instruments=['swaps_10YR'])
+
+    expected = rebuilt_move(market_data, evaluation_date, conn, 'USD_3M',
+                            'swaps_10YR', risk.BASIS_POINT)
+    np.testing.assert_allclose(jacobian.matrix[:, 0], expected, rtol=0, atol=1e-10)
+    # the quotes are restored; the curve re-bootstraps to within the
+    # bootstrap accuracy
+    np.testing.assert_allclose(
+        libor.node_curve.zero_rates,
+        curve.LiborCurve('USD_3M', evaluation_date, conn,
+                         market_data=market_data).node_curve.zero_rates,
+        rtol=0, atol=1e-10)
+
+
+def test_futures_column_includes_convexity(conn, evaluation_date):
+    market_data = market_data_set(conn, evaluation_date)
+    libor = curve.LiborCurve('USD_3M', evaluation_date, conn, market_data=market_data)
+    adjustment = libor.convexity['futures_5'][0]
+    base_adjustment = adjustment.value()
+    assert base_adjustment != 0
+    jacobian = risk.node_jacobian(libor, instruments=['futures_5'])
+
+    # +1bp in rate is -0.01 in price
+    expected = rebuilt_move(market_data, evaluation_date, conn, 'USD_3M',
+                            'futures_5', -risk.BASIS_POINT * 100)
+    np.testing.assert_allclose(jacobian.matrix[:, 0], expected, rtol=0, atol=1e-10)
+    assert adjustment.value() == pytest.approx(base_adjustment, abs=1e-15)
+
+
+def test_ois_columns_match_rebuild(conn, evaluation_date):
+    market_data = market_data_set(conn, evaluation_date)
+    libor = curve.LiborCurve('USD_3M', evaluation_date, conn, market_data=market_data)
+    jacobian = risk.node_jacobian(libor)
+    ois_name = libor.ois_curve.name
+    assert jacobian.instruments == list(libor.quotes) + [
+        ois_name + '.' + instrument for instrument in libor.ois_curve.quotes]
+
+    column = jacobian.instruments.index(ois_name + '.swaps_10YR')
+    expected = rebuilt_move(market_data, evaluation_date, conn, ois_name,
+                            'swaps_10YR', risk.BASIS_POINT)
+    # the OIS curve only moves the LIBOR nodes through the swap discounting
+    assert np.abs(expected).max() > 1e-7
+    np.testing.assert_allclose(jacobian.matrix[:, column], expected, rtol=0, atol=1e-10)
+
+
+def test_unknown_input(conn, evaluation_date):
+    libor = curve.LiborCurve('USD_3M', evaluation_date, conn,
+                             market_data=market_data_set(conn, evaluation_date))
+    with pytest.raises(ValueError, match='swaps_99YR is not an input of USD_3M'):
+        risk.node_jacobian(libor, instruments=['swaps_99YR'])
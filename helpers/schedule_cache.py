@@ -0,0 +1,112 @@
+"""
+This module holds the ScheduleCache, a bounded LRU cache of swap_schedule
+Schedule objects. Swap books are full of identical schedules -- the same spot
+or IMM start date with the same standard tenors -- so rather than building a
+new Schedule (and a new periods array) for every trade, identical trades
+share one Schedule.
+
+Schedules are keyed on everything that determines their dates: the
+effective, maturity, second and penultimate dates, the period length, the
+adjustments, the fixing lag, and the holiday calendar. The periods arrays of
+cached schedules are made read-only, since they are shared between trades;
+copy them before modifying.
+"""
+import collections
+
+import numpy as np
+
+import helpers.swap_schedule as swap_schedule
+
+
+def _date_key(date):
+    if date is False or date is None:
+        return None
+    return np.datetime64(date, 'D')
+
+
+def _calendar_key(calendar):
+    # calendars are shared by name, see calendars.get_calendar
+    return getattr(calendar, 'name', calendar)
+
+
+class ScheduleCache:
+    """
+    LRU cache of Schedule objects.
+
+    Args:
+        maxsize (int, optional):    maximum number of schedules held before
+                                    the least recently used schedule is
+                                    evicted
+                                    default: 4096
+
+    Attributes:
+        hits (int):                 number of lookups served from the cache
+        misses (int):               number of lookups that built a schedule
+    """
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._schedules = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._schedules)
+
+    def __contains__(self, key):
+        return key in self._schedules
+
+    @staticmethod
+    def key(effective, maturity, length, second=False, penultimate=False,
+            period_adjustment='unadjusted', payment_adjustment='unadjusted',
+            fixing_lag=2, period_length='months', calendar=None):
+        """
+        Returns the cache key for a schedule, taking the same arguments as
+        Schedule.
+        """
+        return (_date_key(effective), _date_key(maturity), length,
+                _date_key(second), _date_key(penultimate), period_adjustment,
+                payment_adjustment, fixing_lag, period_length,
+                _calendar_key(calendar))
+
+    def get_or_build(self, effective, maturity, length, **kwargs):
+        """
+        Returns the cached schedule if there is one, otherwise builds the
+        schedule, caches it and returns it. Takes the same arguments as
+        Schedule.
+
+        Returns:
+            schedule (Schedule):        schedule with a read-only periods
+                                        array
+        """
+        key = self.key(effective, maturity, length, **kwargs)
+        schedule = self._schedules.get(key)
+        if schedule is not None:
+            self.hits += 1
+            self._schedules.move_to_end(key)
+            return schedule
+
+        self.misses += 1
+        schedule = swap_schedule.Schedule(effective, maturity, length, **kwargs)
+        schedule.periods.flags.writeable = False
+        self._schedules[key] = schedule
+        while len(self._schedules) > self.maxsize:
+            self._schedules.popitem(last=False)
+        return schedule
+
+    def clear(self):
+        """
+        Drops every cached schedule. The hit and miss counters are kept.
+        """
+        self._schedules.clear()
+
+    def stats(self):
+        """
+        Returns a dict of the cache size, hits, misses and hit rate, for
+        sizing the cache.
+        """
+        lookups = self.hits + self.misses
+        return {'size': len(self._schedules),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import helpers.calendars as calendars
+import helpers.schedule_cache as schedule_cache
+import helpers.swap_schedule as swap_schedule
+
+# spans 2015-01-19 (Martin Luther King Jr. Day), a holiday on NYSE only
+EFFECTIVE = np.datetime64('2014-10-17')
+MATURITY = np.datetime64('2020-01-17')
+
+
+@pytest.mark.parametrize('calendar', [None, 'NYSE'])
+@pytest.mark.parametrize('adjustment', ['unadjusted', 'following', 'modified preceding'])
+def test_cached_schedules_match_fresh_ones(calendar, adjustment):
+    cache = schedule_cache.ScheduleCache()
+    kwargs = {'period_adjustment': adjustment, 'payment_adjustment': 'following',
+              'calendar': calendar}
+    cached = cache.get_or_build(EFFECTIVE, MATURITY, 3, **kwargs)
+    fresh = swap_schedule.Schedule(EFFECTIVE, MATURITY, 3, **kwargs)
+    np.testing.assert_array_equal(cached.periods, fresh.periods)
+    assert cache.get_or_build(EFFECTIVE, MATURITY, 3, **kwargs) is cached
+    assert (cache.hits, cache.misses) == (1, 1)
+    with pytest.raises(ValueError):
+        cached.periods.payment_date[0] = MATURITY
+
+
+def test_key_separates_calendar_and_adjustment():
+    cache = schedule_cache.ScheduleCache()
+    schedules = [cache.get_or_build(EFFECTIVE, MATURITY, 3, period_adjustment=adjustment,
+                                    calendar=calendar)
+                 for calendar in (None, 'NYSE')
+                 for adjustment in ('unadjusted', 'following')]
+    assert cache.misses == len(cache) == 4
+    assert len(set(map(id, schedules))) == 4
+    # the adjusted schedules differ on the holiday
+    assert not np.array_equal(schedules[1].periods.accrual_end,
+                              schedules[3].periods.accrual_end)
+
+    # a calendar is keyed on its name, whether given by name or as the
+    # shared HolidayCalendar
+    assert cache.get_or_build(EFFECTIVE, MATURITY, 3, period_adjustment='following',
+                              calendar=calendars.get_calendar('NYSE')) is schedules[3]
+    assert cache.key(EFFECTIVE, MATURITY, 3, calendar='NYSE') != \
+        cache.key(EFFECTIVE, MATURITY, 3, calendar='TARGET')
+    assert cache.key(EFFECTIVE, MATURITY, 3, payment_adjustment='following') != \
+        cache.key(EFFECTIVE, MATURITY, 3, payment_adjustment='preceding')
+
+
+def test_evicts_least_recently_used():
+    cache = schedule_cache.ScheduleCache(maxsize=2)
+    first = cache.get_or_build(EFFECTIVE, MATURITY, 3)
+    cache.get_or_build(EFFECTIVE, MATURITY, 6)
+    cache.get_or_build(EFFECTIVE, MATURITY, 3)
+    cache.get_or_build(EFFECTIVE, MATURITY, 12)
+    assert len(cache) == 2
+    assert cache.key(EFFECTIVE, MATURITY, 6) not in cache
+    assert cache.get_or_build(EFFECTIVE, MATURITY, 3) is first
+    assert cache.stats()['hits'] == 2
@@ -1,65 +1,264 @@
-from scipy.optimize import brentq
-from scipy.optimize import brent
-import scipy.interpolate
+"""
+This module is a standalone, QuantLib-free bootstrapper for single curves
+built from deposits and vanilla swaps. It is a pure numpy/scipy fallback for
+when the QuantLib bindings are unavailable, and is much simpler than the
+curves in curve.py: no holiday calendars, no spot lag, and no business day
+adjustment of the schedules.
+
+The curve is built one pillar at a time. Deposits are solved in closed form;
+each swap adds one pillar at its maturity, and the flat forward rate between
+the previous pillar and the new one is found with a bracketing root finder
+(brentq) so that the swap prices to par. Only the discount factors in the
+new segment depend on the unknown, so everything before the last pillar is
+interpolated once per swap rather than once per iteration, and the fixed and
+float legs are priced as numpy arrays.
+
+The discount factors are interpolated log-linearly (flat forwards between
+pillars), and the result is returned as a node_curve.NodeCurve, eg.
+
+    curve_date = np.datetime64('2014-12-31')
+    deposits = [('3MO', 0.002556)]
+    swaps = [('1YR', 0.00461), ('2YR', 0.00892), ('5YR', 0.01765)]
+    curve = bootstrap(curve_date, deposits, swaps)
+    curve.discount(np.array(['2017-06-30'], dtype='datetime64[D]'))
+"""
+import re
+
 import numpy as np
-import datetime
-import time
-import dateutil.relativedelta
-
-def get_df(curve, dates):
-    return scipy.interpolate.splev(dates, curve)
-
-def func(new_df, arg_dict):
-    curve_dates = np.append(arg_dict['dates'], arg_dict['maturity'])
-    curve_dfs = np.append(arg_dict['dfs'], np.array([new_df]))
-    interp = scipy.interpolate.splrep(curve_dates, curve_dfs)
-    fixed_dfs = get_df(interp, arg_dict['fixed_dates'])
-    fixed_leg = sum(get_df(interp, arg_dict['fixed_dates']) * arg_dict['fixed_payments'])
-    float_leg = 0
-    for i in range(len(arg_dict['float_dates'])):
-        period_end = datetime.datetime.fromtimestamp(arg_dict['float_dates'][i]) + datetime.timedelta(days=90)
-        df = get_df(interp, arg_dict['float_dates'][i]) / get_df(interp, period_end.timestamp()) 
-        first_df = get_df(interp, arg_dict['float_dates'][i])
-        second_df = get_df(interp, period_end.timestamp())
-        rate = ((df-1) / (90/360))
-        print('rate: {rate}'.format(**locals()))
-        float_leg += rate * 1000 * get_df(interp, period_end.timestamp()) * 90/360
-    print('fixed leg: {fixed_leg}, float leg: {float_leg}, df: {df}'.format(**locals()))
-    swap_value = fixed_leg - float_leg
-    
-    return abs(swap_value) 
-
-new_dict = {}
-new_dict['maturity'] = np.array([datetime.datetime(2012, 11, 11).timestamp()])
-new_dict['fixed_payments'] = np.array([2.9, 2.9])
-new_dict['fixed_dates'] = np.array([datetime.datetime(2012, 5, 11).timestamp(), 
-                                    datetime.datetime(2012, 11, 11).timestamp()])
-new_dict['float_dates'] = np.array([datetime.datetime(2011, 11, 11).timestamp(), 
-                                    datetime.datetime(2012, 2, 11).timestamp(), 
-                                    datetime.datetime(2012, 5, 11).timestamp(), 
-                                    datetime.datetime(2012, 8, 11).timestamp()])
-new_dict['dates'] = np.array([datetime.datetime(2011, 11, 11).timestamp(), 
-                              datetime.datetime(2011, 11, 28).timestamp(), 
-                              datetime.datetime(2011, 12, 14).timestamp()])
-new_dict['dfs'] = np.array([1, 0.99990306, 0.99977688])
-
-xmin = brent(func, brack=(0, 1.5), args=(new_dict,))
-new_dict['dates'] = np.append(new_dict['dates'], new_dict['maturity'])
-new_dict['dfs'] = np.append(new_dict['dfs'], np.array([xmin]))
-
-new_dict['maturity'] = np.array([datetime.datetime(2013, 11, 11).timestamp()])
-new_dict['fixed_payments'] = np.array([3.0, 3.0, 3.0, 3.0])
-new_dict['fixed_dates'] = np.append(new_dict['fixed_dates'], np.array([datetime.datetime(2013, 5, 11).timestamp(), 
-                                                                       datetime.datetime(2013, 11, 11).timestamp()]))
-new_dict['float_dates'] = np.append(new_dict['float_dates'], np.array([datetime.datetime(2012, 11, 11).timestamp(), 
-                                                                       datetime.datetime(2013, 2, 11).timestamp(), 
-                                                                       datetime.datetime(2013, 5, 11).timestamp(), 
-                                                                       datetime.datetime(2013, 8, 11).timestamp()]))
-xmin = brent(func, brack=(0, 1.5), args=(new_dict,))
-
-# proper use
-maturity = datetime.datetime(2012, 11, 11)
-effective = datetime.datetime(2011, 11, 11)
-period_ends = _gen_dates_list_backward(effective, maturity, months=3)
-print(period_ends)
-print(len(period_ends))
+import scipy.optimize
+
+import helpers.node_curve as node_curve
+
+# bracket for the flat forward rate of each new curve segment
+FORWARD_BRACKET = (-0.5, 1.0)
+
+# days added for the overnight-style deposit tenors
+_day_tenors = {'ON': 1, 'TN': 2, 'SN': 3}
+_tenor_units = {'D': 'days', 'WK': 'weeks', 'MO': 'months', 'YR': 'years'}
+
+
+def add_months(dates, months):
+    """
+    Adds a number of months to an array of datetime64[D] dates, clipping
+    the day to the end of the month (eg. 31-Jan + 1M = 28-Feb).
+
+    Args:
+        dates (np.ndarray):     datetime64[D] dates
+        months (np.ndarray):    integer months to add, broadcast with dates
+
+    Returns:
+        dates (np.ndarray):     datetime64[D] dates
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    month_starts = dates.astype('datetime64[M]')
+    day = (dates - month_starts.astype('datetime64[D]')).astype(np.int64)
+    new_months = month_starts + np.asarray(months, dtype=np.int64)
+    month_length = ((new_months + 1).astype('datetime64[D]') -
+                    new_months.astype('datetime64[D]')).astype(np.int64)
+    return new_months.astype('datetime64[D]') + np.minimum(day, month_length - 1)
+
+
+def tenor_date(curve_date, tenor):
+    """
+    Returns the unadjusted maturity of a tenor in the naming used by the
+    rates data, eg. 'ON', '1WK', '3MO', '10YR'.
+    """
+    curve_date = np.datetime64(curve_date, 'D')
+    if tenor in _day_tenors:
+        return curve_date + _day_tenors[tenor]
+    match = re.match(r'^(\d+)(D|WK|MO|YR)$', tenor)
+    if match is None:
+        raise ValueError('Tenor {tenor} not recognized'.format(**locals()))
+    length, unit = int(match.group(1)), _tenor_units[match.group(2)]
+    if unit == 'days':
+        return curve_date + length
+    elif unit == 'weeks':
+        return curve_date + 7 * length
+    elif unit == 'years':
+        length *= 12
+    return add_months(curve_date, length)
+
+
+def period_ends(effective, maturity, months):
+    """
+    Generates the unadjusted period end dates of a swap leg, rolling
+    backward from the maturity in steps of months, with any stub at the
+    front.
+
+    Args:
+        effective (np.datetime64):  start date of the leg
+        maturity (np.datetime64):   end date of the leg
+        months (int):               months in each period
+
+    Returns:
+        period_ends (np.ndarray):   datetime64[D] period end dates, in order,
+                                    ending on the maturity date
+    """
+    effective = np.datetime64(effective, 'D')
+    maturity = np.datetime64(maturity, 'D')
+    total = (maturity.astype('datetime64[M]') -
+             effective.astype('datetime64[M]')).astype(np.int64)
+    steps = np.arange(total // months + 1)[::-1]
+    ends = add_months(maturity, -months * steps)
+    return ends[ends > effective]
+
+
+class SequentialBootstrap:
+    """
+    Builds the curve pillar by pillar. Each pillar is stored as a serial
+    number and a log discount factor, with the curve date as the first
+    pillar.
+
+    Args:
+        curve_date (np.datetime64): curve reference date
+        day_count (str):            day count of the curve times, default Act360
+    """
+    def __init__(self, curve_date, day_count='Act360'):
+        self.reference_serial = int(node_curve.to_serials(
+            np.datetime64(curve_date, 'D')))
+        self.day_count = day_count
+        self.serials = np.array([self.reference_serial], dtype=np.int64)
+        self.times = np.array([0.0])
+        self.log_dfs = np.array([0.0])
+
+    def _time(self, serials):
+        return node_curve.year_fractions(self.day_count, self.reference_serial, serials)
+
+    def add_pillar(self, serial, discount_factor):
+        if serial <= self.serials[-1]:
+            raise ValueError('Pillars must be added in order of maturity')
+        self.serials = np.append(self.serials, serial)
+        self.times = np.append(self.times, self._time(serial))
+        self.log_dfs = np.append(self.log_dfs, np.log(discount_factor))
+
+    def discount(self, serials):
+        """
+        Discount factors on or before the last pillar.
+        """
+        return np.exp(np.interp(self._time(serials), self.times, self.log_dfs))
+
+    def segment_discount(self, serials, forward):
+        """
+        Discount factors after the last pillar, for a flat forward rate in
+        the new segment. Dates on or before the last pillar are unaffected.
+        """
+        t = self._time(serials)
+        beyond = t > self.times[-1]
+        log_dfs = np.interp(t, self.times, self.log_dfs)
+        log_dfs[beyond] = self.log_dfs[-1] - forward * (t[beyond] - self.times[-1])
+        return np.exp(log_dfs)
+
+    def add_deposit(self, maturity, rate, day_count='Act360'):
+        serial = int(node_curve.to_serials(maturity))
+        accrual = node_curve.year_fractions(day_count, self.reference_serial, serial)
+        self.add_pillar(serial, 1.0 / (1.0 + rate * accrual))
+
+    def add_swap(self, maturity, rate, fixed_months=6, float_months=3,
+                 fixed_day_count='30360', float_day_count='Act360'):
+        """
+        Adds the pillar at a swap's maturity such that the swap, starting on
+        the curve date, prices to par. The float leg projects forwards off
+        the curve being built.
+        """
+        effective = node_curve.to_datetime64(self.reference_serial)
+        fixed_ends = node_curve.to_serials(period_ends(effective, maturity, fixed_months))
+        float_ends = node_curve.to_serials(period_ends(effective, maturity, float_months))
+        fixed_starts = np.concatenate(([self.reference_serial], fixed_ends[:-1]))
+        float_starts = np.concatenate(([self.reference_serial], float_ends[:-1]))
+        if fixed_ends[-1] <= self.serials[-1]:
+            raise ValueError('Pillars must be added in order of maturity')
+
+        fixed_payments = rate * node_curve.year_fractions(fixed_day_count,
+                                                          fixed_starts, fixed_ends)
+        float_accruals = node_curve.year_fractions(float_day_count,
+                                                   float_starts, float_ends)
+
+        # every date of both legs, with one lookup into the fixed pillars;
+        # only the dates past the last pillar are repriced per iteration
+        leg_serials = np.concatenate((fixed_ends, float_starts, float_ends))
+        known = self.discount(np.minimum(leg_serials, self.serials[-1]))
+        t = self._time(leg_serials)
+        beyond = t > self.times[-1]
+        n_fixed, n_float = len(fixed_ends), len(float_ends)
+
+        def swap_value(forward):
+            dfs = known.copy()
+            dfs[beyond] *= np.exp(-forward * (t[beyond] - self.times[-1]))
+            fixed_dfs = dfs[:n_fixed]
+            start_dfs = dfs[n_fixed:n_fixed + n_float]
+            end_dfs = dfs[n_fixed + n_float:]
+            forwards = (start_dfs / end_dfs - 1.0) / float_accruals
+            fixed_leg = np.dot(fixed_payments, fixed_dfs)
+            float_leg = np.dot(forwards * float_accruals, end_dfs)
+            return fixed_leg - float_leg
+
+        forward = scipy.optimize.brentq(swap_value, *FORWARD_BRACKET, xtol=1e-15)
+        self.add_pillar(int(fixed_ends[-1]),
+                        self.segment_discount(fixed_ends[-1:], forward)[0])
+
+    def node_curve(self, extrapolate=False):
+        """
+        Returns the pillars as a log-linear discount NodeCurve.
+        """
+        zero_rates = np.empty(len(self.times))
+        zero_rates[1:] = -self.log_dfs[1:] / self.times[1:]
+        zero_rates[0] = zero_rates[1]
+        return node_curve.NodeCurve(self.reference_serial, self.times, zero_rates,
+                                    self.day_count, extrapolate,
+                                    'log_linear_discount')
+
+
+def bootstrap(curve_date, deposits, swaps, fixed_months=6, float_months=3,
+              fixed_day_count='30360', float_day_count='Act360',
+              day_count='Act360', extrapolate=False):
+    """
+    Bootstraps a single curve from deposits and swaps, without QuantLib.
+
+    Args:
+        curve_date (np.datetime64):     curve reference date, also the start
+                                        date of every instrument
+        deposits (list):                list of (tenor, rate) tuples, eg.
+                                        [('3MO', 0.0025)]
+        swaps (list):                   list of (tenor, rate) tuples, eg.
+                                        [('5YR', 0.0177)]
+        fixed_months (int, optional):   fixed leg period length, default 6
+        float_months (int, optional):   float leg period length, default 3
+        fixed_day_count (str, optional):    default '30360'
+        float_day_count (str, optional):    default 'Act360', also used for
+                                            the deposits
+        day_count (str, optional):      day count of the curve times
+        extrapolate (bool, optional):   allow queries past the last pillar
+
+    Returns:
+        curve (node_curve.NodeCurve)
+
+    Raises:
+        ValueError: if any instrument matures on or before the curve date or
+                    the maturity of another instrument, as each instrument
+                    adds the pillar at its maturity
+    """
+    builder = SequentialBootstrap(curve_date, day_count)
+    instruments = ([('deposit', tenor, tenor_date(curve_date, tenor), rate)
+                    for tenor, rate in deposits] +
+                   [('swap', tenor, tenor_date(curve_date, tenor), rate)
+                    for tenor, rate in swaps])
+    instruments.sort(key=lambda instrument: instrument[2])
+
+    inside = []
+    last_pillar = np.datetime64(curve_date, 'D')
+    for kind, tenor, maturity, rate in instruments:
+        if maturity <= last_pillar:
+            inside.append('{kind} {tenor}'.format(**locals()))
+        last_pillar = max(last_pillar, maturity)
+    if inside:
+        inside = ', '.join(inside)
+        raise ValueError('Instruments {inside} mature on or before an earlier '
+                         'pillar'.format(**locals()))
+
+    for kind, tenor, maturity, rate in instruments:
+        if kind == 'deposit':
+            builder.add_deposit(maturity, rate, float_day_count)
+        else:
+            builder.add_swap(maturity, rate, fixed_months, float_months,
+                             fixed_day_count, float_day_count)
+    return builder.node_curve(extrapolate)
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+import QuantLib as ql
+
+import helpers.node_curve as node_curve
+import helpers.simple_bootstrap as simple_bootstrap
+
+CURVE_DATE = np.datetime64('2014-12-31')
+DEPOSITS = [('1WK', 0.0013), ('1MO', 0.0017), ('3MO', 0.002556)]
+SWAPS = [('1YR', 0.00461), ('2YR', 0.00892), ('3YR', 0.0125), ('5YR', 0.01765),
+         ('7YR', 0.0205), ('10YR', 0.0231), ('30YR', 0.0265)]
+
+
+@pytest.fixture
+def bootstrapped():
+    return simple_bootstrap.bootstrap(CURVE_DATE, DEPOSITS, SWAPS)
+
+
+def swap_value(curve, tenor, rate):
+    # fixed minus float leg value of a swap starting on the curve date, priced
+    # from the bootstrapped curve
+    maturity = simple_bootstrap.tenor_date(CURVE_DATE, tenor)
+    legs = []
+    for months, day_count in ((6, '30360'), (3, 'Act360')):
+        ends = node_curve.to_serials(
+            simple_bootstrap.period_ends(CURVE_DATE, maturity, months))
+        starts = np.concatenate(([curve.reference_serial], ends[:-1]))
+        legs.append((starts, ends, node_curve.year_fractions(day_count, starts, ends)))
+    (fixed_starts, fixed_ends, fixed_accruals), (float_starts, float_ends, _) = legs
+    fixed_leg = rate * np.dot(fixed_accruals, curve.discount(fixed_ends))
+    float_leg = np.sum(curve.discount(float_starts) - curve.discount(float_ends))
+    return fixed_leg - float_leg
+
+
+def test_deposits_reprice(bootstrapped):
+    for tenor, rate in DEPOSITS:
+        maturity = node_curve.to_serials(simple_bootstrap.tenor_date(CURVE_DATE, tenor))
+        accrual = (maturity - bootstrapped.reference_serial) / 360.0
+        assert bootstrapped.discount(np.array([maturity]))[0] == pytest.approx(
+            1.0 / (1.0 + rate * accrual), abs=1e-15)
+
+
+def test_swaps_reprice_to_par(bootstrapped):
+    for tenor, rate in SWAPS:
+        assert swap_value(bootstrapped, tenor, rate) == pytest.approx(0.0, abs=1e-14)
+
+
+def test_matches_quantlib(evaluation_date):
+    # the same instruments in QuantLib, with no calendar, settlement lag or
+    # business day adjustment, as the simple bootstrap assumes
+    calendar = ql.NullCalendar()
+    index = ql.IborIndex('Libor3M', ql.Period(3, ql.Months), 0, ql.USDCurrency(),
+                         calendar, ql.Unadjusted, False, ql.Actual360())
+    helpers = [ql.DepositRateHelper(ql.QuoteHandle(ql.SimpleQuote(rate)),
+                                    ql.Period(tenor.replace('WK', 'W').replace('MO', 'M')),
+                                    0, calendar, ql.Unadjusted, False, ql.Actual360())
+               for tenor, rate in DEPOSITS]
+    helpers += [ql.SwapRateHelper(ql.QuoteHandle(ql.SimpleQuote(rate)),
+                                  ql.Period(int(tenor[:-2]), ql.Years), calendar,
+                                  ql.Semiannual, ql.Unadjusted,
+                                  ql.Thirty360(ql.Thirty360.BondBasis), index)
+                for tenor, rate in SWAPS]
+    qlcurve = ql.PiecewiseLogLinearDiscount(evaluation_date, helpers, ql.Actual360())
+    serials = np.arange(evaluation_date.serialNumber(), qlcurve.maxDate().serialNumber(), 17)
+    expected = [qlcurve.discount(ql.Date(int(serial))) for serial in serials]
+
+    bootstrapped = simple_bootstrap.bootstrap(CURVE_DATE, DEPOSITS, SWAPS)
+    np.testing.assert_allclose(bootstrapped.discount(serials), expected,
+                               rtol=0, atol=1e-13)
+
+
+def test_instruments_inside_the_curve():
+    # the 12MO deposit matures on the 1YR swap's pillar, and the 0D deposit on
+    # the curve date
+    with pytest.raises(ValueError, match='Instruments swap 1YR mature on or before'):
+        simple_bootstrap.bootstrap(CURVE_DATE, DEPOSITS + [('12MO', 0.005)], SWAPS)
+    with pytest.raises(ValueError, match='Instruments deposit 0D, swap 1YR mature'):
+        simple_bootstrap.bootstrap(CURVE_DATE, DEPOSITS + [('0D', 0.001), ('12MO', 0.005)],
+                                   SWAPS)
+
+
+def test_pillars_in_order():
+    builder = simple_bootstrap.SequentialBootstrap(CURVE_DATE)
+    builder.add_swap(simple_bootstrap.tenor_date(CURVE_DATE, '2YR'), 0.00892)
+    with pytest.raises(ValueError, match='order of maturity'):
+        builder.add_swap(simple_bootstrap.tenor_date(CURVE_DATE, '1YR'), 0.00461)
+
+
+def test_add_months_clips_to_month_end():
+    dates = np.array(['2015-01-31', '2015-01-31', '2016-01-31', '2014-08-31'],
+                     dtype='datetime64[D]')
+    np.testing.assert_array_equal(
+        simple_bootstrap.add_months(dates, [1, 13, 1, -6]),
+        np.array(['2015-02-28', '2016-02-29', '2016-02-29', '2014-02-28'],
+                 dtype='datetime64[D]'))
@@ -0,0 +1,241 @@
+"""
+This module reads and writes curve snapshots: a compact binary format for
+built curves that can be loaded without QuantLib or the market data
+database. A snapshot file holds any number of curves as fixed-size records
+of a numpy structured array, saved in the .npy format, so a file of
+thousands of curves can be memory-mapped and a single curve rehydrated into
+a node_curve.NodeCurve without reading the rest of the file, eg.
+
+    snapshot.write('outputs/curves.npy', [usd_3m, usd_ois])
+    snapshots = snapshot.read('outputs/curves.npy')
+    usd_3m = snapshots.node_curve('USD_3M', '2014-12-31')
+    usd_3m.discount(dates)
+
+Each record holds the curve name and date, the node serial numbers and
+discount factors, the day count and interpolation needed to rebuild the
+curve, and the instrument quotes it was built from. The node and quote
+arrays are padded to the widest curve in the file; node_count and
+quote_count give the number of values used.
+"""
+import numpy as np
+import QuantLib as ql
+
+import helpers.node_curve as node_curve
+
+SNAPSHOT_VERSION = 1
+NAME_LENGTH = 32
+INSTRUMENT_LENGTH = 24
+
+
+def snapshot_dtype(max_nodes, max_quotes):
+    """
+    Returns the structured dtype of a snapshot record with room for
+    max_nodes nodes and max_quotes quotes.
+    """
+    return np.dtype([('version', np.int16),
+                     ('name', 'S{}'.format(NAME_LENGTH)),
+                     ('curve_serial', np.int64),
+                     ('reference_serial', np.int64),
+                     ('day_count', 'S16'),
+                     ('interpolation', 'S24'),
+                     ('extrapolate', np.bool_),
+                     ('node_count', np.int32),
+                     ('node_serials', np.int64, (max_nodes,)),
+                     ('discount_factors', np.float64, (max_nodes,)),
+                     ('quote_count', np.int32),
+                     ('instruments', 'S{}'.format(INSTRUMENT_LENGTH), (max_quotes,)),
+                     ('quotes', np.float64, (max_quotes,))])
+
+
+def _encode(string, length, field):
+    encoded = string.encode('ascii')
+    if len(encoded) > length:
+        raise ValueError('{field} {string} is longer than {length} '
+                         'characters'.format(**locals()))
+    return encoded
+
+
+def curve_data(curve):
+    """
+    Returns the values stored in a snapshot for a built Curve, as a dict.
+    Unless the curve is built and its nodes have already been extracted
+    (see Curve.nodes_extracted), the QuantLib evaluation date should be the
+    curve date.
+    """
+    nodes = curve.node_curve
+    node_serials = node_curve.to_serials(np.array(curve.dates, dtype='datetime64[D]'))
+    discount_factors = curve.discount_factors
+    # a curve rehydrated from a CurveStore only has its quotes once it's
+    # built. Its nodes are read first, so its own bootstrap is skipped, but
+    # a LiborCurve's build bootstraps its OIS curve
+    quotes = sorted((instrument, quote.value())
+                    for instrument, quote in curve.quotes.items())
+    return {'name': curve.name,
+            'curve_serial': curve.curve_date.serialNumber(),
+            'reference_serial': nodes.reference_serial,
+            'day_count': nodes.day_count,
+            'interpolation': nodes.interpolation,
+            'extrapolate': nodes.extrapolate,
+            'node_serials': node_serials,
+            'discount_factors': discount_factors,
+            'quotes': quotes}
+
+
+def _all_curve_data(curves):
+    # a built curve is only valid while the evaluation date is its curve
+    # date, and every move of the evaluation date notifies every live
+    # QuantLib curve, so curves whose nodes still need extracting, or that
+    # still need building (eg. rehydrated from a CurveStore), are read in
+    # date order with one move per date
+    settings = ql.Settings.instance()
+    evaluation_date = settings.evaluationDate
+    data = [None] * len(curves)
+    order = sorted(range(len(curves)),
+                   key=lambda i: curves[i].curve_date.serialNumber())
+    try:
+        for i in order:
+            if (not (curves[i].nodes_extracted and curves[i].built) and
+                    settings.evaluationDate != curves[i].curve_date):
+                settings.evaluationDate = curves[i].curve_date
+            data[i] = curve_data(curves[i])
+    finally:
+        if settings.evaluationDate != evaluation_date:
+            settings.evaluationDate = evaluation_date
+    return data
+
+
+def to_records(curves, max_nodes=None, max_quotes=None):
+    """
+    Converts built curves to an array of snapshot records.
+
+    Args:
+        curves (list):              built Curve objects
+        max_nodes (int, optional):  node capacity of each record
+                                    default: the most nodes of any curve
+        max_quotes (int, optional): quote capacity of each record
+                                    default: the most quotes of any curve
+
+    Returns:
+        records (np.ndarray):       structured array, one record per curve
+    """
+    data = _all_curve_data(curves)
+    if max_nodes is None:
+        max_nodes = max([len(d['node_serials']) for d in data], default=0)
+    if max_quotes is None:
+        max_quotes = max([len(d['quotes']) for d in data], default=0)
+
+    records = np.zeros(len(data), dtype=snapshot_dtype(max_nodes, max_quotes))
+    for record, d in zip(records, data):
+        node_count, quote_count = len(d['node_serials']), len(d['quotes'])
+        if node_count > max_nodes or quote_count > max_quotes:
+            name = d['name']
+            raise ValueError('{name} has {node_count} nodes and {quote_count} '
+                             'quotes, more than the snapshot holds'.format(**locals()))
+        record['version'] = SNAPSHOT_VERSION
+        record['name'] = _encode(d['name'], NAME_LENGTH, 'Curve name')
+        record['curve_serial'] = d['curve_serial']
+        record['reference_serial'] = d['reference_serial']
+        record['day_count'] = _encode(d['day_count'], 16, 'Day count')
+        record['interpolation'] = _encode(d['interpolation'], 24, 'Interpolation')
+        record['extrapolate'] = d['extrapolate']
+        record['node_count'] = node_count
+        record['node_serials'][:node_count] = d['node_serials']
+        record['discount_factors'][:node_count] = d['discount_factors']
+        record['quote_count'] = quote_count
+        for i, (instrument, value) in enumerate(d['quotes']):
+            record['instruments'][i] = _encode(instrument, INSTRUMENT_LENGTH, 'Instrument')
+            record['quotes'][i] = value
+    return records
+
+
+def write(file_name, curves, max_nodes=None, max_quotes=None):
+    """
+    Writes built curves to a snapshot file (see to_records for the
+    arguments). Returns the number of curves written.
+    """
+    records = to_records(curves, max_nodes, max_quotes)
+    np.save(file_name, records, allow_pickle=False)
+    return len(records)
+
+
+def read(file_name, mmap=True):
+    """
+    Opens a snapshot file. With mmap, the records are memory-mapped and only
+    read from disk as they are used.
+
+    Returns:
+        snapshots (Snapshots)
+    """
+    records = np.load(file_name, mmap_mode='r' if mmap else None,
+                      allow_pickle=False)
+    return Snapshots(records)
+
+
+def rehydrate(record):
+    """
+    Rebuilds the NodeCurve of a snapshot record.
+    """
+    count = int(record['node_count'])
+    return node_curve.NodeCurve.from_discount_factors(
+        int(record['reference_serial']), record['node_serials'][:count],
+        record['discount_factors'][:count], record['day_count'].decode(),
+        bool(record['extrapolate']), record['interpolation'].decode())
+
+
+class Snapshots:
+    """
+    The Snapshots object gives access to the curves in a snapshot file.
+
+    Args:
+        records (np.ndarray):       structured array of snapshot records
+
+    Attributes:
+        names (np.ndarray):         curve name of each record, as bytes
+        curve_serials (np.ndarray): curve date serial of each record
+    """
+    def __init__(self, records):
+        self.records = records
+        versions = np.unique(records['version'])
+        if len(versions) and versions.max() > SNAPSHOT_VERSION:
+            raise ValueError('Snapshot version {} is not supported'.format(versions.max()))
+        self.names = np.asarray(records['name'])
+        self.curve_serials = np.asarray(records['curve_serial'])
+
+    def __len__(self):
+        return len(self.records)
+
+    def index(self, name, iso_date):
+        """
+        Returns the record number of a curve on a date.
+        """
+        serial = node_curve.to_serials(np.datetime64(iso_date, 'D'))
+        found = np.flatnonzero((self.names == name.encode('ascii')) &
+                               (self.curve_serials == serial))
+        if not len(found):
+            raise ValueError('No snapshot of {name} on {iso_date}'.format(**locals()))
+        return int(found[-1])
+
+    def node_curve(self, name, iso_date):
+        """
+        Returns the NodeCurve of a curve on a date.
+        """
+        return rehydrate(self.records[self.index(name, iso_date)])
+
+    def nodes(self, name, iso_date):
+        """
+        Returns the (node_dates, discount_factors) of a curve on a date, with
+        the node dates as datetime64[D].
+        """
+        record = self.records[self.index(name, iso_date)]
+        count = int(record['node_count'])
+        return (node_curve.to_datetime64(record['node_serials'][:count]),
+                np.array(record['discount_factors'][:count]))
+
+    def quotes(self, name, iso_date):
+        """
+        Returns a dict of instrument -> quote the curve was built from.
+        """
+        record = self.records[self.index(name, iso_date)]
+        count = int(record['quote_count'])
+        return {instrument.decode(): float(value) for instrument, value in
+                zip(record['instruments'][:count], record['quotes'][:count])}
@@ -0,0 +1,115 @@
+import sqlite3
+
+import numpy as np
+import pytest
+import QuantLib as ql
+
+import helpers.batch as batch
+import helpers.curve as curve
+import helpers.curve_store as curve_store
+import helpers.node_curve as node_curve
+import helpers.snapshot as snapshot
+
+
+@pytest.fixture
+def curves(conn, history_dates):
+    # USD_3M and its OIS curve on the first and last dates of the history
+    dates = [history_dates[0], history_dates[-1]]
+    market_data = batch.MarketDataSet(conn, ['USD_3M'], dates[0].ISO(), dates[-1].ISO())
+    built = []
+    for date in dates:
+        ql.Settings.instance().evaluationDate = date
+        libor = curve.LiborCurve('USD_3M', date, conn, market_data=market_data)
+        # the nodes are extracted while the evaluation date is the curve date
+        libor.node_curve
+        libor.ois_curve.node_curve
+        built += [libor, libor.ois_curve]
+    return built
+
+
+def query_serials(built):
+    return np.arange(built.settlement_date.serialNumber(),
+                     built.qlcurve.maxDate().serialNumber(), 7)
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_round_trip(tmp_path, curves, mmap):
+    file_name = str(tmp_path / 'curves.npy')
+    assert snapshot.write(file_name, curves) == len(curves)
+    snapshots = snapshot.read(file_name, mmap=mmap)
+    assert len(snapshots) == len(curves)
+
+    for built in curves:
+        name, iso_date = built.name, built.iso_date
+        dates, discount_factors = snapshots.nodes(name, iso_date)
+        np.testing.assert_array_equal(dates, np.array(built.dates, dtype='datetime64[D]'))
+        np.testing.assert_array_equal(discount_factors, built.discount_factors)
+        assert snapshots.quotes(name, iso_date) == {
+            instrument: quote.value() for instrument, quote in built.quotes.items()}
+
+        # the zero rates are taken back from the discount factors, which
+        # costs a few ulps through the log and exp
+        rehydrated = snapshots.node_curve(name, iso_date)
+        assert rehydrated.interpolation == built.node_curve.interpolation
+        serials = query_serials(built)
+        np.testing.assert_allclose(rehydrated.discount(serials),
+                                   built.discount_factor_array(serials),
+                                   rtol=0, atol=5e-15)
+
+
+def test_rehydrated_curves(conn, tmp_path, curves):
+    # rehydrated curves are built for their quotes on their own curve dates,
+    # whatever the evaluation date
+    store = curve_store.CurveStore(sqlite3.connect(str(tmp_path / 'store.db')))
+    libors = curves[::2]
+    for libor in libors:
+        store.save(libor)
+        store.save(libor.ois_curve)
+    rehydrated = [curve.LiborCurve(libor.name, libor.curve_date, conn,
+                                   market_data=libor.market_data, store=store)
+                  for libor in libors]
+    assert all(built.rehydrated and not built.built for built in rehydrated)
+
+    ql.Settings.instance().evaluationDate = ql.Date(2, 1, 2015)
+    records = snapshot.to_records(rehydrated)
+    np.testing.assert_array_equal(records, snapshot.to_records(libors))
+    assert ql.Settings.instance().evaluationDate == ql.Date(2, 1, 2015)
+    assert all(built.built for built in rehydrated)
+    store.conn.close()
+
+
+def test_padded_records(curves):
+    # the OIS curves have fewer nodes than the LIBOR curves, so their records
+    # are padded to the widest curve
+    records = snapshot.to_records(curves, max_nodes=60, max_quotes=60)
+    assert records.dtype['node_serials'].shape == (60,)
+    for record, built in zip(records, curves):
+        assert record['node_count'] == len(built.dates)
+        assert not record['node_serials'][record['node_count']:].any()
+
+
+def test_too_many_nodes(curves):
+    with pytest.raises(ValueError, match='more than the snapshot holds'):
+        snapshot.to_records(curves, max_nodes=5)
+
+
+def test_missing_curve(tmp_path, curves):
+    file_name = str(tmp_path / 'curves.npy')
+    snapshot.write(file_name, curves)
+    with pytest.raises(ValueError, match='No snapshot of USD_6M on 2014-12-31'):
+        snapshot.read(file_name).node_curve('USD_6M', '2014-12-31')
+
+
+def test_newer_version(tmp_path, curves):
+    records = snapshot.to_records(curves)
+    records['version'] = snapshot.SNAPSHOT_VERSION + 1
+    file_name = str(tmp_path / 'curves.npy')
+    np.save(file_name, records)
+    with pytest.raises(ValueError, match='is not supported'):
+        snapshot.read(file_name)
+
+
+def test_to_datetime64_round_trip():
+    serials = np.arange(40000, 50000, 97)
+    np.testing.assert_array_equal(node_curve.to_serials(node_curve.to_datetime64(serials)),
+                                  serials)
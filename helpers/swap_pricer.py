@@ -0,0 +1,283 @@
+"""
+This module values portfolios of vanilla interest rate swaps without
+building a QuantLib instrument per trade. The fixed and float leg periods of
+every swap in the portfolio are held in flat numpy arrays (one row per
+period, with the index of the trade each period belongs to), so valuing the
+whole book is one discount factor lookup per curve, a few array operations,
+and a np.bincount per result to sum the periods of each trade.
+
+Schedules come from swap_schedule: either generated for the whole book in
+one call, or taken from existing Schedule objects (eg. the shared schedules
+of a schedule_cache.ScheduleCache).
+
+Curves are given as Curve objects (see curve.py) or node_curve.NodeCurve
+objects; the discount curve discounts both legs, and the projection curve,
+if different, projects the float leg forwards. Periods that have already
+paid are ignored. Float coupons that fixed before the evaluation date (the
+curve date of a Curve, which is before its spot reference date) have their
+rates supplied in fixings; the ones fixing on or after it are projected.
+"""
+import numpy as np
+
+import helpers.node_curve as node_curve
+import helpers.swap_schedule as swap_schedule
+
+
+def _node_curve(curve):
+    # Curve objects hold their nodes in node_curve; NodeCurves are used as is
+    return getattr(curve, 'node_curve', curve)
+
+
+def _evaluation_serial(curve, evaluation_date=None):
+    # the date that periods have fixed before: the given date, else the
+    # curve date of a Curve, else the reference date of a NodeCurve
+    if evaluation_date is None:
+        evaluation_date = getattr(curve, 'curve_date', None)
+    if evaluation_date is None:
+        return _node_curve(curve).reference_serial
+    if hasattr(evaluation_date, 'serialNumber'):
+        return evaluation_date.serialNumber()
+    return int(node_curve.to_serials(np.datetime64(evaluation_date, 'D')))
+
+
+def _discount(curve, serials):
+    # a book has far more cash flows than distinct dates, so when it's
+    # smaller, the curve is evaluated once per day of the date range and the
+    # discount factors are gathered from that table
+    if not len(serials):
+        return np.empty(0)
+    first, last = serials.min(), serials.max()
+    if last - first + 1 >= len(serials):
+        return curve.discount(serials)
+    table = curve.discount(np.arange(first, last + 1))
+    return table[serials - first]
+
+
+class Leg:
+    """
+    The Leg holds the periods of one leg of every swap in a portfolio as
+    flat arrays.
+
+    Args:
+        periods (np.recarray):      periods of every schedule, one after the
+                                    other, as from generate_schedules()
+        offsets (np.ndarray):       schedule i is periods[offsets[i]:offsets[i + 1]]
+        day_count (str):            accrual day count, eg. '30360'
+
+    Attributes:
+        trades (np.ndarray):        trade index of each period
+        fixing_serials, start_serials, end_serials, payment_serials
+                                    (np.ndarray): serial numbers of the
+                                    period dates
+        accruals (np.ndarray):      accrual year fraction of each period
+    """
+    def __init__(self, periods, offsets, day_count):
+        self.day_count = day_count
+        self.trades = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        self.fixing_serials = node_curve.to_serials(periods.fixing_date)
+        self.start_serials = node_curve.to_serials(periods.accrual_start)
+        self.end_serials = node_curve.to_serials(periods.accrual_end)
+        self.payment_serials = node_curve.to_serials(periods.payment_date)
+        self.accruals = node_curve.year_fractions(day_count, self.start_serials,
+                                                  self.end_serials)
+
+    @classmethod
+    def from_schedules(cls, schedules, day_count):
+        """
+        Builds the leg from a list of Schedule objects, one per trade.
+        """
+        counts = [len(schedule.periods) for schedule in schedules]
+        periods = np.concatenate([schedule.periods for schedule in schedules]).view(np.recarray)
+        return cls(periods, np.concatenate(([0], np.cumsum(counts))), day_count)
+
+    def __len__(self):
+        return len(self.trades)
+
+
+class SwapValuation:
+    """
+    The SwapValuation holds the results of valuing a SwapPortfolio, with one
+    value per trade in each array.
+
+    Attributes:
+        npv (np.ndarray):           net present value to the holder, ie.
+                                    float less fixed for payers of fixed
+        fixed_pv (np.ndarray):      present value of the remaining fixed leg
+        float_pv (np.ndarray):      present value of the remaining float leg,
+                                    including any spread
+        annuity (np.ndarray):       present value of 1 (times the notional)
+                                    paid on the remaining fixed periods
+        par_rate (np.ndarray):      fixed rate giving an NPV of zero
+    """
+    def __init__(self, npv, fixed_pv, float_pv, annuity, par_rate):
+        self.npv = npv
+        self.fixed_pv = fixed_pv
+        self.float_pv = float_pv
+        self.annuity = annuity
+        self.par_rate = par_rate
+
+
+class SwapPortfolio:
+    """
+    The SwapPortfolio holds the terms and leg periods of many fixed/float
+    swaps, and values them all at once against a discount and a projection
+    curve. Every argument other than the legs can be a scalar or an array
+    with one value per trade.
+
+    Args:
+        fixed_leg (Leg):            fixed leg periods of every trade
+        float_leg (Leg):            float leg periods of every trade
+        fixed_rate (np.ndarray):    fixed rate of each trade
+        notional (np.ndarray, optional):    notional of each trade
+                                            default: 1.0
+        payer (np.ndarray, optional):       True where the holder pays fixed
+                                            default: True
+        spread (np.ndarray, optional):      spread over the float index
+                                            default: 0.0
+        index_day_count (str, optional):    day count of the float index,
+                                            used to project the forwards
+                                            default: the float leg day count
+    """
+    def __init__(self, fixed_leg, float_leg, fixed_rate, notional=1.0,
+                 payer=True, spread=0.0, index_day_count=None):
+        self.fixed_leg = fixed_leg
+        self.float_leg = float_leg
+        self.count = len(np.atleast_1d(fixed_rate))
+        self.fixed_rate = np.broadcast_to(np.asarray(fixed_rate, dtype=float), (self.count,))
+        self.notional = np.broadcast_to(np.asarray(notional, dtype=float), (self.count,))
+        self.payer = np.broadcast_to(np.asarray(payer, dtype=bool), (self.count,))
+        self.spread = np.broadcast_to(np.asarray(spread, dtype=float), (self.count,))
+        self.index_day_count = index_day_count or float_leg.day_count
+        self.index_accruals = node_curve.year_fractions(
+            self.index_day_count, float_leg.start_serials, float_leg.end_serials)
+
+    @classmethod
+    def from_terms(cls, effective, maturity, fixed_rate, notional=1.0,
+                   payer=True, spread=0.0, fixed_length=6, float_length=3,
+                   fixed_day_count='30360', float_day_count='Act360',
+                   fixed_adjustment='unadjusted',
+                   float_adjustment='modified following',
+                   payment_adjustment='modified following', fixing_lag=2,
+                   calendar=None):
+        """
+        Builds the portfolio from arrays of effective and maturity dates,
+        generating the schedules of every trade with one generate_schedules()
+        call per leg.
+
+        Args:
+            effective (np.ndarray):     datetime64 effective dates
+            maturity (np.ndarray):      datetime64 maturity dates
+            fixed_rate (np.ndarray):    fixed rate of each trade
+            fixed_length (int, optional):   months per fixed period, default 6
+            float_length (int, optional):   months per float period, default 3
+            calendar (str, optional):   holiday calendar name, see calendars.py
+
+            see SwapPortfolio and swap_schedule.generate_schedules for the
+            other arguments
+
+        Returns:
+            portfolio (SwapPortfolio)
+        """
+        fixed_periods, fixed_offsets = swap_schedule.generate_schedules(
+            effective, maturity, fixed_length, fixed_adjustment,
+            payment_adjustment, fixing_lag, calendar=calendar)
+        float_periods, float_offsets = swap_schedule.generate_schedules(
+            effective, maturity, float_length, float_adjustment,
+            payment_adjustment, fixing_lag, calendar=calendar)
+        return cls(Leg(fixed_periods, fixed_offsets, fixed_day_count),
+                   Leg(float_periods, float_offsets, float_day_count),
+                   fixed_rate, notional, payer, spread)
+
+    def __len__(self):
+        return self.count
+
+    def _sum_by_trade(self, leg, values):
+        return np.bincount(leg.trades, weights=values, minlength=self.count)
+
+    def forwards(self, projection_curve, fixings=None, evaluation_date=None):
+        """
+        Returns the projected rate of every float period, using fixings for
+        the periods that fixed before the evaluation date.
+
+        Args:
+            projection_curve (Curve):   curve projecting the float index
+            fixings (np.ndarray, optional): rate of each trade's current
+                                            float period, where it has fixed
+            evaluation_date (ql.Date, optional):    valuation date, periods
+                                                    fixing before it use
+                                                    fixings
+                                                    default: the curve_date of
+                                                    projection_curve, or the
+                                                    reference date of a
+                                                    NodeCurve
+
+        Returns:
+            forwards (np.ndarray):      one rate per float period
+        """
+        curve = _node_curve(projection_curve)
+        leg = self.float_leg
+        fixed = leg.fixing_serials < _evaluation_serial(projection_curve, evaluation_date)
+        live = leg.payment_serials > curve.reference_serial
+
+        forwards = np.full(len(leg), np.nan)
+        project = live & ~fixed
+        dfs = _discount(curve, np.concatenate((leg.start_serials[project],
+                                             leg.end_serials[project])))
+        starts, ends = np.split(dfs, 2)
+        forwards[project] = (starts / ends - 1.0) / self.index_accruals[project]
+
+        current = live & fixed
+        if current.any():
+            if fixings is None:
+                count = int(current.sum())
+                raise ValueError('Fixings are required for {count} float periods '
+                                 'that fixed before the evaluation date'
+                                 .format(**locals()))
+            forwards[current] = np.broadcast_to(
+                np.asarray(fixings, dtype=float), (self.count,))[leg.trades[current]]
+        return forwards
+
+    def value(self, discount_curve, projection_curve=None, fixings=None,
+              evaluation_date=None):
+        """
+        Values every swap in the portfolio. Cash flows paid on or before the
+        discount curve reference date are excluded.
+
+        Args:
+            discount_curve (Curve):     curve discounting both legs, eg. the
+                                        OISCurve, or a NodeCurve
+            projection_curve (Curve, optional): curve projecting the float
+                                                leg, eg. the LiborCurve
+                                                default: discount_curve
+            fixings (np.ndarray, optional): rate of each trade's current
+                                            float period, where it has fixed
+            evaluation_date (ql.Date, optional):    valuation date, see
+                                                    forwards()
+
+        Returns:
+            valuation (SwapValuation)
+        """
+        projection_curve = projection_curve or discount_curve
+        discount = _node_curve(discount_curve)
+        fixed, floating = self.fixed_leg, self.float_leg
+
+        fixed_live = fixed.payment_serials > discount.reference_serial
+        float_live = floating.payment_serials > discount.reference_serial
+        dfs = _discount(discount, np.concatenate((fixed.payment_serials[fixed_live],
+                                                  floating.payment_serials[float_live])))
+        fixed_dfs, float_dfs = np.zeros(len(fixed)), np.zeros(len(floating))
+        fixed_dfs[fixed_live] = dfs[:fixed_live.sum()]
+        float_dfs[float_live] = dfs[fixed_live.sum():]
+
+        forwards = np.where(float_live, self.forwards(projection_curve, fixings,
+                                                      evaluation_date), 0.0)
+        coupons = forwards + self.spread[floating.trades]
+
+        annuity = self.notional * self._sum_by_trade(fixed, fixed.accruals * fixed_dfs)
+        float_pv = self.notional * self._sum_by_trade(
+            floating, coupons * floating.accruals * float_dfs)
+        fixed_pv = self.fixed_rate * annuity
+        npv = np.where(self.payer, float_pv - fixed_pv, fixed_pv - float_pv)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            par_rate = float_pv / annuity
+        return SwapValuation(npv, fixed_pv, float_pv, annuity, par_rate)
@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+import QuantLib as ql
+
+import helpers.batch as batch
+import helpers.calendars as calendars
+import helpers.curve as curve
+import helpers.node_curve as node_curve
+import helpers.swap_pricer as swap_pricer
+import helpers.swap_schedule as swap_schedule
+
+# the current float period of the seasoned trade fixed at FIXING
+SEASONED = (np.datetime64('2014-10-15'), np.datetime64('2019-10-15'))
+FIXING = 0.0024
+
+
+@pytest.fixture
+def libor(conn, evaluation_date):
+    market_data = batch.MarketDataSet(conn, ['USD_3M'], evaluation_date.ISO(),
+                                      evaluation_date.ISO())
+    return curve.LiborCurve('USD_3M', evaluation_date, conn, market_data=market_data)
+
+
+@pytest.fixture
+def terms():
+    # forward starting swaps effective on NYSE business days, and one that
+    # started before the curve date
+    rng = np.random.default_rng(3)
+    count = 40
+    effective = calendars.get_calendar('NYSE').adjust(
+        np.datetime64('2015-01-06') + rng.integers(0, 700, count), 'following')
+    maturity = swap_schedule.add_months(effective, rng.integers(1, 20, count) * 12)
+    effective = np.append(effective, SEASONED[0])
+    maturity = np.append(maturity, SEASONED[1])
+    fixed_rate = rng.uniform(0.01, 0.03, count + 1)
+    payer = rng.integers(0, 2, count + 1).astype(bool)
+    return effective, maturity, fixed_rate, payer
+
+
+def ql_date(date):
+    return ql.Date(int(node_curve.to_serials(date)))
+
+
+@pytest.fixture
+def index(libor):
+    # a 3M index fixing on the NYSE calendar, as the schedules do
+    nyse = calendars.quantlib_calendar('NYSE')
+    index = ql.IborIndex('USDLibor3M', ql.Period(3, ql.Months), 2, ql.USDCurrency(),
+                         nyse, ql.ModifiedFollowing, False, ql.Actual360(),
+                         ql.YieldTermStructureHandle(libor.qlcurve))
+    index.addFixing(nyse.advance(ql_date(SEASONED[0]), -2, ql.Days, ql.Preceding),
+                    FIXING)
+    yield index
+    index.clearFixings()
+
+
+def quantlib_swaps(libor, index, terms):
+    nyse = calendars.quantlib_calendar('NYSE')
+    engine = ql.DiscountingSwapEngine(ql.YieldTermStructureHandle(libor.ois_curve.qlcurve))
+    swaps = []
+    for effective, maturity, fixed_rate, payer in zip(*terms):
+        start, end = ql_date(effective), ql_date(maturity)
+        fixed_schedule = ql.Schedule(start, end, ql.Period(6, ql.Months), nyse,
+                                     ql.Unadjusted, ql.Unadjusted,
+                                     ql.DateGeneration.Backward, False)
+        float_schedule = ql.Schedule(start, end, ql.Period(3, ql.Months), nyse,
+                                     ql.ModifiedFollowing, ql.ModifiedFollowing,
+                                     ql.DateGeneration.Backward, False)
+        swap = ql.VanillaSwap(ql.VanillaSwap.Payer if payer else ql.VanillaSwap.Receiver,
+                              1.0, fixed_schedule, float(fixed_rate),
+                              ql.Thirty360(ql.Thirty360.BondBasis), float_schedule,
+                              index, 0.0, ql.Actual360())
+        swap.setPricingEngine(engine)
+        swaps.append(swap)
+    return swaps
+
+
+def test_matches_vanilla_swap(libor, index, terms):
+    effective, maturity, fixed_rate, payer = terms
+    portfolio = swap_pricer.SwapPortfolio.from_terms(effective, maturity, fixed_rate,
+                                                     payer=payer, calendar='NYSE')
+    fixings = np.where(effective == SEASONED[0], FIXING, np.nan)
+    valuation = portfolio.value(libor.ois_curve, libor, fixings)
+    swaps = quantlib_swaps(libor, index, terms)
+    np.testing.assert_allclose(valuation.npv, [swap.NPV() for swap in swaps],
+                               rtol=0, atol=1e-14)
+    np.testing.assert_allclose(valuation.par_rate, [swap.fairRate() for swap in swaps],
+                               rtol=0, atol=1e-14)
+    np.testing.assert_allclose(valuation.annuity,
+                               [abs(swap.fixedLegBPS()) / 1e-4 for swap in swaps],
+                               rtol=0, atol=1e-13)
+
+
+def test_schedules_match_terms(libor, terms):
+    effective, maturity, fixed_rate, payer = [array[:-1] for array in terms]
+    from_terms = swap_pricer.SwapPortfolio.from_terms(effective, maturity, fixed_rate,
+                                                      payer=payer, calendar='NYSE')
+    legs = []
+    for length, adjustment, day_count in ((6, 'unadjusted', '30360'),
+                                          (3, 'modified following', 'Act360')):
+        schedules = [swap_schedule.Schedule(start, end, length,
+                                            period_adjustment=adjustment,
+                                            payment_adjustment='modified following',
+                                            calendar='NYSE')
+                     for start, end in zip(effective, maturity)]
+        legs.append(swap_pricer.Leg.from_schedules(schedules, day_count))
+    from_schedules = swap_pricer.SwapPortfolio(legs[0], legs[1], fixed_rate, payer=payer)
+    np.testing.assert_array_equal(from_schedules.value(libor.ois_curve, libor).npv,
+                                  from_terms.value(libor.ois_curve, libor).npv)
+
+
+def test_fixings_required(libor, terms):
+    portfolio = swap_pricer.SwapPortfolio.from_terms(*terms[:3], calendar='NYSE')
+    with pytest.raises(ValueError, match='Fixings are required for 1 float periods'):
+        portfolio.value(libor.ois_curve, libor)
+
+
+def test_fixing_on_the_curve_date_is_projected(libor, index):
+    # the first period fixes on the curve date, before the spot date, so it
+    # is projected rather than taken from the fixings
+    terms = (np.array(['2015-01-05'], dtype='datetime64[D]'),
+             np.array(['2020-01-06'], dtype='datetime64[D]'), np.array([0.02]),
+             np.array([True]))
+    portfolio = swap_pricer.SwapPortfolio.from_terms(*terms[:3], calendar='NYSE')
+    assert portfolio.float_leg.fixing_serials[0] == ql.Date(31, 12, 2014).serialNumber()
+    assert portfolio.float_leg.fixing_serials[0] < libor.node_curve.reference_serial
+    valuation = portfolio.value(libor.ois_curve, libor)
+    swap, = quantlib_swaps(libor, index, terms)
+    np.testing.assert_allclose(valuation.npv, [swap.NPV()], rtol=0, atol=1e-14)
+    # valued the next day, the period has fixed
+    with pytest.raises(ValueError, match='Fixings are required for 1 float periods'):
+        portfolio.value(libor.ois_curve, libor, evaluation_date=ql.Date(2, 1, 2015))
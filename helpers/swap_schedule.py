@@ -1,14 +1,210 @@
 '''
+Swap schedules generated with numpy datetime64 arithmetic. Period ends are
+rolled backward from the maturity in whole months (datetime64[M]), weeks or
+days, and business day adjustments are lookups into the precomputed tables
+of a calendars.HolidayCalendar, so a whole book of schedules can be
+generated in one call with generate_schedules(). The Schedule class builds a
+single swap's schedule on the same engine.
+
+Calendars are given by name (eg. 'NYSE', as in the general_HolidayCalendar
+convention) or as a HolidayCalendar; with no calendar only weekends are
+holidays.
 '''
 
-import dateutil.relativedelta
 import numpy as np
 
+import helpers.calendars as calendars
+
+PERIOD_DTYPE = [('fixing_date', 'datetime64[D]'),
+                ('accrual_start', 'datetime64[D]'),
+                ('accrual_end', 'datetime64[D]'),
+                ('payment_date', 'datetime64[D]')]
+
+def to_datetime64(dates):
+    '''
+    Converts a date, or an array of dates, given as datetime objects, ISO
+    strings or datetime64 values, to datetime64[D].
+    '''
+    if isinstance(dates, (list, tuple)):
+        return np.array([np.datetime64(date, 'D') for date in dates],
+                        dtype='datetime64[D]')
+    return np.asarray(dates).astype('datetime64[D]')
+
+
+def add_months(dates, months):
+    '''
+    Adds months to an array of datetime64[D] dates, clipping the day to the
+    end of the month (eg. 31-Jan + 1M = 28-Feb).
+    '''
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    month_starts = dates.astype('datetime64[M]')
+    day = (dates - month_starts.astype('datetime64[D]')).astype(np.int64)
+    new_months = month_starts + np.asarray(months, dtype=np.int64)
+    month_length = ((new_months + 1).astype('datetime64[D]') -
+                    new_months.astype('datetime64[D]')).astype(np.int64)
+    return new_months.astype('datetime64[D]') + np.minimum(day, month_length - 1)
+
+
+def adjust_dates(dates, adjustment, calendar=None):
+    '''
+    Applies a business day adjustment to an array of datetime64[D] dates.
+
+    Arguments:
+        dates (np.ndarray): datetime64[D] dates
+        adjustment (str): unadjusted, following, preceding,
+                          modified following, or modified preceding
+        calendar (str, optional): holiday calendar name, or HolidayCalendar
+                                  default: weekends only
+
+    Returns:
+        dates (np.ndarray): adjusted datetime64[D] dates
+    '''
+    return calendars.get_calendar(calendar).adjust(dates, adjustment)
+
+
+def roll_backward(effective, maturity, length, period_length='months'):
+    '''
+    Generates the unadjusted period ends of many schedules at once, rolling
+    backward from each maturity in steps of length, and keeping the dates
+    after each effective date.
+
+    Arguments:
+        effective (np.ndarray): datetime64[D] effective dates
+        maturity (np.ndarray): datetime64[D] maturity dates
+        length (int): length of each period
+        period_length (str, optional): months, weeks, or days
+                                       default: months
+
+    Returns:
+        period_ends (np.ndarray): datetime64[D] period ends of every
+                                  schedule, in order, one schedule after
+                                  the other
+        offsets (np.ndarray): schedule i has period ends
+                              period_ends[offsets[i]:offsets[i + 1]]
+    '''
+    effective = np.atleast_1d(to_datetime64(effective))
+    maturity = np.atleast_1d(to_datetime64(maturity))
+    effective, maturity = np.broadcast_arrays(effective, maturity)
+
+    if period_length == 'months':
+        span = (maturity.astype('datetime64[M]') -
+                effective.astype('datetime64[M]')).astype(np.int64)
+    elif period_length in ('weeks', 'days'):
+        length = length * 7 if period_length == 'weeks' else length
+        span = (maturity - effective).astype(np.int64)
+    else:
+        raise Exception('Period length {period_length} not '
+                        'recognized'.format(**locals()))
+
+    # candidate periods per schedule, at most one of which is on or before
+    # the effective date
+    counts = np.maximum(span // length + 1, 0)
+    starts = np.cumsum(counts) - counts
+    trades = np.repeat(np.arange(len(counts)), counts)
+    steps = np.arange(counts.sum()) - starts[trades]
+    # steps count backward from the maturity, so reverse them in each trade
+    steps = counts[trades] - 1 - steps
+
+    if period_length == 'months':
+        ends = _roll_months(maturity, trades, length * steps)
+    else:
+        ends = maturity[trades] - length * steps
+
+    keep = ends > effective[trades]
+    counts = np.bincount(trades[keep], minlength=len(counts))
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    return ends[keep], offsets
+
+
+def _roll_months(maturity, trades, months):
+    # maturity[trades] - months, clipping the day to the end of the month,
+    # with the month starts and lengths taken from tables over the range of
+    # months covered rather than converted per date
+    maturity_months = maturity.astype('datetime64[M]')
+    days = (maturity - maturity_months.astype('datetime64[D]')).astype(np.int64)
+    month_index = maturity_months.astype(np.int64)[trades] - months
+    if not len(month_index):
+        return maturity[trades]
+    first = month_index.min()
+    table = np.arange(first, month_index.max() + 2).astype('datetime64[M]')
+    month_starts = table.astype('datetime64[D]')
+    month_lengths = np.diff(month_starts).astype(np.int64)
+    month_index -= first
+    return month_starts[month_index] + np.minimum(days[trades],
+                                                  month_lengths[month_index] - 1)
+
+
+def generate_schedules(effective, maturity, length,
+                       period_adjustment='unadjusted',
+                       payment_adjustment='unadjusted',
+                       fixing_lag=2, period_length='months', calendar=None):
+    '''
+    Generates the schedules of many swaps in one call. Each schedule has the
+    same layout as Schedule.periods; all of the periods are returned in a
+    single record array, with offsets marking where each schedule starts.
+
+    Arguments:
+        effective (np.ndarray): effective dates of the swaps
+        maturity (np.ndarray): maturity dates of the swaps
+        length (int): length of the period that the accrual lasts
+        period_adjustment (str, optional): date adjustment type for the accrual
+                                           dates
+                                           default: unadjusted
+        payment_adjustment (str, optional): date adjustment type for the payment
+                                            dates
+                                            default: unadjusted
+        fixing_lag (int, optional): fixing lag in business days
+                                    default: 2
+        period_length (str, optional): period type for the length
+                                       default: months
+                                       available: weeks, days
+        calendar (str, optional): holiday calendar name, or HolidayCalendar
+                                  default: weekends only
+
+    Returns:
+        periods (np.recarray): periods of every schedule, one after the other
+        offsets (np.ndarray): schedule i is periods[offsets[i]:offsets[i + 1]]
+    '''
+    effective = np.atleast_1d(to_datetime64(effective))
+    period_ends, offsets = roll_backward(effective, maturity, length,
+                                         period_length)
+    effective = np.broadcast_to(effective, (len(offsets) - 1,))
+    calendar = calendars.get_calendar(calendar)
+    accrual_ends = calendar.adjust(period_ends, period_adjustment)
+
+    # drop any stub that the adjustment rolled back onto the effective date
+    trades = np.repeat(np.arange(len(effective)), np.diff(offsets))
+    keep = accrual_ends > effective[trades]
+    if not keep.all():
+        period_ends, accrual_ends = period_ends[keep], accrual_ends[keep]
+        counts = np.bincount(trades[keep], minlength=len(effective))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+    return _periods(effective, period_ends, accrual_ends, offsets,
+                    payment_adjustment, fixing_lag, calendar), offsets
+
+
+def _periods(effective, period_ends, accrual_ends, offsets,
+             payment_adjustment, fixing_lag, calendar):
+    # assemble the period record array from the unadjusted and adjusted
+    # period ends of one or more schedules
+
+    # each accrual starts at the previous accrual end, or the effective date
+    accrual_starts = np.empty_like(accrual_ends)
+    accrual_starts[1:] = accrual_ends[:-1]
+    firsts = offsets[:-1][np.diff(offsets) > 0]
+    accrual_starts[firsts] = effective[np.diff(offsets) > 0]
+
+    fixing_dates = calendar.advance(accrual_starts, -fixing_lag, 'preceding')
+    payment_dates = calendar.adjust(period_ends, payment_adjustment)
+    return np.rec.fromarrays([fixing_dates, accrual_starts, accrual_ends,
+                              payment_dates], dtype=PERIOD_DTYPE)
+
+
 class Schedule:
     '''Swap fixing, accrual, and payment dates
 
     The Schedule class can be used to generate the details for periods
-    for swaps. 
+    for swaps.
 
     Arguments:
         effective (datetime): effective date of the swap
@@ -24,20 +220,24 @@ class Schedule:
                                            default: unadjusted
                                            available: following,
                                                       modified following,
-                                                      preceding
+                                                      preceding,
+                                                      modified preceding
         payment_adjustment (str, optional): date adjustment type for the payment
                                             dates
                                             default: unadjusted
-                                            available: following, 
+                                            available: following,
                                                        modified following,
-                                                       preceding
-        fixing_lag (int, optional): fixing lag for fixing dates
+                                                       preceding,
+                                                       modified preceding
+        fixing_lag (int, optional): fixing lag for fixing dates, in business
+                                    days
                                     default: 2
-        
+
         period_length (str, optional): period type for the length
                                        default: months
                                        available: weeks, days
-                    
+        calendar (str, optional): holiday calendar name, or HolidayCalendar
+                                  default: weekends only
 
     Attributes:
         periods (np.recarray): numpy record array of period data
@@ -49,134 +249,52 @@ class Schedule:
                  second=False, penultimate=False,
                  period_adjustment='unadjusted',
                  payment_adjustment='unadjusted',
-                 fixing_lag=2, period_length='months'):
+                 fixing_lag=2, period_length='months', calendar=None):
 
         # variable assignment
         self.effective = effective
         self.maturity = maturity
         self.length = length
-        self.period_delta = self._timedelta(length, period_length)
         self.period_adjustment = period_adjustment
         self.payment_adjustment = payment_adjustment
         self.second = second
         self.penultimate = penultimate
         self.fixing_lag = fixing_lag
         self.period_length = period_length
+        self.calendar = calendar
 
         # date generation routine
-        self._gen_periods()
         self._create_schedule()
 
-    def _gen_periods(self):
-        '''Private method to generate the date series
+    def _create_schedule(self):
+        '''Private method to generate the periods
         '''
-
-
         if bool(self.second) ^ bool(self.penultimate):
             raise Exception('If specifying second or penultimate dates,'
                             'must select both')
 
+        effective = to_datetime64([self.effective])
         if self.second:
-            self._period_ends = self._gen_dates(self.second,
-                                                self.penultimate,
-                                                self.period_delta,
-                                                'unadjusted')
-            self._period_ends = [self.second] + self._period_ends + [self.maturity]
-            self._adjusted_period_ends = self._gen_dates(self.second,
-                                                         self.penultimate,
-                                                         self.period_delta,
-                                                         self.period_adjustment)
-            self._adjusted_period_ends = [self.second] + \
-                                         self._adjusted_period_ends + \
-                                         [self.maturity]
+            # regular periods between the second and penultimate dates, with
+            # the stubs on either side left as given
+            second, penultimate, maturity = to_datetime64([self.second,
+                                                           self.penultimate,
+                                                           self.maturity])
+            regular, _ = roll_backward(second, penultimate, self.length,
+                                       self.period_length)
+            calendar = calendars.get_calendar(self.calendar)
+            period_ends = np.concatenate(([second], regular, [maturity]))
+            accrual_ends = calendar.adjust(period_ends, self.period_adjustment)
+            accrual_ends[0], accrual_ends[-1] = second, maturity
+            offsets = np.array([0, len(period_ends)])
+            self.periods = _periods(effective, period_ends, accrual_ends,
+                                    offsets, self.payment_adjustment,
+                                    self.fixing_lag, calendar)
         else:
-            self._period_ends = self._gen_dates(self.effective,
-                                                self.maturity,
-                                                self.period_delta,
-                                                'unadjusted')
-            self._adjusted_period_ends = self._gen_dates(self.effective,
-                                                         self.maturity,
-                                                         self.period_delta,
-                                                         self.period_adjustment)
-        self._period_starts = [self.effective] + self._adjusted_period_ends[:-1]
-        self._fixing_dates = self._gen_date_adjustments(self._period_starts, 
-                                                        -self.fixing_lag,
-                                                        adjustment='preceding')
-        self._payment_dates = self._gen_date_adjustments(self._period_ends,
-                                                         0,
-                                                         adjustment=self.payment_adjustment)
-
-    def _create_schedule(self):
-        '''
-        '''
-        self.periods = np.rec.fromarrays(self._np_dtarrays(self._fixing_dates,
-                                                           self._period_starts,
-                                                           self._adjusted_period_ends,
-                                                           self._payment_dates),
-                                         dtype=[('fixing_date', 'datetime64[D]'),
-                                                ('accrual_start', 'datetime64[D]'),
-                                                ('accrual_end', 'datetime64[D]'),
-                                                ('payment_date', 'datetime64[D]')])
-
-        if bool(self.second) ^ bool(self.penultimate):
-            raise Exception('If specifying second or penultimate dates,'
-                            'must select both')
-    
-    def _timedelta(self, delta, period_length):
-        if period_length == 'months':
-            return dateutil.relativedelta.relativedelta(months=delta)
-        elif period_length == 'weeks':
-            return dateutil.relativedelta.relativedelta(weeks=delta)
-        elif period_length == 'days':
-            return dateutil.relativedelta.relativedelta(days=delta)
-        else:
-            raise Exception('Period length {period_length} not '
-                            'recognized'.format(**locals()))
-
-
-    def _gen_dates(self, effective, maturity, delta, adjustment):
-        dates = []
-        current = maturity
-        counter = 1
-        while current > effective:
-            dates.append(self._date_adjust(current, adjustment))
-            counter += 1
-            current = maturity - (delta * counter)
-        return dates[::-1]
-
-    def _date_adjust(self, date, adjustment): 
-        if adjustment == 'unadjusted':
-            return date
-        elif adjustment == 'following':
-            if date.weekday() < 5:
-                return date
-            else:
-                return date + self._timedelta(7 - date.weekday(), 'days')
-        elif adjustment == 'preceding':
-            if date.weekday() < 5:
-                return date
-            else:
-                return date - self._timedelta(max(0, date.weekday() - 5), 'days')
-        elif adjustment == 'modified following':
-            if date.month == self._date_adjust(date, 'following').month:
-                return self._date_adjust(date, 'following')
-            else:
-                return date - self._timedelta(7 - date.weekday(), 'days')
-        else:
-            raise Exception('Adjustment period not recognized')
-
-    def _gen_date_adjustments(self, dates, delta, adjustment='unadjusted'):
-        adjusted_dates = []
-        for date in dates:
-            adjusted_date = date + self._timedelta(delta, 'days')
-            adjusted_date = self._date_adjust(adjusted_date, adjustment)
-            adjusted_dates.append(adjusted_date)
-        return adjusted_dates
-
-    def _np_dtarrays(self, *args):
-        fmt = '%Y-%m-%d'
-        arrays = []
-        for arg in args:
-            arrays.append(np.asarray([np.datetime64(date.strftime(fmt)) for date in arg]))
-        return tuple(arrays)
-
+            self.periods, _ = generate_schedules(effective, self.maturity,
+                                                 self.length,
+                                                 self.period_adjustment,
+                                                 self.payment_adjustment,
+                                                 self.fixing_lag,
+                                                 self.period_length,
+                                                 self.calendar)
@@ -1,6 +1,14 @@
-from swap_schedule import Schedule
 import datetime
 
+import numpy as np
+import pytest
+import QuantLib as ql
+
+import helpers.calendars as calendars
+import helpers.node_curve as node_curve
+import helpers.swap_schedule as swap_schedule
+from helpers.swap_schedule import Schedule
+
 effective = datetime.datetime(2015, 12, 31)
 maturity = datetime.datetime(2055, 12, 31)
 simple = Schedule(effective, maturity, 3)
@@ -14,3 +22,67 @@ adjusted = Schedule(effective, maturity, 3,
                     fixing_lag=0,
                     period_adjustment='following',
                     payment_adjustment='modified following')
+
+
+conventions = {
+    'unadjusted': ql.Unadjusted,
+    'following': ql.Following,
+    'modified following': ql.ModifiedFollowing,
+    'preceding': ql.Preceding,
+    'modified preceding': ql.ModifiedPreceding
+}
+
+
+def book(count=200, seed=1):
+    # swaps effective on NYSE business days, with whole year tenors and odd
+    # maturities for the stubs
+    rng = np.random.default_rng(seed)
+    effective = calendars.get_calendar('NYSE').adjust(
+        np.datetime64('2015-01-01') + rng.integers(0, 2000, count), 'following')
+    maturity = (swap_schedule.add_months(effective, rng.integers(1, 40, count) * 12) +
+                rng.integers(-40, 40, count))
+    return effective, maturity
+
+
+def ql_dates(dates):
+    return [ql.Date(int(serial)) for serial in node_curve.to_serials(dates)]
+
+
+@pytest.mark.parametrize('adjustment', sorted(conventions))
+def test_schedules_match_quantlib(adjustment):
+    effective, maturity = book()
+    periods, offsets = swap_schedule.generate_schedules(
+        effective, maturity, 3, adjustment, 'modified following', 2,
+        calendar='NYSE')
+    nyse = calendars.quantlib_calendar('NYSE')
+    for i, (start, end) in enumerate(zip(ql_dates(effective), ql_dates(maturity))):
+        schedule = ql.Schedule(start, end, ql.Period(3, ql.Months), nyse,
+                               conventions[adjustment], conventions[adjustment],
+                               ql.DateGeneration.Backward, False)
+        trade = periods[offsets[i]:offsets[i + 1]]
+        assert ql_dates(trade.accrual_end) == list(schedule)[1:]
+        assert ql_dates(trade.fixing_date) == [
+            nyse.advance(date, -2, ql.Days, ql.Preceding)
+            for date in ql_dates(trade.accrual_start)]
+        unadjusted = ql.Schedule(start, end, ql.Period(3, ql.Months), nyse,
+                                 ql.Unadjusted, ql.Unadjusted,
+                                 ql.DateGeneration.Backward, False)
+        # the payments are on the adjusted period ends, of the periods left
+        # after the adjustment
+        payments = [nyse.adjust(date, ql.ModifiedFollowing)
+                    for date in list(unadjusted)[1:]]
+        assert ql_dates(trade.payment_date) == payments[len(payments) - len(trade):]
+
+
+def test_book_matches_single_schedules():
+    effective, maturity = book(50)
+    periods, offsets = swap_schedule.generate_schedules(
+        effective, maturity, 6, 'modified following', 'following', 2,
+        calendar='NYSE')
+    for i in range(len(effective)):
+        single = swap_schedule.Schedule(effective[i], maturity[i], 6,
+                                        period_adjustment='modified following',
+                                        payment_adjustment='following',
+                                        calendar='NYSE')
+        np.testing.assert_array_equal(periods[offsets[i]:offsets[i + 1]],
+                                      single.periods)
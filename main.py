@@ -4,7 +4,9 @@ import sqlite3
 import QuantLib as ql
 
 # qlpy stuff
+import helpers.cli as cli
 import helpers.curve as curve
+import helpers.curve_store as curve_store
 import helpers.db_handler as db_handler 
 
 
@@ -12,6 +14,7 @@ def main():
     # check connect to market data db and, if not, create it with dummy data
     if os.path.isfile('market_data.db'):
         conn = sqlite3.connect('market_data.db')
+        db_handler.upgrade_db(conn)
     else:
         conn = db_handler.create_db('market_data.db')
 
@@ -31,7 +34,9 @@ def main():
     ql.Settings.instance().evaluationDate = now_date
 
     print('Building...')
-    usd = curve.LiborCurve('USD_3M', now_date, conn)
+    # curves built before from the same rates are loaded from the database
+    store = curve_store.CurveStore(conn)
+    usd = curve.LiborCurve('USD_3M', now_date, conn, store=store)
     print('-'*70)
     print('The curve is now built')
 
@@ -59,4 +64,7 @@ def main():
     conn.close()
 
 if __name__ == '__main__':
+    # with arguments, run the headless batch build (see helpers/cli.py)
+    if len(sys.argv) > 1:
+        sys.exit(cli.main())
     main()
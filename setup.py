@@ -8,5 +8,8 @@ setup(
     author_email = 'kevin[dot]d[dot]keogh[at]gmail[dot]com',
     url = 'https://github.com/kevindkeogh/qlibpy',
     license = 'MIT',
-    packages = find_packages()
+    packages = find_packages(),
+    entry_points = {
+        'console_scripts': ['qlpy-build = helpers.cli:main']
+        }
     )